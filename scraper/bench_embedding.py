@@ -0,0 +1,142 @@
+"""
+Benchmark des embeddings
+- workers: docs/s selon le nombre de processus. Référence: modèle dans le
+  processus principal (EMBED_WORKERS=1); puis EmbeddingPool avec 2, 4...
+  workers épinglés sur des tranches de cœurs
+- backends: torch contre ONNX Runtime (fp32, int8): temps de chargement,
+  docs/s, RSS maximal (chaque backend dans un processus neuf) et cosinus
+  avec les vecteurs torch
+Passages tirés des pages de fixtures/html
+
+Usage:
+    python bench_embedding.py [workers] [--workers 2 4 8] [--texts 4000] [--embedder torch|onnx-int8|hash]
+    python bench_embedding.py backends [--backends torch onnx onnx-int8] [--texts 2000]
+"""
+
+import argparse
+import functools
+import glob
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from embedding_pool import EmbeddingPool, available_cores, load_model
+from embedding_stage import EmbeddingStage
+from html_extract import extract_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+PASSAGE_CHARS = 800
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+COSINE_SAMPLE = 200
+
+
+def load_passages(count):
+    """`count` passages d'environ PASSAGE_CHARS caractères (pages de fixtures répétées)"""
+    passages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            text = extract_page(f.read(), "https://www.justice.ci/").text
+        passages.extend(text[i:i + PASSAGE_CHARS] for i in range(0, len(text), PASSAGE_CHARS))
+    if not passages:
+        raise SystemExit(f"[ERROR] Aucune page .html dans {FIXTURES_DIR}")
+    # Variante numérotée: textes distincts, longueurs inchangées
+    return [f"{n} {passages[n % len(passages)]}" for n in range(count)]
+
+
+def factory_for(name):
+    if name == "hash":
+        from bench_scraper import HashingEmbedder
+        return functools.partial(HashingEmbedder, EMBEDDING_DIM)
+    return functools.partial(load_model, EMBEDDING_MODEL, name)
+
+
+def measure(label, model, texts, batch_size):
+    """Encode `texts` via EmbeddingStage -> docs/s (après un lot d'échauffement)"""
+    stage = EmbeddingStage(model, batch_size=batch_size)
+    stage.encode(texts[:batch_size])
+    stage.docs, stage.seconds = 0, 0.0
+    matrix = stage.encode(texts)
+    rate = stage.docs_per_second()
+    print(f"{label:<24} {rate:>9.1f} docs/s   {stage.seconds:>7.2f}s   matrice {matrix.shape}")
+    return rate
+
+
+def _run_backend(backend, texts, batch_size):
+    """Dans un processus neuf: chargement, débit, RSS maximal et vecteurs d'échantillon"""
+    started = time.perf_counter()
+    model = factory_for(backend)()
+    load_seconds = time.perf_counter() - started
+    rate = measure(backend, model, texts, batch_size)
+    return {
+        "load_seconds": load_seconds,
+        "docs_per_second": rate,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "sample": model.encode(texts[:COSINE_SAMPLE], batch_size=batch_size),
+    }
+
+
+def compare_backends(backends, texts, batch_size):
+    from onnx_embedder import cosine_rows
+
+    results = {}
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            try:
+                results[backend] = executor.submit(_run_backend, backend, texts, batch_size).result()
+            except Exception as e:
+                print(f"[WARN] Backend {backend} indisponible: {e}")
+
+    if not results:
+        return
+    reference = results.get("torch")
+    print(f"\n{'backend':<12} {'chargement':>11} {'docs/s':>9} {'RSS max':>10} {'cosinus min':>12}")
+    for backend, result in results.items():
+        cosine = "-"
+        if reference is not None and backend != "torch":
+            cosine = f"{cosine_rows(reference['sample'], result['sample']).min():.5f}"
+        print(f"{backend:<12} {result['load_seconds']:>10.2f}s {result['docs_per_second']:>9.1f} "
+              f"{result['peak_rss_mb']:>7.0f} Mo {cosine:>12}")
+        if reference is not None and backend != "torch":
+            print(f"{'':<12} x{result['docs_per_second'] / reference['docs_per_second']:.2f} docs/s, "
+                  f"chargement x{reference['load_seconds'] / result['load_seconds']:.1f} plus rapide")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des embeddings LexIA")
+    parser.add_argument("command", nargs="?", choices=["workers", "backends"], default="workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--texts", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="0: cœurs de la tranche")
+    parser.add_argument("--embedder", choices=BACKENDS + ["hash"], default="torch")
+    args = parser.parse_args()
+
+    texts = load_passages(args.texts)
+    cores = available_cores()
+
+    if args.command == "backends":
+        print(f"[INFO] {len(texts)} passages, {len(cores)} cœurs disponibles\n")
+        compare_backends(args.backends, texts, args.batch_size)
+        return
+
+    print(f"[INFO] {len(texts)} passages, {len(cores)} cœurs disponibles, embedder {args.embedder}\n")
+    factory = factory_for(args.embedder)
+    baseline = measure("1 processus (référence)", factory(), texts, args.batch_size)
+
+    for workers in args.workers:
+        pool = EmbeddingPool(EMBEDDING_MODEL, EMBEDDING_DIM, workers=workers,
+                             threads_per_worker=args.threads_per_worker,
+                             batch_size=args.batch_size, factory=factory)
+        try:
+            rate = measure(f"{workers} workers", pool, texts, args.batch_size)
+        finally:
+            pool.close()
+        print(f"{'':<24} accélération x{rate / baseline:.2f}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark de l'extraction HTML: pages/s avant (BeautifulSoup html.parser, un
+parsing chacun pour les liens, le titre et le texte) et après (html_extract:
+un seul parsing lxml)
+Mesuré sur des pages sauvegardées (fixtures/html par défaut)
+
+Usage:
+    python bench_html_extract.py [--fixtures dossier] [--repeat 20]
+                                 [--selectors "a[href*='texte']" "a[href*='.pdf']"]
+"""
+
+import argparse
+import glob
+import os
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from html_extract import extract_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+BASE_URL = "https://www.justice.ci/textes/"
+DEFAULT_SELECTORS = ["a[href*='texte']", "a[href*='jo']", "a[href*='.pdf']"]
+
+
+def legacy_extract(html, base_url, selectors):
+    """Ancienne extraction de scraper_sites_officiels (liens, titre, texte)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = set()
+    for selector in selectors:
+        for link in soup.select(selector):
+            href = link.get('href')
+            if href:
+                links.add(urljoin(base_url, href))
+
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('title') or soup.find('h1')
+    title = title_tag.get_text(strip=True) if title_tag else ''
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(['script', 'style', 'nav', 'header', 'footer']):
+        element.decompose()
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=['content', 'main', 'text'])
+    text = main_content.get_text(separator=' ', strip=True) if main_content else soup.get_text(separator=' ', strip=True)
+    return title, ' '.join(text.split()), list(links)
+
+
+def fast_extract(body, base_url, selectors):
+    page = extract_page(body, base_url, selectors)
+    return page.title, page.text, page.links
+
+
+def run(name, extract, pages, repeat, selectors):
+    """Extrait toutes les pages `repeat` fois -> pages/s"""
+    results = [extract(page, BASE_URL, selectors) for page in pages]   # échauffement
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            extract(page, BASE_URL, selectors)
+    elapsed = time.perf_counter() - started
+    rate = len(pages) * repeat / elapsed
+    chars = sum(len(text) for title, text, links in results) / len(results)
+    links = sum(len(links) for title, text, links in results) / len(results)
+    print(f"{name:<28} {rate:>9.1f} pages/s   {elapsed * 1000 / (len(pages) * repeat):>7.2f} ms/page"
+          f"   {chars:>8.0f} chars/page   {links:>5.0f} liens/page")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction HTML LexIA")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="dossier de pages .html sauvegardées")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--selectors", nargs="+", default=DEFAULT_SELECTORS)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.fixtures, "*.html")))
+    if not files:
+        print(f"[ERROR] Aucune page .html dans {args.fixtures}")
+        return
+    raw = []
+    for path in files:
+        with open(path, 'rb') as f:
+            raw.append(f.read())
+    texts = [body.decode('utf-8', errors='replace') for body in raw]
+    print(f"[INFO] {len(files)} pages, {sum(len(body) for body in raw) / 1024:.0f} Ko, {args.repeat} passes\n")
+
+    before = run("avant (bs4, 3 parsings)", legacy_extract, texts, args.repeat, args.selectors)
+    after = run("après (lxml, 1 parsing)", fast_extract, raw, args.repeat, args.selectors)
+    print(f"\n[OK] Accélération: x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
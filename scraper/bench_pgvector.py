@@ -0,0 +1,176 @@
+"""
+Benchmark de l'index pgvector: rappel@k contre recherche exacte et latences p50/p99
+Utilise une table jetable "LegalDocumentBench" remplie de vecteurs synthétiques
+
+Usage:
+    python bench_pgvector.py [--sizes 10000 100000 1000000] [--queries 100] [--k 10]
+                             [--m 16] [--ef-construction 64] [--ef-search 40 100 200]
+                             [--quantization none halfvec binary] [--rerank-factor 4]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_stage import vectors_to_pg
+from pgvector_search import ensure_vector_index, index_name, search
+from quantize import QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_BINARY, RERANK_FACTOR
+
+BENCH_TABLE = '"LegalDocumentBench"'
+DIM = 384
+CLUSTERS = 200
+CATEGORIES = ["droit_societes", "fiscalite", "droit_travail", "droit_commercial", "legislation"]
+LOAD_CHUNK = 20000
+
+
+def synthetic_vectors(n, seed):
+    """Vecteurs normalisés regroupés en clusters (plus réaliste qu'un bruit uniforme)"""
+    centers = np.random.RandomState(0).randn(CLUSTERS, DIM).astype(np.float32)
+    rng = np.random.RandomState(seed)
+    vectors = centers[rng.randint(0, CLUSTERS, n)] + 0.6 * rng.randn(n, DIM).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def create_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                "contentPreview" TEXT NOT NULL,
+                "sourceUrl" TEXT,
+                embedding vector({DIM})
+            )
+        """)
+    conn.commit()
+
+
+def load_rows(conn, start, stop):
+    """Ajoute les lignes [start, stop) par COPY, par paquets de LOAD_CHUNK"""
+    for offset in range(start, stop, LOAD_CHUNK):
+        n = min(LOAD_CHUNK, stop - offset)
+        vectors = vectors_to_pg(synthetic_vectors(n, seed=offset + 1))
+        buffer = io.StringIO()
+        for i, vector in enumerate(vectors):
+            row = offset + i
+            buffer.write(f"bench_{row}\tDocument {row}\t{CATEGORIES[row % len(CATEGORIES)]}\t-\t\\N\t{vector}\n")
+        buffer.seek(0)
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {BENCH_TABLE} (id, title, category, "contentPreview", "sourceUrl", embedding) FROM STDIN',
+                buffer
+            )
+        conn.commit()
+
+
+def index_size_mb(conn, name):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_relation_size(%s::regclass)", (f'"{name}"',))
+        size = cursor.fetchone()[0]
+    conn.rollback()
+    return size / 1e6
+
+
+def run_queries(conn, queries, k, ef_search=None, exact=False, category=None,
+                quantization=QUANTIZATION_NONE, rerank_factor=RERANK_FACTOR):
+    """Exécute les requêtes, retourne (ids par requête, latences en ms)"""
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows = search(conn, query, k, category, table=BENCH_TABLE, exact=exact,
+                      quantization=quantization, rerank_factor=rerank_factor,
+                      **({"ef_search": ef_search} if ef_search else {}))
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({row[0] for row in rows})
+    return results, np.array(latencies)
+
+
+def recall(truth, found, k):
+    return sum(len(t & f) for t, f in zip(truth, found)) / (k * len(truth))
+
+
+def main():
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv(os.path.join(parent_dir, '.env'))
+
+    parser = argparse.ArgumentParser(description="Benchmark pgvector HNSW LexIA")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[40, 100, 200])
+    parser.add_argument("--quantization", nargs="+", default=[QUANTIZATION_NONE],
+                        choices=[QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_BINARY])
+    parser.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR)
+    parser.add_argument("--category", help="filtre de catégorie appliqué aux requêtes")
+    parser.add_argument("--keep", action="store_true", help="ne pas supprimer la table à la fin")
+    args = parser.parse_args()
+
+    database_url = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not database_url:
+        print("[ERROR] BENCH_DATABASE_URL ou DATABASE_URL requis")
+        sys.exit(1)
+
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    create_table(conn)
+    queries = synthetic_vectors(args.queries, seed=999_999_999)
+    loaded = 0
+
+    print(f"{'lignes':>9} {'format':>8} {'ef_search':>9} {'recall@' + str(args.k):>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    try:
+        for size in sorted(args.sizes):
+            # Charger sans index (plus rapide), puis (re)construire les index
+            with conn.cursor() as cursor:
+                for quantization in args.quantization:
+                    cursor.execute(f'DROP INDEX IF EXISTS "{index_name(BENCH_TABLE, "hnsw", quantization)}"')
+            conn.commit()
+            load_rows(conn, loaded, size)
+            loaded = size
+
+            truth, exact_ms = run_queries(conn, queries, args.k, exact=True, category=args.category)
+            print(f"{size:>9} {'-':>8} {'exact':>9} {1.0:>10.3f} {np.percentile(exact_ms, 50):>8.2f} "
+                  f"{np.percentile(exact_ms, 99):>8.2f}")
+
+            for quantization in args.quantization:
+                started = time.perf_counter()
+                ensure_vector_index(conn, table=BENCH_TABLE, m=args.m, ef_construction=args.ef_construction,
+                                    quantization=quantization)
+                build = time.perf_counter() - started
+                with conn.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {BENCH_TABLE}")
+                conn.commit()
+                name = index_name(BENCH_TABLE, "hnsw", quantization)
+                print(f"{size:>9} {quantization:>8}   index {index_size_mb(conn, name):.1f} Mo "
+                      f"construit en {build:.1f}s")
+
+                for ef in args.ef_search:
+                    found, ms = run_queries(conn, queries, args.k, ef_search=ef, category=args.category,
+                                            quantization=quantization, rerank_factor=args.rerank_factor)
+                    print(f"{size:>9} {quantization:>8} {ef:>9} {recall(truth, found, args.k):>10.3f} "
+                          f"{np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f}")
+
+                # Un seul index à la fois, sinon le planificateur choisit entre eux
+                with conn.cursor() as cursor:
+                    cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                conn.commit()
+    finally:
+        if not args.keep:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
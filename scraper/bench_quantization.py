@@ -0,0 +1,84 @@
+"""
+Benchmark de la quantification des embeddings: mémoire économisée contre rappel perdu
+Recherche exhaustive en numpy (sans base): seul l'effet de la quantification est mesuré
+
+Usage:
+    python bench_quantization.py [--size 100000] [--queries 200] [--k 10]
+                                 [--rerank-factor 1 4 10] [--embeddings vecteurs.npy]
+
+Pour l'effet sur l'index pgvector lui-même (taille, latence), voir
+bench_pgvector.py --quantization none halfvec binary.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from bench_pgvector import synthetic_vectors
+from quantize import (QUANTIZATIONS, QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_INT8,
+                      QUANTIZATION_BINARY, approximate_scores, binary_quantize, bytes_per_vector,
+                      quantize_int8, rerank, to_halfvec)
+
+
+def quantized_store(quantization, vectors):
+    if quantization == QUANTIZATION_HALFVEC:
+        return to_halfvec(vectors)
+    if quantization == QUANTIZATION_INT8:
+        return quantize_int8(vectors)
+    if quantization == QUANTIZATION_BINARY:
+        return binary_quantize(vectors)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantification des embeddings LexIA")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--embeddings", help="fichier .npy de vrais embeddings (remplace les synthétiques)")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rng = np.random.RandomState(0)
+        picked = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+        queries = vectors[picked] + 0.05 * rng.randn(len(picked), vectors.shape[1]).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    else:
+        vectors = synthetic_vectors(args.size, seed=1)
+        queries = synthetic_vectors(args.queries, seed=999_999_999)
+    n, dim = vectors.shape
+    truth = [set(np.argsort(-(vectors @ q))[:args.k].tolist()) for q in queries]
+
+    full = bytes_per_vector(QUANTIZATION_NONE, dim)
+    print(f"{n} vecteurs de dimension {dim}, {len(queries)} requêtes, recall@{args.k}")
+    print(f"{'format':>8} {'o/vecteur':>9} {'Mo':>8} {'gain':>6} {'rerank':>7} {'recall':>7} {'p50 ms':>7}")
+
+    for quantization in QUANTIZATIONS:
+        stored = quantized_store(quantization, vectors)
+        size = bytes_per_vector(quantization, dim)
+        factors = [1] if quantization == QUANTIZATION_NONE else args.rerank_factor
+
+        for factor in factors:
+            hits, latencies = 0, []
+            for q, expected in zip(queries, truth):
+                started = time.perf_counter()
+                approx = approximate_scores(quantization, stored, q)
+                candidates = np.argpartition(-approx, args.k * factor)[:args.k * factor]
+                if factor > 1:
+                    found, _ = rerank(candidates, vectors, q, args.k)
+                else:
+                    found = candidates[np.argsort(-approx[candidates])[:args.k]]
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len(expected & set(found.tolist()))
+
+            print(f"{quantization:>8} {size:>9} {n * size / 1e6:>8.1f} {full / size:>5.1f}x "
+                  f"{'x' + str(factor) if factor > 1 else '-':>7} {hits / (args.k * len(queries)):>7.3f} "
+                  f"{np.percentile(latencies, 50):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
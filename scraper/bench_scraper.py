@@ -0,0 +1,415 @@
+"""
+Benchmark hors-ligne du scraper complet: fetch -> extract -> embed -> write
+Un serveur HTTP local rejoue les pages et PDF de fixtures/ (latence et erreurs
+injectées); le crawl écrit dans une base jetable (SQLite par défaut, ou
+PostgreSQL) et un index vectoriel local créés dans un dossier temporaire.
+
+Usage:
+    python bench_scraper.py [--sites 3] [--pages 100] [--depth 2]
+                            [--latency-ms 30] [--jitter-ms 20] [--error-rate 0.02]
+                            [--embedder hash|model] [--postgres URL] [--dedup]
+                            [--output rapport.json]
+                            [--baseline rapport.json] [--max-regression 0.2]
+    python bench_scraper.py serve [--port 8800] [--sites 1] ...   # serveur seul
+
+--postgres doit pointer vers une base jetable: "LegalDocument" y est écrit.
+Avec --baseline, le code de sortie est 1 si pages/s ou passages/s reculent de
+plus de --max-regression (portail avant merge).
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BENCH_PORT = 8800
+BENCH_SELECTORS = ["a[href*='texte']", "a[href*='.pdf']"]
+HOME_LINKS = 40
+EMBEDDING_DIM = 384
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS LegalDocument (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    category TEXT NOT NULL,
+    articleNumber TEXT,
+    contentPreview TEXT,
+    sourceUrl TEXT,
+    scrapedAt TEXT NOT NULL DEFAULT (datetime('now')),
+    createdAt TEXT NOT NULL DEFAULT (datetime('now'))
+)
+"""
+
+SQLITE_UPSERT = """
+INSERT INTO LegalDocument (id, title, category, articleNumber, contentPreview, sourceUrl)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    title = excluded.title, contentPreview = excluded.contentPreview, scrapedAt = datetime('now')
+"""
+
+
+# ---------------------------------------------------------------------------
+# Serveur de fixtures
+# ---------------------------------------------------------------------------
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """(pages HTML, PDF) en octets, triés par nom"""
+    def read_all(pattern):
+        contents = []
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        return contents
+
+    return read_all("html/*.html"), read_all("pdf/*.pdf")
+
+
+def serve(port, sites, latency_ms, jitter_ms, error_rate, fixtures=FIXTURES_DIR, seed=0):
+    """Sert les fixtures sur `sites` ports consécutifs (un hôte par site)
+
+    Chaque chemin reçoit toujours la même fixture (crc32 du chemin); les liens
+    des fixtures mènent donc à d'autres pages servies, le crawl s'étend.
+    """
+    import asyncio
+    from aiohttp import web
+
+    html, pdfs = load_fixtures(fixtures)
+    if not html:
+        raise SystemExit(f"[ERROR] Aucune fixture HTML dans {fixtures}/html")
+    rng = random.Random(seed)
+    home = ("<html><head><title>Textes officiels</title></head><body><ul>" +
+            "".join(f"<li><a href='/textes/page-{i}'>Texte {i}</a></li>" for i in range(HOME_LINKS)) +
+            "".join(f"<li><a href='/textes/decret-{i}.pdf'>Décret {i} (PDF)</a></li>" for i in range(len(pdfs) * 3)) +
+            "</ul></body></html>").encode("utf-8")
+
+    async def handle(request):
+        delay = latency_ms + rng.uniform(0, jitter_ms) if latency_ms or jitter_ms else 0
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if rng.random() < error_rate:
+            return web.Response(status=503, text="Service indisponible (erreur injectée)")
+
+        path = request.path
+        if path == "/robots.txt":
+            return web.Response(status=404)
+        if path == "/":
+            return web.Response(body=home, content_type="text/html", charset="utf-8")
+        key = zlib.crc32(path.encode("utf-8"))
+        if path.lower().endswith(".pdf") and pdfs:
+            return web.Response(body=pdfs[key % len(pdfs)], content_type="application/pdf")
+        return web.Response(body=html[key % len(html)], content_type="text/html", charset="utf-8")
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        for i in range(sites):
+            await web.TCPSite(runner, "127.0.0.1", port + i).start()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def start_server(args):
+    """Lance le serveur dans un processus séparé (hors du GIL du crawl)"""
+    process = multiprocessing.Process(
+        target=serve, args=(args.port, args.sites, args.latency_ms, args.jitter_ms, args.error_rate),
+        daemon=True,
+    )
+    process.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", args.port + args.sites - 1), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise SystemExit(f"[ERROR] Serveur de fixtures non démarré sur le port {args.port}")
+
+
+# ---------------------------------------------------------------------------
+# Embeddings et écriture
+# ---------------------------------------------------------------------------
+
+class HashingEmbedder:
+    """Embeddings par hachage des mots (même interface que SentenceTransformer.encode)
+
+    Sans modèle à charger: mesure le reste du pipeline, le coût du modèle se
+    mesure avec --embedder model.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        from lexical_index import tokenize
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = zlib.crc32(token.encode("utf-8"))
+                matrix[row, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def load_embedder(name):
+    if name == "hash":
+        return HashingEmbedder()
+    from embedding_pool import load_embedding_model
+    from local_index import EMBEDDING_MODEL
+    return load_embedding_model(EMBEDDING_MODEL, EMBEDDING_DIM)
+
+
+class SqliteStore:
+    """LegalDocument dans une base SQLite jetable (triggers plein texte compris)"""
+
+    def __init__(self, path):
+        import sqlite3
+        from migrations import apply_migrations
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SQLITE_SCHEMA)
+        self.conn.commit()
+        apply_migrations(self.conn)
+
+    def write(self, documents, embeddings):
+        from metrics import METRICS
+
+        with METRICS.timer("db_write"):
+            self.conn.executemany(SQLITE_UPSERT, [
+                (doc["id"], doc["title"], doc["category"], doc.get("article"),
+                 doc["content"][:500], doc["url"])
+                for doc in documents
+            ])
+            self.conn.commit()
+        METRICS.incr("db_rows_written", len(documents))
+        return True
+
+    def close(self):
+        self.conn.close()
+
+
+class PostgresStore:
+    """LegalDocument dans une base PostgreSQL jetable (COPY binaire de BulkWriter)"""
+
+    def __init__(self, url):
+        from bulk_writer import BulkWriter, ON_CONFLICT_REFRESH_EMBEDDING, WIRE_FORMAT_BINARY
+        from db import Database
+        from migrations import apply_migrations
+
+        self.db = Database(url)
+        self.db.run(apply_migrations)
+        self.writer = BulkWriter(self.db, on_conflict=ON_CONFLICT_REFRESH_EMBEDDING,
+                                 wire_format=WIRE_FORMAT_BINARY)
+
+    def write(self, documents, embeddings):
+        errors = self.writer.errors
+        self.writer.write([
+            {
+                "id": doc["id"], "title": doc["title"], "category": doc["category"],
+                "content_preview": doc["content"][:500], "url": doc["url"], "embedding": embedding,
+            }
+            for doc, embedding in zip(documents, embeddings)
+        ])
+        return self.writer.errors == errors
+
+    def close(self):
+        self.db.report()
+        self.db.close()
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+def run(args, workdir):
+    """Crawl complet contre le serveur local -> dictionnaire de résultats"""
+    from crawl_frontier import CrawlFrontier
+    from crawl_ledger import CrawlLedger
+    from chunker import chunk_document
+    from dedup import DedupIndex
+    from embedding_stage import EmbeddingStage
+    from lexical_index import LexicalIndex
+    from local_index import LocalVectorIndex
+    from metrics import METRICS
+    from pipeline import Pipeline, iter_async
+    from scraper_sites_officiels import crawl_documents
+
+    sites = [{
+        "name": f"Bench {i + 1}",
+        "base_url": f"http://127.0.0.1:{args.port + i}/",
+        "selectors": BENCH_SELECTORS,
+        "priority": 1 + i % 3,
+    } for i in range(args.sites)]
+
+    ledger = CrawlLedger(os.path.join(workdir, "crawl_ledger.db"))
+    frontier = CrawlFrontier(os.path.join(workdir, "crawl_frontier"), max_depth=args.depth,
+                             max_pages_per_site=args.pages)
+    dedup = DedupIndex(os.path.join(workdir, "dedup_index.db"))
+    lexical = LexicalIndex(os.path.join(workdir, "lexical_index.db"))
+    vectors = LocalVectorIndex(os.path.join(workdir, "vector_index"), dim=EMBEDDING_DIM)
+    store = PostgresStore(args.postgres) if args.postgres else \
+        SqliteStore(os.path.join(workdir, "bench.db"))
+    embedding_stage = EmbeddingStage(loader=lambda: load_embedder(args.embedder))
+
+    def save_batch(documents):
+        urls = [doc["url"] for doc in documents]
+        originals = [doc for doc in documents if not doc.get("duplicate_of")]
+        embeddings = embedding_stage.encode([doc["content"] for doc in originals]) if originals else []
+        ok = store.write(originals, embeddings) if originals else True
+        if originals:
+            with METRICS.timer("vector_write"):
+                vectors.upsert(
+                    [doc["id"] for doc in originals], embeddings,
+                    [doc["content"] for doc in originals],
+                    [{"title": doc["title"], "url": doc["url"], "category": doc["category"]} for doc in originals],
+                )
+            METRICS.incr("vector_rows_written", len(originals))
+            with METRICS.timer("lexical_write"):
+                lexical.add(originals)
+        doc_ids = {doc.get("parent_id") or doc["id"] for doc in originals}
+        if ok:
+            dedup.commit(doc_ids)
+            ledger.commit(urls)
+            frontier.commit(urls)
+        else:
+            dedup.forget(doc_ids)
+        return ok
+
+    pipeline = Pipeline()
+    if args.dedup:
+        pipeline.add_stage("dedup", dedup.check)
+    pipeline.add_stage("chunk", chunk_document)
+
+    started = time.perf_counter()
+    total = pipeline.run(iter_async(crawl_documents(sites, ledger, frontier)), save_batch)
+    elapsed = time.perf_counter() - started
+
+    pipeline.report()
+    for closable in (ledger, dedup, lexical, vectors, store):
+        closable.close()
+    if hasattr(embedding_stage.model, "close"):
+        embedding_stage.model.close()   # EmbeddingPool (EMBED_WORKERS > 1)
+
+    snapshot = METRICS.snapshot("bench_scraper")
+    counters = snapshot["counters"]
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024   # ru_maxrss: octets (macOS) ou Ko
+
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "pages": counters.get("pages_fetched", 0),
+        "pages_per_second": round(counters.get("pages_fetched", 0) / elapsed, 2),
+        "passages": total,
+        "passages_per_second": round(total / elapsed, 2),
+        "fetch_errors": counters.get("fetch_errors", 0),
+        "megabytes_downloaded": round(counters.get("bytes_downloaded", 0) / (1024 * 1024), 2),
+        "peak_rss_mb": round(usage_self.ru_maxrss / scale, 1),
+        "peak_rss_children_mb": round(usage_children.ru_maxrss / scale, 1),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("command", "baseline", "output", "postgres")} |
+                  {"store": "postgres" if args.postgres else "sqlite"},
+        "stages": snapshot["stages"],
+        "counters": counters,
+    }
+
+
+def print_results(result):
+    print("\n" + "=" * 72)
+    print(f"Pages:      {result['pages']} en {result['elapsed_seconds']:.1f}s "
+          f"({result['pages_per_second']:.1f} pages/s, {result['fetch_errors']} erreurs, "
+          f"{result['megabytes_downloaded']:.1f} Mo)")
+    print(f"Passages:   {result['passages']} écrits ({result['passages_per_second']:.1f} passages/s)")
+    print(f"RSS max:    {result['peak_rss_mb']:.0f} Mo (workers: {result['peak_rss_children_mb']:.0f} Mo)")
+    print("-" * 72)
+    print(f"{'étape':<18} {'n':>6} {'total (s)':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10}")
+    for stage, summary in result["stages"].items():
+        print(f"{stage:<18} {summary['count']:>6} {summary['sum']:>10.2f} {summary['p50'] * 1000:>10.1f} "
+              f"{summary['p95'] * 1000:>10.1f} {summary['p99'] * 1000:>10.1f}")
+    print("=" * 72)
+
+
+def check_regression(result, baseline_path, max_regression):
+    """True si aucun débit ne recule de plus de max_regression par rapport à la référence"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    for key in ("pages_per_second", "passages_per_second"):
+        before, after = baseline.get(key, 0), result[key]
+        if not before:
+            continue
+        change = (after - before) / before
+        status = "OK" if change >= -max_regression else "ERROR"
+        ok = ok and status == "OK"
+        print(f"[{status}] {key}: {before} -> {after} ({change * 100:+.0f}%, tolérance -{max_regression * 100:.0f}%)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors-ligne du scraper LexIA")
+    parser.add_argument("command", nargs="?", choices=["run", "serve"], default="run")
+    parser.add_argument("--port", type=int, default=BENCH_PORT)
+    parser.add_argument("--sites", type=int, default=3, help="sites simulés (un port, donc un hôte, chacun)")
+    parser.add_argument("--pages", type=int, default=100, help="pages maximum par site")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="part de réponses 503 injectées")
+    parser.add_argument("--crawl-delay", type=float, default=0.01,
+                        help="délai entre deux requêtes sur un hôte (remplace CRAWL_DEFAULT_DELAY)")
+    parser.add_argument("--embedder", choices=["hash", "model"], default="hash")
+    parser.add_argument("--postgres", help="URL d'une base PostgreSQL jetable (SQLite sinon)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="étape de dédoublonnage (les fixtures se répètent: peu de passages écrits)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats de référence (JSON) pour le portail de régression")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        print(f"[INFO] Fixtures servies sur http://127.0.0.1:{args.port}/ "
+              f"({args.sites} site(s), latence {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, "
+              f"{args.error_rate:.0%} d'erreurs)")
+        serve(args.port, args.sites, args.latency_ms, args.jitter_ms, args.error_rate)
+        return
+
+    # Politesse réglée pour un serveur local (lue à l'import du crawler)
+    os.environ["CRAWL_DEFAULT_DELAY"] = str(args.crawl_delay)
+    os.environ["CRAWL_MIN_DELAY"] = str(min(args.crawl_delay, 0.1))
+
+    server = start_server(args)
+    workdir = tempfile.mkdtemp(prefix="lexia-bench-")
+    try:
+        result = run(args, workdir)
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"[OK] Résultats: {args.output}")
+    if args.baseline and not check_regression(result, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Écriture en masse des LegalDocument dans PostgreSQL
+COPY vers une table temporaire puis fusion en une transaction par lot
+
+Deux formats de transfert: CSV (embeddings en texte '[x,y,...]') ou binaire
+(embeddings envoyés en float32 bruts, ~3x moins d'octets par vecteur de 384
+dimensions et aucun parsing de décimaux côté serveur).
+"""
+
+import csv
+import io
+import os
+import struct
+import time
+
+import numpy as np
+
+from db import execute_prepared
+from metrics import METRICS
+
+# Sémantique de conflit (identique aux scripts existants)
+ON_CONFLICT_NOTHING = "nothing"               # scraper_simple: on garde l'existant
+ON_CONFLICT_REFRESH_EMBEDDING = "embedding"   # pgvector: on rafraîchit l'embedding
+
+# Format de transfert du COPY
+WIRE_FORMAT_TEXT = "text"       # CSV, embeddings déjà sérialisés (vectors_to_pg)
+WIRE_FORMAT_BINARY = "binary"   # COPY binaire, embeddings en tableaux float32
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_WIRE_FORMAT = os.getenv("BULK_WIRE_FORMAT", WIRE_FORMAT_TEXT)
+
+STAGE_COLUMNS = ["id", "title", "category", "contentPreview", "sourceUrl", "embedding"]
+
+# Une table de staging par format (le type de la colonne embedding diffère)
+STAGE_TABLES = {
+    WIRE_FORMAT_TEXT: "legal_document_stage",
+    WIRE_FORMAT_BINARY: "legal_document_stage_bin",
+}
+
+CREATE_STAGE_SQL = {
+    WIRE_FORMAT_TEXT: """
+        CREATE TEMP TABLE IF NOT EXISTS legal_document_stage (
+            id TEXT,
+            title TEXT,
+            category TEXT,
+            "contentPreview" TEXT,
+            "sourceUrl" TEXT,
+            embedding TEXT
+        ) ON COMMIT DELETE ROWS
+    """,
+    WIRE_FORMAT_BINARY: """
+        CREATE TEMP TABLE IF NOT EXISTS legal_document_stage_bin (
+            id TEXT,
+            title TEXT,
+            category TEXT,
+            "contentPreview" TEXT,
+            "sourceUrl" TEXT,
+            embedding vector
+        ) ON COMMIT DELETE ROWS
+    """,
+}
+
+COPY_STAGE_SQL = {
+    WIRE_FORMAT_TEXT: """
+        COPY legal_document_stage (id, title, category, "contentPreview", "sourceUrl", embedding)
+        FROM STDIN WITH (FORMAT csv)
+    """,
+    WIRE_FORMAT_BINARY: """
+        COPY legal_document_stage_bin (id, title, category, "contentPreview", "sourceUrl", embedding)
+        FROM STDIN WITH (FORMAT binary)
+    """,
+}
+
+# En-tête et fin d'un flux COPY binaire (format documenté de PostgreSQL)
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_BINARY_TRAILER = struct.pack("!h", -1)
+
+MERGE_SQL = {
+    ON_CONFLICT_NOTHING: """
+        INSERT INTO "LegalDocument"
+        (id, title, category, "contentPreview", "sourceUrl", "scrapedAt", "createdAt")
+        SELECT DISTINCT ON (id) id, title, category, "contentPreview", "sourceUrl", NOW(), NOW()
+        FROM {stage}
+        ON CONFLICT (id) DO NOTHING
+    """,
+    ON_CONFLICT_REFRESH_EMBEDDING: """
+        INSERT INTO "LegalDocument"
+        (id, title, category, "contentPreview", "sourceUrl", embedding, "scrapedAt", "createdAt")
+        SELECT DISTINCT ON (id) id, title, category, "contentPreview", "sourceUrl",
+               embedding::vector, NOW(), NOW()
+        FROM {stage}
+        ON CONFLICT (id) DO UPDATE SET
+            embedding = EXCLUDED.embedding,
+            "scrapedAt" = NOW()
+        WHERE "LegalDocument".embedding IS DISTINCT FROM EXCLUDED.embedding
+    """,
+}
+
+
+def _binary_field(value):
+    if value is None:
+        return struct.pack("!i", -1)
+    data = value.encode('utf-8')
+    return struct.pack("!i", len(data)) + data
+
+
+def _binary_vector(vector):
+    """Représentation binaire pgvector (vector_recv): dim int16, int16 réservé, float4 big-endian"""
+    if vector is None:
+        return struct.pack("!i", -1)
+    values = np.asarray(vector, dtype='>f4')
+    return struct.pack("!ihh", 4 + values.nbytes, len(values), 0) + values.tobytes()
+
+
+def encode_copy_binary(rows):
+    """Flux COPY binaire pour des lignes (id, title, category, preview, url, embedding)"""
+    buffer = io.BytesIO()
+    buffer.write(COPY_BINARY_HEADER)
+    for row in rows:
+        buffer.write(struct.pack("!h", len(row)))
+        for value in row[:-1]:
+            buffer.write(_binary_field(value))
+        buffer.write(_binary_vector(row[-1]))
+    buffer.write(COPY_BINARY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+
+def encode_copy_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+
+class BulkWriter:
+    """Écrit des documents par lots (COPY + INSERT ... SELECT) et mesure le débit
+
+    En format binaire, `embedding` est un vecteur float32 (ligne de la matrice
+    d'EmbeddingStage); en format texte, une chaîne produite par vectors_to_pg.
+    """
+
+    def __init__(self, db, on_conflict=ON_CONFLICT_NOTHING, batch_size=BULK_BATCH_SIZE,
+                 wire_format=BULK_WIRE_FORMAT):
+        if on_conflict not in MERGE_SQL:
+            raise ValueError(f"Mode de conflit inconnu: {on_conflict}")
+        if wire_format not in STAGE_TABLES:
+            raise ValueError(f"Format de transfert inconnu: {wire_format}")
+        self.db = db  # db.Database: chaque lot est rejoué si la connexion tombe
+        self.on_conflict = on_conflict
+        self.batch_size = batch_size
+        self.wire_format = wire_format
+        self.rows = 0
+        self.bytes = 0
+        self.written = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def write(self, documents):
+        """Écrit les documents, retourne le nombre de lignes insérées ou mises à jour"""
+        written = 0
+        for start in range(0, len(documents), self.batch_size):
+            written += self._write_batch(documents[start:start + self.batch_size])
+        return written
+
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        rows = [
+            (doc['id'], doc['title'], doc['category'], doc['content_preview'],
+             doc.get('url'), doc.get('embedding'))
+            for doc in batch
+        ]
+        if self.wire_format == WIRE_FORMAT_BINARY:
+            buffer = encode_copy_binary(rows)
+        else:
+            buffer = encode_copy_csv(rows)
+        self.bytes += len(buffer.getvalue())
+
+        try:
+            written = self.db.run(lambda conn: self._merge(conn, buffer))
+        except Exception as e:
+            self.errors += len(batch)
+            METRICS.incr("db_rows_failed", len(batch))
+            print(f"  [ERROR] Erreur écriture lot ({len(batch)} documents): {e}")
+            written = 0
+
+        self.rows += len(batch)
+        self.written += written
+        self.seconds += time.perf_counter() - started
+        METRICS.observe("db_write", time.perf_counter() - started)
+        METRICS.incr("db_rows_written", written)
+        METRICS.incr("db_bytes_sent", len(buffer.getvalue()))
+        return written
+
+    def _merge(self, conn, buffer):
+        """Une transaction: COPY vers le staging puis fusion (requête préparée)
+
+        Rejouable: le staging est vidé au rollback et la fusion est idempotente.
+        """
+        buffer.seek(0)
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_STAGE_SQL[self.wire_format])
+            cursor.copy_expert(COPY_STAGE_SQL[self.wire_format], buffer)
+            execute_prepared(
+                cursor,
+                f"lexia_merge_{self.on_conflict}_{self.wire_format}",
+                MERGE_SQL[self.on_conflict].format(stage=STAGE_TABLES[self.wire_format]),
+            )
+            written = cursor.rowcount
+        conn.commit()
+        return written
+
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def report(self):
+        """Affiche le débit d'écriture"""
+        print(f"[DB] {self.written}/{self.rows} lignes écrites, {self.errors} en erreur, "
+              f"en {self.seconds:.2f}s ({self.rows_per_second():.0f} lignes/s, "
+              f"{self.bytes / 1024:.0f} Ko envoyés en {self.wire_format})")
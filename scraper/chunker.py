@@ -0,0 +1,129 @@
+"""
+Découpage des textes juridiques en passages pour l'indexation
+Coupe sur la structure (Titre, Chapitre, Article N), puis en fenêtres avec chevauchement
+"""
+
+import os
+import re
+
+# Taille des passages en mots (all-MiniLM-L6-v2 tronque à 256 tokens ~ 180 mots)
+CHUNK_MAX_WORDS = int(os.getenv("CHUNK_MAX_WORDS", "180"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("CHUNK_OVERLAP_WORDS", "30"))
+CHUNK_MIN_WORDS = int(os.getenv("CHUNK_MIN_WORDS", "20"))
+
+# Début d'une division juridique: "Article 25 -", "Article premier :", "TITRE II", "Chapitre 3"
+HEADING_RE = re.compile(
+    r"(?:\bArticle|\bARTICLE|\bArt\.)\s+(?P<article>premier|1er|\d+(?:[-.]\d+)*(?:\s+(?:bis|ter|quater))?)\s*[-–:.]"
+    r"|\b(?:TITRE|Titre|CHAPITRE|Chapitre|SECTION|Section)\s+(?:[IVXLCDM]+|\d+|premier|PREMIER)\b"
+)
+
+
+def _article_number(match):
+    article = match.group('article')
+    if article in ('premier', '1er'):
+        return '1'
+    return article
+
+
+def find_article_number(text):
+    """Numéro du premier article cité dans le texte (ex: titre 'Code ... - Article 25: ...')"""
+    for match in HEADING_RE.finditer(text):
+        if match.group('article'):
+            return _article_number(match)
+    return None
+
+
+def split_sections(text):
+    """Découpe un texte sur ses titres juridiques -> [(numéro d'article ou None, texte)]"""
+    matches = list(HEADING_RE.finditer(text))
+    if not matches:
+        return [(None, text.strip())]
+
+    sections = []
+    if matches[0].start() > 0:
+        sections.append((None, text[:matches[0].start()].strip()))
+
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        article = _article_number(match) if match.group('article') else None
+        sections.append((article, text[match.start():end].strip()))
+
+    return [(article, body) for article, body in sections if body]
+
+
+def split_windows(text, max_words=CHUNK_MAX_WORDS, overlap=CHUNK_OVERLAP_WORDS):
+    """Découpe un texte trop long en fenêtres de mots qui se chevauchent"""
+    words = text.split()
+    if len(words) <= max_words:
+        return [' '.join(words)]
+
+    step = max(1, max_words - overlap)
+    windows = []
+    for start in range(0, len(words), step):
+        windows.append(' '.join(words[start:start + max_words]))
+        if start + max_words >= len(words):
+            break
+    return windows
+
+
+def chunk_text(text, max_words=CHUNK_MAX_WORDS, overlap=CHUNK_OVERLAP_WORDS, min_words=CHUNK_MIN_WORDS):
+    """Retourne [(numéro d'article ou None, passage)]
+
+    Les sections trop courtes (ex: "TITRE II - Des sociétés") sont fusionnées
+    avec la suivante pour garder leur contexte.
+    """
+    chunks = []
+    carry_article, carry = None, ''
+
+    for article, body in split_sections(text):
+        if carry:
+            body = carry + ' ' + body
+            article = article or carry_article
+            carry_article, carry = None, ''
+
+        if len(body.split()) < min_words:
+            carry_article, carry = article, body
+            continue
+
+        for window in split_windows(body, max_words, overlap):
+            chunks.append((article, window))
+
+    if carry:
+        if chunks and len(chunks[-1][1].split()) + len(carry.split()) <= max_words:
+            chunks[-1] = (chunks[-1][0], chunks[-1][1] + ' ' + carry)
+        else:
+            chunks.append((carry_article, carry))
+
+    return chunks
+
+
+def chunk_id(parent_id, index):
+    """Id d'un passage dérivé de l'id du document parent"""
+    return f"{parent_id}#{index}"
+
+
+def chunk_document(doc, max_words=CHUNK_MAX_WORDS, overlap=CHUNK_OVERLAP_WORDS):
+    """Découpe un document en passages (mêmes champs que le document + parent_id, article)
+
+    Un document qui tient en un seul passage garde son id pour ne pas dupliquer
+    les lignes déjà indexées.
+    """
+    # Quasi-doublon (voir dedup.py): rien à découper, il ne sera pas encodé
+    if doc.get('duplicate_of'):
+        yield doc
+        return
+
+    chunks = chunk_text(doc['content'], max_words, overlap)
+    single = len(chunks) == 1
+
+    for index, (article, text) in enumerate(chunks):
+        chunk = dict(doc)
+        chunk['id'] = doc['id'] if single else chunk_id(doc['id'], index)
+        chunk['parent_id'] = doc['id']
+        chunk['chunk_index'] = index
+        chunk['article'] = article
+        chunk['content'] = text
+        chunk['content_preview'] = text[:1500]
+        if article and not single:
+            chunk['title'] = f"{doc['title'][:480]} - Art. {article}"
+        yield chunk
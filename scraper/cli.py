@@ -0,0 +1,88 @@
+"""
+Point d'entrée unique des scripts d'indexation LexIA
+
+Usage:
+    python cli.py simple [--dry-run]        # scraper_simple (PostgreSQL + Chroma)
+    python cli.py officiels [--dry-run]     # scraper_sites_officiels (Chroma)
+    python cli.py pgvector [--dry-run]      # scraper_with_pgvector (Neon pgvector)
+    python cli.py check-startup [--budget-ms 1500]
+
+Chaque commande n'importe que son module: les dépendances lourdes (torch,
+chromadb, connexions) sont chargées par les étapes qui en ont besoin.
+"""
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+
+COMMANDS = {
+    "simple": "scraper_simple",
+    "officiels": "scraper_sites_officiels",
+    "pgvector": "scraper_with_pgvector",
+}
+
+# Modules qui ne doivent jamais être importés au démarrage d'un script
+HEAVY_MODULES = ["torch", "sentence_transformers", "chromadb", "onnxruntime", "transformers"]
+STARTUP_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - started) * 1000
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(f"{{elapsed:.0f}} {{','.join(heavy)}}")
+"""
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS):
+    """Mesure l'import de chaque script dans un interpréteur neuf
+
+    Échoue (code 1) si un import dépasse le budget ou charge un module lourd.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    failures = 0
+
+    for module in COMMANDS.values():
+        result = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=here, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            print(f"[ERROR] import {module} a échoué:\n{result.stderr.strip()}")
+            failures += 1
+            continue
+
+        elapsed, _, heavy = result.stdout.strip().splitlines()[-1].partition(' ')
+        if heavy:
+            print(f"[ERROR] {module}: {elapsed} ms - modules lourds importés: {heavy}")
+            failures += 1
+        elif int(elapsed) > budget_ms:
+            print(f"[ERROR] {module}: {elapsed} ms - budget de {budget_ms} ms dépassé")
+            failures += 1
+        else:
+            print(f"[OK] {module}: {elapsed} ms")
+
+    return failures == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexation LexIA")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, module in COMMANDS.items():
+        cmd = sub.add_parser(name, help=f"lancer {module}")
+        cmd.add_argument("--dry-run", action="store_true", help="ne rien encoder ni écrire")
+    startup = sub.add_parser("check-startup", help="vérifier le temps d'import des scripts")
+    startup.add_argument("--budget-ms", type=int, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    if args.command == "check-startup":
+        sys.exit(0 if check_startup(args.budget_ms) else 1)
+
+    importlib.import_module(COMMANDS[args.command]).main(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Frontière de crawl persistante pour LexIA
+File de priorité (priorité du site, profondeur), URLs déjà vues (ensemble puis
+filtre de Bloom), limites de profondeur, filtres d'URL dérivés des sélecteurs
+et points de reprise sur disque tous les N pages
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from doc_ids import normalize_url
+from html_extract import href_conditions
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRONTIER_PATH = os.getenv("CRAWL_FRONTIER_PATH", os.path.join(parent_dir, "data", "crawl_frontier"))
+
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+CRAWL_MAX_PAGES_PER_SITE = int(os.getenv("CRAWL_MAX_PAGES_PER_SITE", "200"))
+FRONTIER_CHECKPOINT_EVERY = int(os.getenv("FRONTIER_CHECKPOINT_EVERY", "20"))
+
+# Au-delà de BLOOM_THRESHOLD URLs, l'ensemble exact devient un filtre de Bloom
+BLOOM_THRESHOLD = int(os.getenv("FRONTIER_BLOOM_THRESHOLD", "100000"))
+BLOOM_CAPACITY = int(os.getenv("FRONTIER_BLOOM_CAPACITY", "5000000"))
+BLOOM_ERROR_RATE = float(os.getenv("FRONTIER_BLOOM_ERROR_RATE", "0.001"))
+
+
+def url_filter(selectors):
+    """Prédicat sur les URLs dérivé des sélecteurs CSS d'un site (attributs href)
+
+    Un sélecteur sans condition sur href accepte toutes les URLs.
+    """
+    rules = []
+    for selector in selectors:
+        conditions = href_conditions(selector)
+        if not conditions:
+            return lambda url: True
+        rules.append([(op, value.lower()) for op, value in conditions])
+
+    def accepts(url):
+        url = url.lower()
+        for conditions in rules:
+            if all(
+                (op == '*' and value in url) or
+                (op == '^' and (url.startswith(value) or urlsplit(url).path.startswith(value))) or
+                (op == '$' and url.endswith(value)) or
+                (op == '' and url == value)
+                for op, value in conditions
+            ):
+                return True
+        return False
+
+    return accepts
+
+
+class BloomFilter:
+    """Filtre de Bloom (faux positifs possibles, jamais de faux négatifs)"""
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE, bits=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(-capacity * np.log(error_rate) / np.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * np.log(2)))
+        self.bits = bits if bits is not None else np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, item):
+        # Double hachage (Kirsch-Mitzenmacher): h1 + i * h2
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= np.uint8(1 << (position & 7))
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class CrawlFrontier:
+    """File de crawl reprenable: add / pop / done / commit / checkpoint
+
+    Une URL dont la page a produit un document reste « en attente » jusqu'à
+    commit() (document écrit): un crawl tué avant l'écriture la refait.
+    `path=None`: frontière en mémoire seulement (--dry-run), sans reprise ni
+    point de reprise sur disque.
+    """
+
+    def __init__(self, path=FRONTIER_PATH, max_depth=CRAWL_MAX_DEPTH,
+                 max_pages_per_site=CRAWL_MAX_PAGES_PER_SITE, checkpoint_every=FRONTIER_CHECKPOINT_EVERY):
+        self.persistent = path is not None
+        if self.persistent:
+            os.makedirs(path, exist_ok=True)
+            self.state_path = os.path.join(path, "frontier.json")
+            self.bloom_path = os.path.join(path, "seen.bloom")
+        self.max_depth = max_depth
+        self.max_pages_per_site = max_pages_per_site
+        self.checkpoint_every = checkpoint_every
+        self.lock = threading.Lock()
+
+        self.queue = []          # tas de (priorité, profondeur, ordre, url, site)
+        self.in_flight = {}      # url -> entrée en cours de traitement
+        self.pending = {}        # url -> entrée dont le document n'est pas encore écrit
+        self.seen = set()
+        self.bloom = None
+        self.enqueued = {}       # site -> URLs mises en file
+        self.sites = {}          # site -> (priorité, hôte, filtre)
+        self.sequence = 0
+
+        # Statistiques
+        self.pages = 0
+        self.checkpoints = 0
+        self.resumed = self._load()
+
+    def _load(self):
+        if not self.persistent or not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.queue = [tuple(entry) for entry in state["queue"]]
+        heapq.heapify(self.queue)
+        self.sequence = state["sequence"]
+        self.pages = state["pages"]
+        self.enqueued = state["enqueued"]
+        if state["bloom"]:
+            bits = np.fromfile(self.bloom_path, dtype=np.uint8)
+            self.bloom = BloomFilter(state["bloom"]["capacity"], state["bloom"]["error_rate"], bits)
+        else:
+            self.seen = set(state["seen"])
+        print(f"[FRONTIER] Reprise du crawl: {len(self.queue)} URLs en file, {self.pages} pages déjà traitées")
+        return True
+
+    def _seen(self, url):
+        return url in self.bloom if self.bloom is not None else url in self.seen
+
+    def _mark_seen(self, url):
+        if self.bloom is not None:
+            self.bloom.add(url)
+            return
+        self.seen.add(url)
+        if len(self.seen) > BLOOM_THRESHOLD:
+            self.bloom = BloomFilter()
+            for seen in self.seen:
+                self.bloom.add(seen)
+            self.seen = set()
+            print(f"[FRONTIER] Plus de {BLOOM_THRESHOLD} URLs vues: passage au filtre de Bloom")
+
+    def add_site(self, site):
+        """Enregistre un site (priorité, hôte, filtre d'URL) et met sa page d'accueil en file"""
+        host = urlsplit(site['base_url']).netloc.lower()
+        self.sites[site['name']] = (site['priority'], host, url_filter(site['selectors']))
+        if not self.resumed:
+            self.add(site['base_url'], site['name'], 0)
+
+    def add(self, url, site_name, depth):
+        """Met une URL en file si elle est nouvelle, du site, assez peu profonde
+        et conforme aux sélecteurs du site. Retourne True si elle est ajoutée."""
+        priority, host, accepts = self.sites[site_name]
+        url = normalize_url(url)
+        if depth > self.max_depth:
+            return False
+        if depth > 0 and (urlsplit(url).netloc.lower() != host or not accepts(url)):
+            return False
+
+        with self.lock:
+            if self._seen(url) or self.enqueued.get(site_name, 0) >= self.max_pages_per_site:
+                return False
+            self._mark_seen(url)
+            self.enqueued[site_name] = self.enqueued.get(site_name, 0) + 1
+            self.sequence += 1
+            heapq.heappush(self.queue, (priority, depth, self.sequence, url, site_name))
+        return True
+
+    def pop(self, max_per_site=None):
+        """Prochaine entrée (url, site, profondeur), en sautant les sites déjà
+        occupés par max_per_site requêtes; None si rien n'est disponible"""
+        with self.lock:
+            busy = {}
+            for entry in self.in_flight.values():
+                busy[entry[4]] = busy.get(entry[4], 0) + 1
+
+            skipped, found = [], None
+            while self.queue:
+                entry = heapq.heappop(self.queue)
+                if max_per_site and busy.get(entry[4], 0) >= max_per_site:
+                    skipped.append(entry)
+                    continue
+                found = entry
+                break
+            for entry in skipped:
+                heapq.heappush(self.queue, entry)
+
+            if found is None:
+                return None
+            self.in_flight[found[3]] = found
+            return found[3], found[4], found[1]
+
+    def done(self, url, pending=False):
+        """Page traitée; `pending`: son document attend d'être écrit (voir commit)"""
+        with self.lock:
+            entry = self.in_flight.pop(url, None)
+            if pending and entry:
+                self.pending[url] = entry
+            self.pages += 1
+            due = self.pages % self.checkpoint_every == 0
+        if due:
+            self.checkpoint()
+
+    def commit(self, urls):
+        """Les documents de ces pages sont écrits: plus besoin de les refaire"""
+        with self.lock:
+            for url in urls:
+                self.pending.pop(normalize_url(url), None)
+
+    def is_idle(self):
+        with self.lock:
+            return not self.queue and not self.in_flight
+
+    def checkpoint(self):
+        """Écrit l'état sur disque (remplacement atomique des fichiers)
+
+        Les pages en cours et les documents non écrits sont remis en file.
+        """
+        if not self.persistent:
+            return
+        with self.lock:
+            queue = list(self.queue) + list(self.in_flight.values()) + list(self.pending.values())
+            state = {
+                "queue": queue,
+                "sequence": self.sequence,
+                "pages": self.pages,
+                "enqueued": self.enqueued,
+                "seen": None if self.bloom is not None else sorted(self.seen),
+                "bloom": {"capacity": self.bloom.capacity, "error_rate": self.bloom.error_rate}
+                if self.bloom is not None else None,
+            }
+            if self.bloom is not None:
+                self.bloom.bits.tofile(self.bloom_path + ".tmp")
+                os.replace(self.bloom_path + ".tmp", self.bloom_path)
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(self.state_path + ".tmp", self.state_path)
+            self.checkpoints += 1
+
+    def finish(self):
+        """Crawl terminé: le prochain run repart des pages d'accueil"""
+        if not self.persistent:
+            return
+        with self.lock:
+            for file_path in (self.state_path, self.bloom_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+    def report(self):
+        """Affiche l'état de la frontière"""
+        seen = f"~{self.sequence} (Bloom)" if self.bloom is not None else str(len(self.seen))
+        print(f"[FRONTIER] {self.pages} pages traitées, {len(self.queue)} en file, "
+              f"{len(self.pending)} en attente d'écriture, {seen} URLs vues, "
+              f"{self.checkpoints} points de reprise")
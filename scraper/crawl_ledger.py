@@ -0,0 +1,125 @@
+"""
+Registre de crawl persistant (SQLite) pour les re-crawls incrémentaux
+Stocke ETag, Last-Modified et hash du contenu par URL
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEDGER_PATH = os.getenv("CRAWL_LEDGER_PATH", os.path.join(parent_dir, "data", "crawl_ledger.db"))
+
+
+def content_hash(content):
+    """Hash SHA-256 du contenu (texte ou octets)"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+class CrawlLedger:
+    """Registre URL -> (ETag, Last-Modified, hash) avec GET conditionnels"""
+
+    def __init__(self, path=LEDGER_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Utilisé depuis les threads du pipeline: connexion partagée protégée par un verrou
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_ledger (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                checked_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+        """)
+        self.conn.commit()
+        self.pending = {}
+
+        # Statistiques
+        self.not_modified = 0
+        self.unchanged = 0
+        self.changed = 0
+
+    def get(self, url):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT etag, last_modified, content_hash FROM crawl_ledger WHERE url = ?", (url,)
+            ).fetchone()
+
+    def conditional_headers(self, url):
+        """Headers If-None-Match / If-Modified-Since pour un GET conditionnel"""
+        row = self.get(url)
+        headers = {}
+        if row:
+            etag, last_modified, _ = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def is_not_modified(self, url, status):
+        """True si le serveur a répondu 304 (rien à télécharger ni parser)"""
+        if status == 304:
+            with self.lock:
+                self.not_modified += 1
+                self.conn.execute(
+                    "UPDATE crawl_ledger SET checked_at = datetime('now') WHERE url = ?", (url,)
+                )
+            return True
+        return False
+
+    def is_unchanged(self, url, digest):
+        """True si le contenu téléchargé a le même hash qu'au dernier crawl"""
+        row = self.get(url)
+        with self.lock:
+            if row and row[2] == digest:
+                self.unchanged += 1
+                return True
+            self.changed += 1
+            return False
+
+    def record(self, url, headers, digest):
+        """Prépare l'entrée d'une URL (écrite par commit() une fois les documents sauvegardés)"""
+        with self.lock:
+            self.pending[url] = (headers.get('ETag'), headers.get('Last-Modified'), digest)
+
+    def commit(self, urls=None):
+        """Écrit les entrées en attente (toutes, ou seulement celles de `urls`)"""
+        with self.lock:
+            if urls is None:
+                urls = list(self.pending)
+            entries = [(url, *self.pending.pop(url)) for url in set(urls) if url in self.pending]
+            self.conn.executemany("""
+                INSERT INTO crawl_ledger (url, etag, last_modified, content_hash, checked_at)
+                VALUES (?, ?, ?, ?, datetime('now'))
+                ON CONFLICT (url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash,
+                    checked_at = excluded.checked_at
+            """, entries)
+            self.conn.commit()
+
+    def forget(self, urls):
+        """Oublie des URLs dont la sauvegarde a échoué (re-téléchargées au prochain run)"""
+        with self.lock:
+            urls = set(urls)
+            for url in urls:
+                self.pending.pop(url, None)
+            self.conn.executemany("DELETE FROM crawl_ledger WHERE url = ?", [(url,) for url in urls])
+            self.conn.commit()
+
+    def report(self):
+        """Affiche le bilan du re-crawl"""
+        print(f"[LEDGER] {self.not_modified} non modifiées (304), "
+              f"{self.unchanged} inchangées (hash), {self.changed} nouvelles ou modifiées")
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
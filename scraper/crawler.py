@@ -0,0 +1,227 @@
+"""
+Moteur de crawl asynchrone pour LexIA
+Fetch concurrent de tous les sites avec politesse par hôte (token bucket),
+robots.txt vérifié pour chaque URL et DNS mis en cache
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+from metrics import METRICS
+from robots_cache import RobotsCache
+
+# Configuration par défaut
+# Délai entre deux requêtes sur un hôte sans Crawl-delay dans son robots.txt
+DEFAULT_CRAWL_DELAY = float(os.getenv("CRAWL_DEFAULT_DELAY", "1"))
+MIN_CRAWL_DELAY = float(os.getenv("CRAWL_MIN_DELAY", "0.1"))
+DEFAULT_RATE_PER_HOST = 1 / DEFAULT_CRAWL_DELAY
+DEFAULT_BURST = 1
+MAX_CONNECTIONS = 20
+MAX_CONNECTIONS_PER_HOST = 4
+KEEPALIVE_TIMEOUT = 30
+REQUEST_TIMEOUT = 30
+# Durée de vie des résolutions DNS en secondes (vide: toute la durée du crawl)
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL")) if os.getenv("DNS_CACHE_TTL") else None
+
+
+class TokenBucket:
+    """Limiteur de débit (token bucket) pour un hôte"""
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Attend qu'un jeton soit disponible puis le consomme"""
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class Page:
+    """Réponse HTTP déjà lue (le corps est chargé en mémoire)"""
+
+    def __init__(self, url, status, headers, body, encoding=None):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoding = encoding or 'utf-8'
+
+    @property
+    def text(self):
+        return self.body.decode(self.encoding, errors='replace')
+
+
+class Download:
+    """Fichier téléchargé en flux sur disque (jamais chargé entièrement en mémoire)"""
+
+    def __init__(self, url, status, headers, path, size, digest):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.path = path
+        self.size = size
+        self.digest = digest
+
+
+class AsyncCrawler:
+    """Client HTTP asynchrone avec connexions keep-alive et politesse par hôte
+
+    Avec `robots` (défaut), chaque URL est vérifiée contre le robots.txt de son
+    hôte (RobotsDisallowed sinon) et le Crawl-delay de l'hôte remplace
+    `rate_per_host`.
+    """
+
+    def __init__(self, user_agent, rate_per_host=DEFAULT_RATE_PER_HOST, burst=DEFAULT_BURST,
+                 max_connections=MAX_CONNECTIONS, max_per_host=MAX_CONNECTIONS_PER_HOST,
+                 timeout=REQUEST_TIMEOUT, robots=True):
+        self.user_agent = user_agent
+        self.rate_per_host = rate_per_host
+        self.robots = RobotsCache(user_agent) if robots else None
+        self.burst = burst
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.session = None
+        self.buckets = {}
+
+        # Statistiques
+        self.pages = 0
+        self.errors = 0
+        self.bytes = 0
+        self.started = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_per_host,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": self.user_agent},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        self.session = None
+
+    def bucket_for(self, url):
+        """Retourne le token bucket de l'hôte de l'URL (créé à la demande)"""
+        host = urlparse(url).netloc.lower()
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_host, self.burst)
+            self.buckets[host] = bucket
+        return bucket
+
+    async def allowed(self, url):
+        """True si le robots.txt de l'hôte autorise l'URL"""
+        if self.robots is None:
+            return True
+        parser = await self.robots.get(self.session, url)
+        return parser.can_fetch(self.user_agent, url)
+
+    async def acquire(self, url):
+        """Vérifie robots.txt puis attend le jeton de l'hôte (débit du Crawl-delay)"""
+        bucket = self.bucket_for(url)
+        if self.robots is not None:
+            parser = await self.robots.check(self.session, url)
+            delay = self.robots.delay(parser, 1 / self.rate_per_host)
+            bucket.rate = 1 / max(delay, MIN_CRAWL_DELAY)
+        await bucket.acquire()
+
+    async def fetch(self, url, headers=None):
+        """Récupère une URL en respectant robots.txt et le débit de son hôte"""
+        with METRICS.timer("politeness_wait"):
+            await self.acquire(url)
+
+        try:
+            with METRICS.timer("fetch"):
+                async with self.session.get(url, headers=headers) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+            self.pages += 1
+            self.bytes += len(body)
+            METRICS.incr("pages_fetched")
+            METRICS.incr("bytes_downloaded", len(body))
+            return Page(str(response.url), response.status, response.headers,
+                        body, response.charset)
+        except Exception:
+            self.errors += 1
+            METRICS.incr("fetch_errors")
+            raise
+
+    async def download(self, url, path, max_bytes, headers=None, chunk_size=64 * 1024):
+        """Télécharge une URL en flux vers `path` (arrêt si la taille dépasse max_bytes)"""
+        with METRICS.timer("politeness_wait"):
+            await self.acquire(url)
+
+        try:
+            with METRICS.timer("download"):
+                return await self._download(url, path, max_bytes, headers, chunk_size)
+        except Exception:
+            self.errors += 1
+            METRICS.incr("fetch_errors")
+            raise
+
+    async def _download(self, url, path, max_bytes, headers, chunk_size):
+        async with self.session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status == 304:
+                return Download(str(response.url), 304, response.headers, None, 0, None)
+
+            digest = hashlib.sha256()
+            size = 0
+            with open(path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"fichier trop volumineux (> {max_bytes // (1024 * 1024)} Mo)")
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            self.pages += 1
+            self.bytes += size
+            METRICS.incr("pages_fetched")
+            METRICS.incr("bytes_downloaded", size)
+            return Download(str(response.url), response.status, response.headers,
+                            path, size, digest.hexdigest())
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return time.monotonic() - self.started
+
+    def pages_per_second(self):
+        elapsed = self.elapsed()
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        """Affiche le débit du crawl"""
+        print(f"[CRAWL] {self.pages} pages, {self.errors} erreurs, "
+              f"{self.bytes / 1024:.0f} Ko en {self.elapsed():.1f}s "
+              f"({self.pages_per_second():.2f} pages/s, {len(self.buckets)} hôtes)")
+        if self.robots is not None:
+            self.robots.report()
@@ -6,6 +6,7 @@ import sqlite3
 import os
 import re
 from dotenv import load_dotenv
+from migrations import apply_migrations
 
 # Charger env
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -75,6 +76,9 @@ cursor.execute("CREATE INDEX IF NOT EXISTS idx_legaldocument_category ON LegalDo
 
 conn.commit()
 
+# Migrations partagees avec le chemin PostgreSQL (recherche plein texte...)
+apply_migrations(conn)
+
 print("[OK] Tables creees avec succes!")
 
 # Verifier
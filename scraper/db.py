@@ -0,0 +1,212 @@
+"""
+Accès PostgreSQL partagé par les scrapers LexIA
+Pool de connexions, reconnexion avec backoff exponentiel, requêtes préparées
+et compteurs (allers-retours, retries, reconnexions)
+"""
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "4"))
+DB_MAX_RETRIES = int(os.getenv("DB_MAX_RETRIES", "5"))
+DB_BACKOFF_BASE = float(os.getenv("DB_BACKOFF_BASE", "0.5"))   # secondes
+DB_BACKOFF_MAX = float(os.getenv("DB_BACKOFF_MAX", "30"))
+# PREPARE/EXECUTE côté serveur (à désactiver derrière un pooler en mode transaction)
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
+
+# Keepalives TCP: Neon ferme les connexions inactives pendant les longs crawls
+CONNECT_OPTIONS = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+    "connect_timeout": 10,
+}
+
+# Erreurs transitoires: connexion perdue, arrêt du serveur, conflits de transaction
+TRANSIENT_SQLSTATES = {"40001", "40P01", "57P01", "57P02", "57P03"}
+
+
+def is_transient(error):
+    if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+        return True
+    code = getattr(error, "pgcode", None) or ""
+    return code in TRANSIENT_SQLSTATES or code.startswith("08")
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Curseur qui compte les allers-retours vers le serveur"""
+
+    def execute(self, query, vars=None):
+        self.connection.count_round_trip()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        self.connection.count_round_trip(len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        self.connection.count_round_trip()
+        return super().copy_expert(sql, file, size)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connexion du pool: compteurs partagés et requêtes déjà préparées"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+        self.database = None
+        self.prepared = set()
+
+    def count_round_trip(self, n=1):
+        if self.database is not None:
+            self.database.round_trips += n
+
+    def commit(self):
+        self.count_round_trip()
+        return super().commit()
+
+    def rollback(self):
+        self.count_round_trip()
+        return super().rollback()
+
+
+class Database:
+    """Pool de connexions PostgreSQL avec retry sur erreurs transitoires
+
+    Le pool n'est ouvert qu'au premier appel de run() / connection().
+    """
+
+    def __init__(self, url, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 max_retries=DB_MAX_RETRIES, prepared_statements=DB_PREPARED_STATEMENTS):
+        self.url = url
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_retries = max_retries
+        self.prepared_statements = prepared_statements
+        self.pool = None
+        self.lock = threading.Lock()
+
+        # Statistiques
+        self.round_trips = 0
+        self.retries = 0
+        self.reconnects = 0
+
+    def _pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, self.url,
+                    connection_factory=PooledConnection, **CONNECT_OPTIONS
+                )
+            return self.pool
+
+    @contextmanager
+    def connection(self):
+        """Emprunte une connexion au pool (jetée si elle est cassée)"""
+        pool = self._pool()
+        conn = pool.getconn()
+        if conn.closed:
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        conn.database = self
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = conn.closed or is_transient(e)
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
+        finally:
+            if broken:
+                self.reconnects += 1
+            pool.putconn(conn, close=broken)
+
+    def run(self, func):
+        """Exécute func(conn) et la rejoue sur une nouvelle connexion en cas
+        d'erreur transitoire (backoff exponentiel avec jitter)
+
+        func doit être rejouable: une transaction complète et idempotente.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return func(conn)
+            except psycopg2.Error as e:
+                if not is_transient(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(DB_BACKOFF_MAX, DB_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                self.retries += 1
+                print(f"  [WARN] Erreur PostgreSQL transitoire ({e.__class__.__name__}), "
+                      f"nouvel essai {attempt}/{self.max_retries} dans {delay:.1f}s")
+                time.sleep(delay)
+
+    def report(self):
+        """Affiche les compteurs d'accès à la base"""
+        print(f"[DB] {self.round_trips} allers-retours, {self.retries} retries, "
+              f"{self.reconnects} reconnexions")
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+
+@contextmanager
+def scoped_transaction(conn, name="lexia_scope"):
+    """Curseur dont les SET LOCAL et lectures ne touchent pas à la transaction de l'appelant
+
+    Sans transaction ouverte: la transaction implicite est annulée à la sortie
+    (fin des SET LOCAL). Dans une transaction de l'appelant: SAVEPOINT puis
+    ROLLBACK TO SAVEPOINT (annule les SET LOCAL), la transaction continue.
+    """
+    idle = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    with conn.cursor() as cursor:
+        if not idle:
+            cursor.execute(f"SAVEPOINT {name}")
+        try:
+            yield cursor
+        finally:
+            if idle:
+                conn.rollback()
+            else:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+                cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+
+def execute_prepared(cursor, name, sql, params=None):
+    """EXECUTE d'une requête préparée une fois par connexion (PREPARE name AS sql)
+
+    Sans support des requêtes préparées (Database.prepared_statements=False
+    ou connexion hors pool), la requête est exécutée directement.
+    """
+    conn = cursor.connection
+    database = getattr(conn, "database", None)
+    if database is None or not database.prepared_statements:
+        cursor.execute(sql, params)
+        return
+
+    if name not in conn.prepared:
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
@@ -0,0 +1,243 @@
+"""
+Détection des quasi-doublons (MinHash + LSH) avant embedding
+Le même texte de loi publié sur plusieurs sites n'est encodé et indexé qu'une fois
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+from doc_ids import normalize_key
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEDUP_PATH = os.getenv("DEDUP_INDEX_PATH", os.path.join(parent_dir, "data", "dedup_index.db"))
+
+# Paramètres MinHash / LSH
+NUM_PERM = 128
+BANDS = 32                  # 32 bandes de 4 lignes: candidat dès ~45% de similarité
+SHINGLE_WORDS = 5
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # Jaccard estimé
+
+_PRIME = np.uint64(4294967291)  # plus grand premier < 2^32
+_rng = np.random.RandomState(20240601)  # graine fixe: signatures comparables entre runs
+_A = _rng.randint(1, 2 ** 32 - 5, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 5, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Hash 32 bits des n-grammes de mots normalisés (accents et casse ignorés)"""
+    words = normalize_key(text).split()
+    if len(words) < size:
+        grams = [' '.join(words)]
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64))
+
+
+def minhash(text):
+    """Signature MinHash (NUM_PERM valeurs uint32) d'un texte"""
+    # Opérandes réduits modulo p (< 2^32): a*x + b < 2^64, pas de débordement uint64
+    hashes = shingles(text) % _PRIME
+    # (a*x + b) mod p pour toutes les permutations d'un coup: matrice (NUM_PERM, n)
+    values = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """Jaccard estimé entre deux signatures"""
+    return float(np.mean(sig_a == sig_b))
+
+
+def _band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [
+        hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+class DedupIndex:
+    """Index LSH persistant (SQLite) des documents déjà indexés et de leurs sources
+
+    Un original n'est écrit dans l'index que par commit(), une fois ses
+    passages sauvegardés; d'ici là il est gardé en mémoire (les copies
+    suivantes du même run le trouvent quand même). Un lot refusé appelle
+    forget(): ni l'original ni ses copies ne sont perdus au prochain run.
+    """
+
+    def __init__(self, path=DEDUP_PATH, threshold=DEDUP_THRESHOLD):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.threshold = threshold
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dedup_documents (
+                id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                sources TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dedup_bands (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_dedup_bands ON dedup_bands(band, bucket);
+            CREATE INDEX IF NOT EXISTS idx_dedup_bands_id ON dedup_bands(id);
+        """)
+        self.conn.commit()
+        self.pending = {}          # id -> (signature, sources) des originaux non sauvegardés
+        self.pending_bands = {}    # (bande, bucket) -> ids en attente
+
+        # Statistiques
+        self.kept = 0
+        self.duplicates = 0
+        self.chars_saved = 0
+
+    def _signature(self, doc_id):
+        if doc_id in self.pending:
+            return self.pending[doc_id][0]
+        row = self.conn.execute("SELECT signature FROM dedup_documents WHERE id = ?", (doc_id,)).fetchone()
+        return np.frombuffer(row[0], dtype=np.uint32) if row else None
+
+    def find_duplicate(self, doc_id, signature):
+        """Id du document le plus proche au-dessus du seuil (hors doc_id lui-même), ou None"""
+        candidates = set()
+        for band, bucket in enumerate(_band_keys(signature)):
+            for (candidate,) in self.conn.execute(
+                "SELECT id FROM dedup_bands WHERE band = ? AND bucket = ?", (band, bucket)
+            ):
+                if candidate != doc_id:
+                    candidates.add(candidate)
+            candidates.update(self.pending_bands.get((band, bucket), set()) - {doc_id})
+
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = similarity(signature, self._signature(candidate))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def sources(self, doc_id):
+        if doc_id in self.pending:
+            return list(self.pending[doc_id][1])
+        row = self.conn.execute("SELECT sources FROM dedup_documents WHERE id = ?", (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def _add(self, doc_id, signature, sources):
+        self.conn.execute("DELETE FROM dedup_bands WHERE id = ?", (doc_id,))
+        self.conn.execute("""
+            INSERT INTO dedup_documents (id, signature, sources) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET signature = excluded.signature, sources = excluded.sources
+        """, (doc_id, signature.tobytes(), json.dumps(sources)))
+        self.conn.executemany(
+            "INSERT INTO dedup_bands (band, bucket, id) VALUES (?, ?, ?)",
+            [(band, bucket, doc_id) for band, bucket in enumerate(_band_keys(signature))]
+        )
+
+    def _stage(self, doc_id, signature, sources):
+        """Original en attente de sauvegarde (voir commit / forget)"""
+        self._unstage(doc_id)
+        self.pending[doc_id] = (signature, sources)
+        for key in enumerate(_band_keys(signature)):
+            self.pending_bands.setdefault(key, set()).add(doc_id)
+
+    def _unstage(self, doc_id):
+        entry = self.pending.pop(doc_id, None)
+        if entry is None:
+            return None
+        for key in enumerate(_band_keys(entry[0])):
+            ids = self.pending_bands.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.pending_bands[key]
+        return entry
+
+    def _add_source(self, doc_id, source):
+        sources = self.sources(doc_id)
+        if source not in sources:
+            sources.append(source)
+            if doc_id in self.pending:
+                self.pending[doc_id] = (self.pending[doc_id][0], sources)
+                return sources
+            self.conn.execute("UPDATE dedup_documents SET sources = ? WHERE id = ?",
+                              (json.dumps(sources), doc_id))
+        return sources
+
+    def check(self, doc):
+        """Étape de pipeline: marque les quasi-doublons au lieu de les encoder
+
+        Un document original reçoit `sources` (toutes les origines connues).
+        Un doublon reçoit `duplicate_of` et `sources`: il ne doit plus être
+        encodé, seules les métadonnées de l'original sont mises à jour.
+        """
+        signature = minhash(doc['content'])
+        source = doc.get('source') or doc.get('url')
+
+        with self.lock:
+            original = self.find_duplicate(doc['id'], signature)
+            if original:
+                doc['duplicate_of'] = original
+                doc['sources'] = self._add_source(original, source)
+                self.duplicates += 1
+                self.chars_saved += len(doc['content'])
+            else:
+                sources = self.sources(doc['id'])
+                if source not in sources:
+                    sources.append(source)
+                self._stage(doc['id'], signature, sources)
+                doc['sources'] = sources
+                self.kept += 1
+            self.conn.commit()
+
+        return [doc]
+
+    def promote(self, doc):
+        """Un doublon dont l'original est introuvable devient l'original
+
+        Retourne le document sans `duplicate_of`, à découper et sauvegarder
+        (puis commit() comme tout original).
+        """
+        doc = {key: value for key, value in doc.items() if key != 'duplicate_of'}
+        source = doc.get('source') or doc.get('url')
+        with self.lock:
+            sources = self.sources(doc['id'])
+            if source not in sources:
+                sources.append(source)
+            self._stage(doc['id'], minhash(doc['content']), sources)
+            doc['sources'] = sources
+            self.duplicates -= 1
+            self.kept += 1
+            self.chars_saved -= len(doc['content'])
+        return doc
+
+    def commit(self, doc_ids):
+        """Les originaux `doc_ids` sont sauvegardés: écriture dans l'index persistant"""
+        with self.lock:
+            for doc_id in set(doc_ids):
+                entry = self._unstage(doc_id)
+                if entry is not None:
+                    self._add(doc_id, *entry)
+            self.conn.commit()
+
+    def forget(self, doc_ids):
+        """Sauvegarde échouée: les originaux `doc_ids` ne sont pas indexés"""
+        with self.lock:
+            for doc_id in set(doc_ids):
+                self._unstage(doc_id)
+
+    def report(self):
+        """Affiche le travail d'embedding économisé"""
+        total = self.kept + self.duplicates
+        ratio = self.duplicates / total * 100 if total else 0.0
+        print(f"[DEDUP] {self.duplicates}/{total} quasi-doublons écartés ({ratio:.0f}%), "
+              f"{self.chars_saved / 1024:.0f} Ko de texte non encodés")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
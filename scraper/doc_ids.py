@@ -0,0 +1,59 @@
+"""
+Identifiants stables des documents juridiques
+Même URL + même article -> même id, d'un run à l'autre et d'un script à l'autre
+"""
+
+import hashlib
+import re
+import unicodedata
+from urllib.parse import urlsplit, urlunsplit
+
+DOC_ID_DIGEST_CHARS = 32  # 128 bits de SHA-256
+
+
+def normalize_url(url):
+    """Normalise une URL (schéma/hôte en minuscules, sans fragment ni '/' final)"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+
+
+def normalize_key(key):
+    """Normalise un numéro d'article ou un titre (accents, casse, espaces)"""
+    key = unicodedata.normalize('NFKD', str(key))
+    key = ''.join(c for c in key if not unicodedata.combining(c))
+    return ' '.join(key.lower().split())
+
+
+def slugify(text):
+    """Préfixe lisible pour les ids (ex: 'Ministère de la Justice' -> 'ministere_de_la_justice')"""
+    return re.sub(r'[^a-z0-9]+', '_', normalize_key(text)).strip('_')
+
+
+def make_doc_id(url, key=None, prefix=None, ordinal=0):
+    """Id déterministe d'un document: préfixe + SHA-256(url normalisée | clé)
+
+    `key` distingue plusieurs documents d'une même page: numéro d'article de
+    préférence, sinon le titre. `ordinal` distingue les sections suivantes de
+    même clé sur la page (0 pour la première: id inchangé).
+    """
+    material = normalize_url(url)
+    if key is not None:
+        material += '|' + normalize_key(key)
+    if ordinal:
+        material += f'|{ordinal}'
+    digest = hashlib.sha256(material.encode('utf-8')).hexdigest()[:DOC_ID_DIGEST_CHARS]
+    return f"{slugify(prefix)}_{digest}" if prefix else digest
+
+
+def next_doc_id(seen, url, key=None, prefix=None):
+    """make_doc_id unique parmi les documents déjà nommés dans `seen` (dict)
+
+    Deux sections d'une page avec le même titre donneraient le même id, et
+    l'upsert Chroma refuse un lot aux ids répétés: la n-ième occurrence d'une
+    clé reçoit l'ordinal n. `seen` couvre une page ou une liste de documents.
+    """
+    name = (normalize_url(url), normalize_key(key) if key is not None else None, prefix)
+    ordinal = seen.get(name, 0)
+    seen[name] = ordinal + 1
+    return make_doc_id(url, key, prefix=prefix, ordinal=ordinal)
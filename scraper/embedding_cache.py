@@ -0,0 +1,139 @@
+"""
+Cache des embeddings par (modèle, hash du texte normalisé)
+Niveau mémoire LRU + niveau disque (float32 en fichier mappé en mémoire)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(parent_dir, "data", "embedding_cache"))
+EMBED_CACHE_LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", "10000"))
+INITIAL_ROWS = 1024
+
+
+def text_digest(model_name, text):
+    """Clé de cache: SHA-256 du nom du modèle et du texte normalisé (NFC, espaces)"""
+    normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+    return hashlib.sha256(f"{model_name}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache d'embeddings à deux niveaux avec compteurs de hits / misses"""
+
+    def __init__(self, model_name, dim, path=EMBED_CACHE_PATH, lru_size=EMBED_CACHE_LRU_SIZE):
+        os.makedirs(path, exist_ok=True)
+        self.model_name = model_name
+        self.dim = dim
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Un fichier de vecteurs par (modèle, dimension)
+        slug = hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:12]
+        self.vectors_path = os.path.join(path, f"{slug}_{dim}.f32")
+        self.conn = sqlite3.connect(os.path.join(path, f"{slug}_{dim}.db"), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache_rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.conn.commit()
+        # Prochaine ligne libre (et non le nombre de clés: ne jamais réécrire une ligne indexée)
+        self.size = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM cache_rows").fetchone()[0]
+        self._open(max(INITIAL_ROWS, self.size))
+
+        # Statistiques
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _open(self, rows):
+        current = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        if current < rows:
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(rows * 4 * self.dim)
+            current = rows
+        self.capacity = current
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(current, self.dim))
+
+    def _remember(self, key, vector):
+        self.lru[key] = vector
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def _stored_rows(self, keys):
+        """{clé: ligne} des clés déjà écrites sur disque"""
+        rows = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            rows.update(self.conn.execute(
+                f"SELECT key, row FROM cache_rows WHERE key IN ({','.join('?' * len(part))})", part
+            ))
+        return rows
+
+    def lookup(self, keys):
+        """Retourne {clé: vecteur} pour les clés présentes (mémoire puis disque)"""
+        found = {}
+        with self.lock:
+            missing = []
+            for key in keys:
+                vector = self.lru.get(key)
+                if vector is not None:
+                    self.lru.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            for key, row in self._stored_rows(missing).items():
+                vector = np.array(self.vectors[row])
+                found[key] = vector
+                self._remember(key, vector)
+                self.disk_hits += 1
+
+            self.misses += len(set(keys) - set(found))
+        return found
+
+    def store(self, keys, vectors):
+        """Ajoute des vecteurs au cache (mémoire et disque)
+
+        Une clé déjà sur disque (même sortie du LRU) n'ajoute pas de ligne:
+        le fichier ne grandit que des vecteurs réellement nouveaux.
+        """
+        with self.lock:
+            candidates = {key: vector for key, vector in zip(keys, vectors) if key not in self.lru}
+            stored = self._stored_rows(list(candidates))
+            new = [(key, vector) for key, vector in candidates.items() if key not in stored]
+            if not new:
+                return
+            if self.size + len(new) > self.capacity:
+                self.vectors.flush()
+                del self.vectors
+                self._open(max(self.size + len(new), self.capacity * 2))
+
+            entries = []
+            for key, vector in new:
+                self.vectors[self.size] = vector
+                entries.append((key, self.size))
+                self._remember(key, np.asarray(vector, dtype=np.float32))
+                self.size += 1
+
+            self.vectors.flush()
+            self.conn.executemany("INSERT OR IGNORE INTO cache_rows (key, row) VALUES (?, ?)", entries)
+            self.conn.commit()
+
+    def report(self):
+        """Affiche les compteurs du cache"""
+        total = self.memory_hits + self.disk_hits + self.misses
+        rate = (self.memory_hits + self.disk_hits) / total * 100 if total else 0.0
+        print(f"[CACHE] {self.memory_hits} hits mémoire, {self.disk_hits} hits disque, "
+              f"{self.misses} misses ({rate:.0f}% de hits, {self.size} vecteurs sur disque)")
+
+    def close(self):
+        with self.lock:
+            self.vectors.flush()
+            self.conn.close()
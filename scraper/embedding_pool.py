@@ -0,0 +1,183 @@
+"""
+Pool multi-processus d'embeddings pour LexIA
+Les lots sont répartis sur EMBED_WORKERS processus; chacun charge le modèle une
+fois, est épinglé sur sa tranche de cœurs (threads torch fixés) et écrit ses
+vecteurs directement dans une matrice float32 en mémoire partagée: seul le
+nombre de lignes écrites revient par pickle.
+"""
+
+import functools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))          # 1: modèle dans le processus principal
+EMBED_THREADS_PER_WORKER = int(os.getenv("EMBED_THREADS_PER_WORKER", "0"))  # 0: cœurs de la tranche
+EMBED_POOL_BATCH_SIZE = int(os.getenv("EMBED_POOL_BATCH_SIZE", "64"))
+# torch (sentence-transformers) | onnx | onnx-int8 (voir onnx_embedder.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+
+def available_cores():
+    """Cœurs utilisables par le processus (affinité CPU si disponible)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_slices(workers, cores=None):
+    """Découpe les cœurs en `workers` tranches contiguës (sans chevauchement si possible)"""
+    cores = cores if cores is not None else available_cores()
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size = len(cores) // workers
+    return [cores[i * size:(i + 1) * size] for i in range(workers)]
+
+
+def load_sentence_transformer(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def load_model(model_name, backend=EMBEDDING_BACKEND):
+    """Modèle d'embeddings du backend configuré (même interface d'encode)"""
+    if backend in ("onnx", "onnx-int8"):
+        from onnx_embedder import load_onnx_model
+        return load_onnx_model(model_name, backend)
+    if backend != "torch":
+        raise ValueError(f"EMBEDDING_BACKEND inconnu: {backend} (torch, onnx, onnx-int8)")
+    return load_sentence_transformer(model_name)
+
+
+# --- Côté worker -------------------------------------------------------------
+
+_worker_model = None
+_worker_buffers = {}
+
+
+def _init_worker(factory, slices, threads, counter):
+    """Initialiseur: tranche de cœurs, threads BLAS/torch, puis chargement du modèle"""
+    global _worker_model
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    cores = slices[index % len(slices)]
+    threads = threads or len(cores)
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Avant l'import de torch / numpy BLAS dans ce processus
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+
+    _worker_model = factory()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+def _attach(name):
+    """Matrice partagée du parent (attachée une fois par worker et par taille)"""
+    shm = _worker_buffers.get(name)
+    if shm is None:
+        for old in _worker_buffers.values():
+            old.close()
+        _worker_buffers.clear()
+        # Les workers partagent le resource_tracker du parent, qui détruit le segment
+        shm = SharedMemory(name=name)
+        _worker_buffers[name] = shm
+    return shm
+
+
+def _encode_into(name, capacity, dim, start, texts, batch_size):
+    """Encode `texts` et écrit les vecteurs dans les lignes start.. de la matrice partagée"""
+    shm = _attach(name)
+    output = np.ndarray((capacity, dim), dtype=np.float32, buffer=shm.buf)
+    vectors = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                   show_progress_bar=False)
+    output[start:start + len(texts)] = vectors
+    return len(texts)
+
+
+# --- Côté parent -------------------------------------------------------------
+
+class EmbeddingPool:
+    """Exécuteur d'embeddings réparti sur plusieurs processus
+
+    Même interface d'encode que SentenceTransformer; `shards_batches` indique à
+    EmbeddingStage de lui confier tous les textes d'un coup plutôt que lot par
+    lot, pour que les workers travaillent en parallèle.
+    """
+
+    shards_batches = True
+
+    def __init__(self, model_name, dim, workers=EMBED_WORKERS, threads_per_worker=EMBED_THREADS_PER_WORKER,
+                 batch_size=EMBED_POOL_BATCH_SIZE, factory=None):
+        self.dim = dim
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.slices = core_slices(self.workers)
+        self.threads = threads_per_worker or len(self.slices[0])
+        factory = factory or functools.partial(load_model, model_name, EMBEDDING_BACKEND)
+
+        # spawn: pas d'état torch / threads hérité par fork
+        context = get_context("spawn")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(factory, self.slices, threads_per_worker, context.Value("i", 0)),
+        )
+        self.shm = None
+        self.capacity = 0
+        print(f"[EMBED] Pool de {self.workers} processus ({len(self.slices[0])} cœur(s), "
+              f"{self.threads} thread(s) chacun)")
+
+    def _reserve(self, rows):
+        """Matrice partagée d'au moins `rows` lignes (agrandie par doublement)"""
+        if rows <= self.capacity:
+            return
+        capacity = max(rows, 2 * self.capacity, self.batch_size)
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+        self.shm = SharedMemory(create=True, size=capacity * self.dim * 4)
+        self.capacity = capacity
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        """Matrice float32 (len(texts), dim); les lots partent en parallèle"""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+        self._reserve(len(texts))
+
+        futures = [
+            self.executor.submit(_encode_into, self.shm.name, self.capacity, self.dim,
+                                 start, texts[start:start + batch_size], batch_size)
+            for start in range(0, len(texts), batch_size)
+        ]
+        wait(futures)
+        for future in futures:
+            future.result()   # propage l'erreur d'un worker
+
+        output = np.ndarray((self.capacity, self.dim), dtype=np.float32, buffer=self.shm.buf)
+        return output[:len(texts)].copy()
+
+    def close(self):
+        self.executor.shutdown()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def load_embedding_model(model_name, dim, workers=EMBED_WORKERS):
+    """Modèle (EMBEDDING_BACKEND) dans le processus, ou EmbeddingPool si workers > 1"""
+    if workers > 1:
+        return EmbeddingPool(model_name, dim, workers=workers)
+    return load_model(model_name)
@@ -0,0 +1,109 @@
+"""
+Étape d'embeddings par lots pour LexIA
+Encode les documents par lots triés par longueur -> matrice float32
+"""
+
+import io
+import os
+import time
+
+import numpy as np
+
+from metrics import METRICS
+
+# Taille de lot configurable (à ajuster selon la machine d'indexation)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+
+class EmbeddingStage:
+    """Encode des textes par lots et mesure le débit (docs/s)
+
+    Avec un `cache` (voir embedding_cache.py), seuls les textes jamais vus
+    passent par le modèle. Avec un `loader` à la place de `model`, le modèle
+    n'est chargé qu'au premier texte réellement à encoder.
+    """
+
+    def __init__(self, model=None, batch_size=EMBED_BATCH_SIZE, cache=None, loader=None):
+        self.model = model
+        self.loader = loader
+        self.batch_size = batch_size
+        self.cache = cache
+        self.docs = 0
+        self.seconds = 0.0
+
+    def encode(self, texts):
+        """Retourne une matrice float32 (len(texts), dim) dans l'ordre d'entrée"""
+        if self.cache is None:
+            return self._encode(texts)
+
+        from embedding_cache import text_digest
+
+        keys = [text_digest(self.cache.model_name, text) for text in texts]
+        found = self.cache.lookup(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        METRICS.incr("embedding_cache_hits", len(texts) - len(missing))
+
+        if missing:
+            encoded = self._encode([texts[i] for i in missing])
+            self.cache.store([keys[i] for i in missing], encoded)
+            found.update(zip((keys[i] for i in missing), encoded))
+
+        matrix = np.empty((len(texts), self.cache.dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            matrix[i] = found[key]
+        return matrix
+
+    def _encode(self, texts):
+        if self.model is None:
+            self.model = self.loader()
+        started = time.perf_counter()
+
+        # Trier par longueur pour limiter le padding dans chaque lot
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        matrix = None
+
+        if getattr(self.model, "shards_batches", False):
+            # Pool multi-processus (embedding_pool.py): tous les lots partent
+            # ensemble, une seule mesure "embed" pour l'appel
+            with METRICS.timer("embed"):
+                batch = self.model.encode([texts[i] for i in order], batch_size=self.batch_size)
+            matrix = np.empty_like(batch)
+            matrix[order] = batch
+        else:
+            for start in range(0, len(texts), self.batch_size):
+                idx = order[start:start + self.batch_size]
+                with METRICS.timer("embed"):
+                    batch = self.model.encode(
+                        [texts[i] for i in idx],
+                        batch_size=len(idx),
+                        convert_to_numpy=True,
+                        show_progress_bar=False,
+                    )
+                if matrix is None:
+                    matrix = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+                matrix[idx] = batch
+
+        self.docs += len(texts)
+        self.seconds += time.perf_counter() - started
+        METRICS.incr("texts_embedded", len(texts))
+
+        if matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return matrix
+
+    def docs_per_second(self):
+        return self.docs / self.seconds if self.seconds > 0 else 0.0
+
+    def report(self):
+        """Affiche le débit d'encodage"""
+        print(f"[EMBED] {self.docs} documents encodés en {self.seconds:.2f}s "
+              f"({self.docs_per_second():.1f} docs/s, lots de {self.batch_size})")
+
+
+def vectors_to_pg(matrix):
+    """Sérialise toutes les lignes au format texte pgvector ('[x,y,...]') en une passe"""
+    if len(matrix) == 0:
+        return []
+    buffer = io.StringIO()
+    np.savetxt(buffer, np.asarray(matrix, dtype=np.float32), fmt='%.8g', delimiter=',')
+    return ['[' + line + ']' for line in buffer.getvalue().splitlines()]
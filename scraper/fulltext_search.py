@@ -0,0 +1,104 @@
+"""
+Recherche plein texte dans "LegalDocument" (index GIN ou FTS5, voir migrations.py)
+Classement ts_rank_cd (PostgreSQL) ou bm25 (SQLite), sans parcours séquentiel
+
+Usage:
+    python fulltext_search.py "capital minimum SARL" [--k 5] [--category droit_societes]
+"""
+
+import argparse
+import os
+import re
+import sys
+
+from migrations import DIALECT_SQLITE, dialect_of
+
+FULLTEXT_CONFIG = "french"
+
+
+def _fts5_query(text):
+    """Requête FTS5 sûre: mots entre guillemets reliés par OR"""
+    words = re.findall(r"\w+", text)
+    return " OR ".join(f'"{word}"' for word in words)
+
+
+def fulltext_search(conn, text, k=5, category=None):
+    """Top-k plein texte -> [(id, title, category, contentPreview, sourceUrl, rank)]"""
+    if dialect_of(conn) == DIALECT_SQLITE:
+        query = _fts5_query(text)
+        if not query:
+            return []
+        sql = """
+            SELECT d.id, d.title, d.category, d.contentPreview, d.sourceUrl, -bm25(LegalDocument_fts) AS rank
+            FROM LegalDocument_fts JOIN LegalDocument d ON d.rowid = LegalDocument_fts.rowid
+            WHERE LegalDocument_fts MATCH ?
+        """
+        params = [query]
+        if category:
+            sql += " AND d.category = ?"
+            params.append(category)
+        sql += " ORDER BY rank DESC LIMIT ?"
+        params.append(int(k))
+        return conn.execute(sql, params).fetchall()
+
+    # websearch_to_tsquery: syntaxe utilisateur ("...", -mot, or) sans erreur de parsing
+    sql = f"""
+        SELECT id, title, category, "contentPreview", "sourceUrl",
+               ts_rank_cd("searchVector", query) AS rank
+        FROM "LegalDocument", websearch_to_tsquery('{FULLTEXT_CONFIG}', %s) AS query
+        WHERE "searchVector" @@ query
+    """
+    params = [text]
+    if category:
+        sql += " AND category = %s"
+        params.append(category)
+    sql += " ORDER BY rank DESC LIMIT %s"
+    params.append(int(k))
+
+    from db import scoped_transaction
+
+    # Transaction de l'appelant conservée (hybrid_search partage la connexion)
+    with scoped_transaction(conn) as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return rows
+
+
+class FulltextIndex:
+    """Adaptateur avec l'interface de LexicalIndex.search (pour hybrid_search)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def search(self, query, k=10, category=None):
+        return [(row[0], row[5]) for row in fulltext_search(self.conn, query, k, category)]
+
+
+def main():
+    from dotenv import load_dotenv
+    from migrations import apply_migrations, connect
+
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv(os.path.join(parent_dir, '.env'))
+
+    parser = argparse.ArgumentParser(description="Recherche plein texte LexIA")
+    parser.add_argument("text")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--category")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("[ERROR] DATABASE_URL non trouvée dans .env")
+        sys.exit(1)
+
+    conn = connect(database_url)
+    apply_migrations(conn)
+    for doc_id, title, category, preview, url, rank in fulltext_search(conn, args.text, args.k, args.category):
+        print(f"{rank:.3f}  [{category}] {title}")
+        print(f"       {(preview or '')[:150]}...")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Extraction HTML en un seul parsing lxml pour LexIA
+Titre, liens sortants et texte principal calculés sur le même arbre; le texte
+principal est choisi par densité de texte (blocs peu chargés en liens) plutôt
+que par des noms de balises ou de classes
+"""
+
+import re
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+# Éléments jamais utiles au texte (retirés après l'extraction des liens)
+BOILERPLATE_TAGS = ('script', 'style', 'noscript', 'template', 'iframe', 'svg', 'canvas',
+                    'nav', 'header', 'footer', 'aside', 'button', 'select')
+
+BLOCK_TAGS = frozenset([
+    'html', 'body', 'main', 'article', 'section', 'div', 'p', 'pre', 'blockquote',
+    'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'form', 'fieldset', 'figure', 'figcaption',
+    'center', 'address', 'details', 'summary', 'caption',
+])
+
+# Au-delà de cette part de texte en liens, un bloc est de la navigation
+MAX_LINK_DENSITY = 0.5
+
+# a[href*='texte'], a[href$='.pdf'], a[href^='/lois'], a[href='...']
+SELECTOR_HREF_RE = re.compile(r"""\[href([*^$]?)=['"]([^'"]+)['"]\]""")
+
+_PARSERS = {}
+
+
+def href_conditions(selector):
+    """Conditions [(opérateur, valeur)] d'un sélecteur CSS sur l'attribut href"""
+    return SELECTOR_HREF_RE.findall(selector)
+
+
+def href_matcher(selectors):
+    """Prédicat sur la valeur brute de href, équivalent aux sélecteurs CSS a[href...]
+
+    Un sélecteur sans condition sur href accepte tous les liens.
+    """
+    rules = []
+    for selector in selectors:
+        conditions = href_conditions(selector)
+        if not conditions:
+            return lambda href: True
+        rules.append(conditions)
+
+    def matches(href):
+        for conditions in rules:
+            if all(
+                (op == '*' and value in href) or
+                (op == '^' and href.startswith(value)) or
+                (op == '$' and href.endswith(value)) or
+                (op == '' and href == value)
+                for op, value in conditions
+            ):
+                return True
+        return False
+
+    return matches
+
+
+def parse_html(body, encoding='utf-8'):
+    """Arbre lxml d'une page (octets ou texte); document vide -> <html> vide"""
+    if isinstance(body, str):
+        body, encoding = body.encode('utf-8'), 'utf-8'
+    if not body or not body.strip():
+        return lxml.html.Element('html')
+    try:
+        return lxml.html.document_fromstring(body, parser=_parser(encoding))
+    except LookupError:
+        # Encodage annoncé inconnu: lu comme de l'UTF-8
+        return lxml.html.document_fromstring(body, parser=_parser('utf-8'))
+    except etree.ParserError:
+        return lxml.html.Element('html')
+
+
+def _parser(encoding):
+    """Parser lxml par encodage (réutilisé d'une page à l'autre)"""
+    encoding = encoding.lower()
+    parser = _PARSERS.get(encoding)
+    if parser is None:
+        parser = lxml.html.HTMLParser(encoding=encoding, remove_comments=True, remove_pis=True)
+        _PARSERS[encoding] = parser
+    return parser
+
+
+def _clean(text):
+    return ' '.join(text.split())
+
+
+def extract_title(tree):
+    """Texte de <title>, sinon du premier <h1> ('' si aucun)"""
+    for path in ('.//title', './/h1'):
+        element = tree.find(path)
+        if element is not None:
+            title = _clean(element.text_content())
+            if title:
+                return title
+    return ''
+
+
+def extract_links(tree, base_url, selectors):
+    """URLs absolues des liens <a href> conformes aux sélecteurs du site (sans doublons)"""
+    matches = href_matcher(selectors)
+    links = {}
+    for anchor in tree.iter('a'):
+        href = anchor.get('href')
+        if href and matches(href):
+            links[urljoin(base_url, href.strip())] = None
+    return list(links)
+
+
+def _text_pieces(root):
+    """Morceaux de texte dans l'ordre du document -> [(texte, bloc, dans un lien)]
+
+    Chaque morceau (texte ou queue d'un élément) appartient au bloc le plus
+    proche qui le contient.
+    """
+    pieces = []
+    owner = {}
+    in_link = set()
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        parent = element.getparent()
+        if event == 'start':
+            owner[element] = element if element.tag in BLOCK_TAGS else owner.get(parent, root)
+            if element.tag == 'a' or parent in in_link:
+                in_link.add(element)
+            if element.text and element.text.strip():
+                pieces.append((element.text, owner[element], element in in_link))
+        elif element is not root and element.tail and element.tail.strip():
+            pieces.append((element.tail, owner.get(parent, root), parent in in_link))
+    return pieces
+
+
+def extract_main_text(tree):
+    """Texte principal par densité de texte
+
+    Le conteneur retenu maximise (texte hors liens)² / texte total sur son
+    sous-arbre: beaucoup de texte, peu de liens. On en garde le texte, sans
+    les blocs où les liens dominent (menus, fils d'Ariane, listes de liens).
+    Modifie l'arbre: extraire titre et liens avant.
+    """
+    for element in list(tree.iter(*BOILERPLATE_TAGS)):
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    body = tree.find('.//body')
+    root = body if body is not None else tree
+
+    pieces = _text_pieces(root)
+    chars, link_chars = {}, {}
+    for text, block, is_link in pieces:
+        length = len(text.strip())
+        chars[block] = chars.get(block, 0) + length
+        if is_link:
+            link_chars[block] = link_chars.get(block, 0) + length
+
+    # Totaux par sous-arbre: chaque bloc remonte ses caractères à ses ancêtres
+    subtree_chars, subtree_links = dict(chars), dict(link_chars)
+    for block, length in chars.items():
+        links = link_chars.get(block, 0)
+        for ancestor in block.iterancestors():
+            subtree_chars[ancestor] = subtree_chars.get(ancestor, 0) + length
+            subtree_links[ancestor] = subtree_links.get(ancestor, 0) + links
+            if ancestor is root:
+                break
+
+    best, best_score = root, -1.0
+    for element in root.iter():
+        total = subtree_chars.get(element)
+        if not total:
+            continue
+        text_chars = total - subtree_links.get(element, 0)
+        score = text_chars * text_chars / total
+        if score > best_score:
+            best, best_score = element, score
+
+    inside = set(best.iter())
+    bad = {block for block, length in chars.items() if link_chars.get(block, 0) > length * MAX_LINK_DENSITY}
+    return _clean(' '.join(text for text, block, is_link in pieces if block in inside and block not in bad))
+
+
+class ExtractedPage:
+    """Résultat d'extract_page: titre, texte principal et liens d'une page"""
+
+    def __init__(self, title, text, links):
+        self.title = title
+        self.text = text
+        self.links = links
+
+
+def extract_page(body, base_url, selectors=None, encoding='utf-8'):
+    """Un parsing: titre, liens (si sélecteurs) puis texte principal"""
+    tree = parse_html(body, encoding)
+    title = extract_title(tree)
+    links = extract_links(tree, base_url, selectors) if selectors else []
+    return ExtractedPage(title, extract_main_text(tree), links)
@@ -0,0 +1,243 @@
+"""
+Index lexical BM25 des passages juridiques (français)
+Index inversé SQLite mis à jour au fil des scrapers + fusion RRF avec la recherche vectorielle
+
+Usage:
+    python lexical_index.py "capital minimum SARL" [--k 5] [--category droit_societes]
+"""
+
+import argparse
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(parent_dir, "data", "lexical_index.db"))
+
+# Paramètres BM25 (valeurs usuelles) et constante de la fusion RRF
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Mots vides (déjà sans accents: comparés après fold)
+FRENCH_STOPWORDS = frozenset("""
+    a au aux avec c ce ceci cela ces cet cette d dans de des du elle elles en est et etre
+    eux il ils j je l la le les leur leurs lui m ma mais me meme mes moi mon n ne nos notre
+    nous on ou par pas pour qu que quel quelle quelles quels qui s sa sans se ses si son
+    sont sur t ta te tes toi ton tu un une vos votre vous y ete etait sera peut doit
+    fait lors dont tout tous toute toutes comme donc car ni plus moins tres comment combien
+""".split())
+
+# Suffixes retirés par la racinisation légère, du plus long au plus court
+FRENCH_SUFFIXES = sorted([
+    "issement", "ement", "ation", "ateur", "atrice", "ite", "ique", "euse", "eur",
+    "ive", "if", "elle", "ienne", "ien", "ee", "er", "e",
+], key=len, reverse=True)
+
+
+@lru_cache(maxsize=200000)
+def stem(word):
+    """Racinisation légère: pluriel, féminin et suffixes fréquents
+
+    'sociétés', 'Societe' -> 'societ'; 'commerciaux' -> 'commercial';
+    'fiscalité' -> 'fiscal'. Les mots courts et les nombres sont gardés tels quels.
+    """
+    if len(word) < 5 or word.isdigit():
+        return word
+    if word.endswith("aux"):
+        word = word[:-3] + "al"
+    elif word[-1] in "sx":
+        word = word[:-1]
+    for suffix in FRENCH_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def fold(text):
+    """Minuscules sans accents ('Société' et 'Societe' -> 'societe')"""
+    text = text.lower().replace('œ', 'oe').replace('æ', 'ae')
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+def tokenize(text):
+    """Termes indexés: minuscules sans accents, sans mots vides, racinisés"""
+    return [stem(token) for token in TOKEN_RE.findall(fold(text))
+            if token not in FRENCH_STOPWORDS and len(token) > 1]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fusionne des listes d'ids classées -> [(id, score)] par score RRF décroissant
+
+    score(d) = somme sur les listes de 1 / (k + rang(d)), rang à partir de 1.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """Index inversé BM25 persistant: add / remove / search"""
+
+    def __init__(self, path=LEXICAL_INDEX_PATH, k1=BM25_K1, b=BM25_B):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                category TEXT,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS document_terms (
+                id TEXT PRIMARY KEY,
+                terms TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+
+        # Statistiques
+        self.indexed = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def _remove(self, ids):
+        """Retire des passages (leur liste de termes évite un index sur postings(id))"""
+        placeholders = ','.join('?' * len(ids))
+        old = self.conn.execute(
+            f"SELECT id, terms FROM document_terms WHERE id IN ({placeholders})", ids
+        ).fetchall()
+        if not old:
+            return
+        keys = sorted((term, doc_id) for doc_id, terms in old for term in terms.split())
+        self.conn.executemany("DELETE FROM postings WHERE term = ? AND id = ?", keys)
+        self.conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?",
+                              [(count, term) for term, count in Counter(term for term, _ in keys).items()])
+        self.conn.execute("DELETE FROM terms WHERE df <= 0")
+        self.conn.execute(f"DELETE FROM documents WHERE id IN ({placeholders})", ids)
+        self.conn.execute(f"DELETE FROM document_terms WHERE id IN ({placeholders})", ids)
+
+    def add(self, documents):
+        """Indexe (ou ré-indexe) des passages: dicts avec id, title, content, category"""
+        documents = list({doc['id']: doc for doc in documents}.values())
+        if not documents:
+            return
+
+        rows, term_lists, postings, df = [], [], [], Counter()
+        for doc in documents:
+            counts = Counter(tokenize(f"{doc.get('title', '')} {doc['content']}"))
+            rows.append((doc['id'], doc.get('category'), sum(counts.values())))
+            term_lists.append((doc['id'], ' '.join(counts)))
+            postings.extend((term, doc['id'], tf) for term, tf in counts.items())
+            df.update(counts.keys())
+
+        with self.lock:
+            ids = [doc['id'] for doc in documents]
+            for start in range(0, len(ids), 500):
+                self._remove(ids[start:start + 500])
+            self.conn.executemany("INSERT INTO documents (id, category, length) VALUES (?, ?, ?)", rows)
+            self.conn.executemany("INSERT INTO document_terms (id, terms) VALUES (?, ?)", term_lists)
+            # Insertion dans l'ordre de la clé primaire: pages B-tree contiguës
+            postings.sort()
+            self.conn.executemany("INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)", postings)
+            self.conn.executemany("""
+                INSERT INTO terms (term, df) VALUES (?, ?)
+                ON CONFLICT (term) DO UPDATE SET df = df + excluded.df
+            """, sorted(df.items()))
+            self.conn.commit()
+        self.indexed += len(documents)
+
+    def remove(self, ids):
+        with self.lock:
+            for start in range(0, len(ids), 500):
+                self._remove(list(ids[start:start + 500]))
+            self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def search(self, query, k=10, category=None):
+        """Top-k BM25 -> [(id, score)]"""
+        started = time.perf_counter()
+        terms = Counter(tokenize(query))
+        scores = {}
+
+        with self.lock:
+            total, total_length = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents"
+            ).fetchone()
+            avg_length = total_length / total if total else 0.0
+
+            for term, query_tf in terms.items():
+                row = self.conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+                if not row:
+                    continue
+                idf = math.log(1 + (total - row[0] + 0.5) / (row[0] + 0.5))
+                sql = """
+                    SELECT p.id, p.tf, d.length FROM postings p JOIN documents d ON d.id = p.id
+                    WHERE p.term = ?
+                """
+                params = [term]
+                if category:
+                    sql += " AND d.category = ?"
+                    params.append(category)
+                for doc_id, tf, length in self.conn.execute(sql, params):
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + query_tf * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return ranked
+
+    def report(self):
+        """Affiche les compteurs de l'index"""
+        average = self.query_seconds / self.queries * 1000 if self.queries else 0.0
+        print(f"[BM25] {self.indexed} passages indexés ({self.count()} au total), "
+              f"{self.queries} requêtes ({average:.1f} ms en moyenne)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche BM25 LexIA")
+    parser.add_argument("text")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--category")
+    args = parser.parse_args()
+
+    index = LexicalIndex()
+    for doc_id, score in index.search(args.text, args.k, args.category):
+        print(f"{score:6.2f}  {doc_id}")
+    index.report()
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
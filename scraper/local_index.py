@@ -0,0 +1,315 @@
+"""
+Index vectoriel local (alternative hors-ligne à Chroma Cloud)
+Vecteurs float32 en fichier mappé en mémoire + index IVF persistant
+
+Avec LOCAL_INDEX_QUANTIZATION=int8, les candidats sont notés sur des codes
+int8 (4x moins de mémoire parcourue) puis re-classés sur les float32.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from quantize import QUANTIZATION_NONE, QUANTIZATION_INT8, RERANK_FACTOR, quantize_int8, int8_scores, rerank
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", os.path.join(parent_dir, "data", "vector_index"))
+
+EMBEDDING_DIM = 384          # all-MiniLM-L6-v2
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# IVF: recherche exacte tant que l'index est petit, puis listes inversées
+IVF_TRAIN_MIN = int(os.getenv("IVF_TRAIN_MIN", "4096"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+INITIAL_CAPACITY = 1024
+
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", QUANTIZATION_NONE)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans(vectors, k, iterations=10, seed=0):
+    """k-means sphérique (produit scalaire) sur des vecteurs normalisés"""
+    rng = np.random.RandomState(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class LocalVectorIndex:
+    """Index ANN persistant: add / upsert / query sur des vecteurs normalisés (cosinus)"""
+
+    def __init__(self, path=LOCAL_INDEX_PATH, dim=EMBEDDING_DIM, nprobe=IVF_NPROBE,
+                 quantization=LOCAL_INDEX_QUANTIZATION):
+        if quantization not in (QUANTIZATION_NONE, QUANTIZATION_INT8):
+            raise ValueError(f"Quantification non supportée par l'index local: {quantization}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                list INTEGER NOT NULL DEFAULT -1,
+                document TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_vectors_list ON vectors(list);
+        """)
+        self.conn.commit()
+
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.codes_path = os.path.join(path, "codes.i8")
+        self.scales_path = os.path.join(path, "scales.f32")
+        self.centroids_path = os.path.join(path, "centroids.npy")
+        self.centroids = np.load(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        self.size = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+        if quantization == QUANTIZATION_NONE:
+            # Les codes int8 ne seraient plus tenus à jour: ils seront recalculés
+            for file_path in (self.codes_path, self.scales_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        self._open(max(INITIAL_CAPACITY, self.size))
+
+    def _open(self, capacity):
+        """(Re)mappe le fichier de vecteurs avec au moins `capacity` lignes"""
+        current = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        if current < capacity:
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(capacity * 4 * self.dim)
+        else:
+            capacity = current
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        if self.quantization == QUANTIZATION_INT8:
+            self._open_codes(capacity)
+
+    def _open_codes(self, capacity):
+        """Mappe les codes int8 et les échelles; les (re)calcule pour un index existant"""
+        built = os.path.exists(self.codes_path) and os.path.getsize(self.codes_path) >= self.size * self.dim
+        for file_path, row_bytes in ((self.codes_path, self.dim), (self.scales_path, 4)):
+            with open(file_path, 'ab') as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.codes = np.memmap(self.codes_path, dtype=np.int8, mode='r+', shape=(capacity, self.dim))
+        self.scales = np.memmap(self.scales_path, dtype=np.float32, mode='r+', shape=(capacity,))
+
+        if not built and self.size:
+            for start in range(0, self.size, 65536):
+                stop = min(self.size, start + 65536)
+                self.codes[start:stop], self.scales[start:stop] = quantize_int8(self.vectors[start:stop])
+            self.codes.flush()
+            self.scales.flush()
+
+    def _ensure_capacity(self, rows):
+        if rows > self.capacity:
+            self.vectors.flush()
+            del self.vectors
+            if self.quantization == QUANTIZATION_INT8:
+                self.codes.flush()
+                self.scales.flush()
+                del self.codes, self.scales
+            self._open(max(rows, self.capacity * 2))
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _assign(self, vectors):
+        if self.centroids is None:
+            return np.full(len(vectors), -1)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def upsert(self, ids, vectors, documents=None, metadatas=None):
+        """Ajoute ou remplace des vecteurs (un id existant garde sa ligne)"""
+        vectors = _normalize(vectors)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self.lock:
+            existing = dict(self.conn.execute(
+                f"SELECT id, row FROM vectors WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+            ).fetchall()) if ids else {}
+
+            rows = []
+            for doc_id in ids:
+                if doc_id in existing:
+                    rows.append(existing[doc_id])
+                else:
+                    existing[doc_id] = self.size
+                    rows.append(self.size)
+                    self.size += 1
+
+            self._ensure_capacity(self.size)
+            self.vectors[rows] = vectors
+            if self.quantization == QUANTIZATION_INT8:
+                self.codes[rows], self.scales[rows] = quantize_int8(vectors)
+            lists = self._assign(vectors)
+
+            self.conn.executemany("""
+                INSERT INTO vectors (row, id, list, document, metadata) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (row) DO UPDATE SET
+                    list = excluded.list, document = excluded.document, metadata = excluded.metadata
+            """, [
+                (row, doc_id, int(lst), doc, json.dumps(meta) if meta is not None else None)
+                for row, doc_id, lst, doc, meta in zip(rows, ids, lists, documents, metadatas)
+            ])
+            self.conn.commit()
+            self.vectors.flush()
+            if self.quantization == QUANTIZATION_INT8:
+                self.codes.flush()
+                self.scales.flush()
+
+            if self.centroids is None and self.size >= IVF_TRAIN_MIN:
+                self._train()
+
+    add = upsert
+
+    def _train(self):
+        """Entraîne les centroïdes IVF (~sqrt(n) listes) et réassigne toutes les lignes"""
+        data = np.asarray(self.vectors[:self.size])
+        k = max(1, int(np.sqrt(self.size)))
+        sample = data[np.random.RandomState(0).choice(self.size, min(self.size, k * 64), replace=False)]
+        self.centroids = _kmeans(sample, k)
+        np.save(self.centroids_path, self.centroids)
+
+        lists = self._assign(data)
+        self.conn.executemany("UPDATE vectors SET list = ? WHERE row = ?",
+                              [(int(lst), row) for row, lst in enumerate(lists)])
+        self.conn.commit()
+        print(f"[INDEX] IVF entraîné: {k} listes pour {self.size} vecteurs")
+
+    def _candidate_rows(self, query, where=None):
+        sql = "SELECT row FROM vectors"
+        clauses, params = [], []
+        if self.centroids is not None:
+            probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            clauses.append(f"list IN ({','.join('?' * len(probes))})")
+            params.extend(int(p) for p in probes)
+        for key, value in (where or {}).items():
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", value])
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return np.array([row for (row,) in self.conn.execute(sql, params)], dtype=np.int64)
+
+    def query(self, vector, k=5, where=None):
+        """Top-k cosinus -> [(id, score, document, metadata)]"""
+        query = _normalize(np.asarray(vector).reshape(1, -1))[0]
+        with self.lock:
+            rows = self._candidate_rows(query, where)
+            if len(rows) == 0:
+                return []
+            if self.quantization == QUANTIZATION_INT8:
+                # Présélection sur les codes int8, re-ranking float32 des meilleurs
+                approx = int8_scores(self.codes[rows], self.scales[rows], query)
+                candidates = rows[np.argsort(-approx)[:k * RERANK_FACTOR]]
+                best, best_scores = rerank(candidates, self.vectors, query, k)
+            else:
+                scores = self.vectors[rows] @ query
+                top = np.argsort(-scores)[:k]
+                best, best_scores = rows[top], scores[top]
+            found = {
+                row: (doc_id, doc, meta)
+                for row, doc_id, doc, meta in self.conn.execute(
+                    f"SELECT row, id, document, metadata FROM vectors WHERE row IN ({','.join('?' * len(best))})",
+                    [int(r) for r in best]
+                )
+            }
+        return [
+            (found[row][0], float(score), found[row][1], json.loads(found[row][2]) if found[row][2] else {})
+            for row, score in zip(best.tolist(), best_scores.tolist())
+        ]
+
+    def get(self, where=None):
+        """Ids et métadonnées des lignes dont les métadonnées correspondent à `where`"""
+        clauses, params = [], []
+        for key, value in (where or {}).items():
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", value])
+        sql = "SELECT id, metadata FROM vectors" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [(doc_id, json.loads(meta) if meta else {}) for doc_id, meta in rows]
+
+    def update_metadata(self, ids, metadatas):
+        with self.lock:
+            self.conn.executemany("UPDATE vectors SET metadata = ? WHERE id = ?",
+                                  [(json.dumps(meta), doc_id) for doc_id, meta in zip(ids, metadatas)])
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.vectors.flush()
+            if self.quantization == QUANTIZATION_INT8:
+                self.codes.flush()
+                self.scales.flush()
+            self.conn.close()
+
+
+class LocalCollection:
+    """Sous-ensemble de l'API d'une collection Chroma au-dessus de LocalVectorIndex
+
+    Les embeddings (calculés côté serveur par Chroma Cloud) sont ici calculés
+    localement avec le même modèle 384 dimensions.
+    """
+
+    def __init__(self, index, embed):
+        self.index = index
+        self.embed = embed  # fonction liste de textes -> matrice float32
+
+    def count(self):
+        return self.index.count()
+
+    def upsert(self, ids, documents, metadatas=None):
+        self.index.upsert(ids, self.embed(documents), documents, metadatas)
+
+    add = upsert
+
+    def query(self, query_texts, n_results=10, where=None):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for vector in self.embed(query_texts):
+            hits = self.index.query(vector, n_results, where)
+            results["ids"].append([hit[0] for hit in hits])
+            results["distances"].append([1.0 - hit[1] for hit in hits])
+            results["documents"].append([hit[2] for hit in hits])
+            results["metadatas"].append([hit[3] for hit in hits])
+        return results
+
+    def get(self, where=None, include=None):
+        rows = self.index.get(where)
+        return {"ids": [row[0] for row in rows], "metadatas": [row[1] for row in rows]}
+
+    def update(self, ids, metadatas):
+        self.index.update_metadata(ids, metadatas)
+
+
+def open_local_collection(path=LOCAL_INDEX_PATH):
+    """Collection locale avec le modèle all-MiniLM-L6-v2 (chargé une seule fois)
+
+    Même chargeur que les scrapers: EMBEDDING_BACKEND (torch, onnx, onnx-int8)
+    et EMBED_WORKERS s'appliquent aussi à VECTOR_BACKEND=local.
+    """
+    from embedding_pool import load_embedding_model
+    from embedding_stage import EmbeddingStage
+
+    stage = EmbeddingStage(load_embedding_model(EMBEDDING_MODEL, EMBEDDING_DIM))
+    return LocalCollection(LocalVectorIndex(path), stage.encode)
@@ -0,0 +1,220 @@
+"""
+Instrumentation des scrapers LexIA
+Durées par étape (histogrammes p50/p95/p99), compteurs (octets téléchargés,
+lignes écrites...), rapport JSON par run et fichier texte Prometheus optionnel
+
+Usage:
+    from metrics import METRICS
+    with METRICS.timer("fetch"):
+        ...
+    METRICS.incr("bytes_downloaded", len(body))
+    METRICS.finish_run("scraper_simple")    # rapport JSON (+ textfile Prometheus)
+
+    python metrics.py [script]              # compare les deux derniers runs
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(parent_dir, "data", "run_reports"))
+# Fichier .prom lu par le collecteur textfile de node_exporter (désactivé si vide)
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")
+# Échantillons gardés par histogramme (réservoir uniforme au-delà)
+METRICS_MAX_SAMPLES = int(os.getenv("METRICS_MAX_SAMPLES", "10000"))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _quantile(ordered, q):
+    """Quantile q d'une liste triée (méthode du rang inférieur)"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Histogram:
+    """Distribution d'une durée: compte, somme, min/max exacts et quantiles
+    estimés sur un réservoir d'échantillons"""
+
+    def __init__(self, max_samples=METRICS_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.samples = []
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.max_samples:
+                self.samples[slot] = value
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        summary = {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "min": round(self.min or 0.0, 6),
+            "max": round(self.max or 0.0, 6),
+        }
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = round(_quantile(ordered, q), 6)
+        return summary
+
+
+class Metrics:
+    """Registre des mesures d'un run (partagé par les threads du pipeline)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        """Ajoute une durée (secondes) à l'histogramme `name`"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = Histogram()
+                self.histograms[name] = histogram
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Mesure la durée du bloc (y compris les await dans une coroutine)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def incr(self, name, n=1):
+        """Incrémente le compteur `name`"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self, script):
+        """État courant sous forme de dictionnaire (contenu du rapport JSON)"""
+        with self.lock:
+            duration = time.time() - self.started
+            return {
+                "script": script,
+                "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                "duration_seconds": round(duration, 3),
+                "stages": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def write_report(self, script, directory=METRICS_DIR):
+        """Écrit data/run_reports/<script>-<date>.json, retourne son chemin"""
+        report = self.snapshot(script)
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(directory, f"{script}-{stamp}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return path
+
+    def write_prometheus(self, script, path=METRICS_TEXTFILE):
+        """Écrit les mesures au format texte Prometheus (remplacement atomique)"""
+        report = self.snapshot(script)
+        label = f'script="{script}"'
+        lines = ["# TYPE lexia_stage_seconds summary"]
+        for stage, summary in report["stages"].items():
+            labels = f'{label},stage="{stage}"'
+            for q in QUANTILES:
+                lines.append(f'lexia_stage_seconds{{{labels},quantile="{q}"}} {summary[f"p{round(q * 100)}"]}')
+            lines.append(f"lexia_stage_seconds_sum{{{labels}}} {summary['sum']}")
+            lines.append(f"lexia_stage_seconds_count{{{labels}}} {summary['count']}")
+        for name, value in report["counters"].items():
+            lines.append(f"# TYPE lexia_{name}_total counter")
+            lines.append(f"lexia_{name}_total{{{label}}} {value}")
+        lines.append("# TYPE lexia_run_duration_seconds gauge")
+        lines.append(f"lexia_run_duration_seconds{{{label}}} {report['duration_seconds']}")
+        lines.append("# TYPE lexia_run_last_timestamp_seconds gauge")
+        lines.append(f"lexia_run_last_timestamp_seconds{{{label}}} {time.time():.0f}")
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+    def report(self):
+        """Affiche les durées par étape et les compteurs"""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for name, histogram in histograms:
+            summary = histogram.summary()
+            print(f"[METRICS] {name:<16} n={summary['count']:<6} total={summary['sum']:.2f}s "
+                  f"p50={summary['p50'] * 1000:.1f}ms p95={summary['p95'] * 1000:.1f}ms "
+                  f"p99={summary['p99'] * 1000:.1f}ms")
+        if counters:
+            print("[METRICS] " + ", ".join(f"{name}={value}" for name, value in counters))
+
+    def finish_run(self, script):
+        """Fin de run: affiche le bilan, écrit le rapport JSON et le textfile Prometheus"""
+        self.report()
+        try:
+            path = self.write_report(script)
+            print(f"[METRICS] Rapport de run: {path}")
+            if METRICS_TEXTFILE:
+                self.write_prometheus(script)
+        except OSError as e:
+            print(f"[WARN] Rapport de run non écrit: {e}")
+
+
+# Registre du processus
+METRICS = Metrics()
+
+
+def compare(script=None, directory=METRICS_DIR):
+    """Compare les deux derniers rapports d'un script (p50/p95 et compteurs)"""
+    pattern = f"{script}-*.json" if script else "*.json"
+    paths = sorted(glob.glob(os.path.join(directory, pattern)), key=os.path.getmtime)
+    if len(paths) < 2:
+        print(f"[INFO] Il faut au moins deux rapports dans {directory}")
+        return
+    with open(paths[-2]) as f:
+        before = json.load(f)
+    with open(paths[-1]) as f:
+        after = json.load(f)
+    print(f"[INFO] {os.path.basename(paths[-2])} -> {os.path.basename(paths[-1])}")
+
+    def change(old, new):
+        return f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+
+    for stage in sorted(set(before["stages"]) | set(after["stages"])):
+        old = before["stages"].get(stage, {})
+        new = after["stages"].get(stage, {})
+        for key in ("p50", "p95"):
+            if key in old and key in new:
+                print(f"  {stage:<16} {key}: {old[key] * 1000:8.1f}ms -> {new[key] * 1000:8.1f}ms "
+                      f"({change(old[key], new[key])})")
+    for name in sorted(set(before["counters"]) | set(after["counters"])):
+        old, new = before["counters"].get(name, 0), after["counters"].get(name, 0)
+        print(f"  {name:<24} {old} -> {new} ({change(old, new)})")
+    print(f"  durée: {before['duration_seconds']:.1f}s -> {after['duration_seconds']:.1f}s "
+          f"({change(before['duration_seconds'], after['duration_seconds'])})")
+
+
+if __name__ == "__main__":
+    compare(sys.argv[1] if len(sys.argv) > 1 else None)
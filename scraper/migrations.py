@@ -0,0 +1,318 @@
+"""
+Migrations de schéma appliquées par les scripts Python (SQLite et PostgreSQL)
+Chaque migration a une version par dialecte; les migrations appliquées sont
+enregistrées dans la table scraper_migrations.
+
+Usage:
+    python migrations.py                    # applique les migrations manquantes sur DATABASE_URL
+    python migrations.py --check-fulltext   # + re-seed de contrôle et integrity-check FTS5
+"""
+
+import os
+import re
+import sqlite3
+import sys
+
+DIALECT_SQLITE = "sqlite"
+DIALECT_POSTGRES = "postgres"
+
+MIGRATIONS = [
+    (
+        # Recherche plein texte indexée sur les documents juridiques
+        "001_legal_document_fulltext",
+        {
+            # Colonne générée (maintenue par PostgreSQL à chaque INSERT/UPDATE
+            # des scrapers) + index GIN; le titre pèse plus que le texte.
+            # Coût: une colonne STORED réécrit toute la table sous verrou ACCESS
+            # EXCLUSIVE (lectures et écritures bloquées pendant la réécriture,
+            # proportionnelle à la taille de la table): à lancer hors trafic sur
+            # une grosse base. lock_timeout évite d'attendre en bloquant la file.
+            # L'index est construit en CONCURRENTLY, hors transaction.
+            DIALECT_POSTGRES: [
+                "SET LOCAL lock_timeout = '10s'",
+                """
+                ALTER TABLE "LegalDocument" ADD COLUMN IF NOT EXISTS "searchVector" tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('french', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('french', coalesce("contentPreview", '')), 'B')
+                ) STORED
+                """,
+                # Index INVALID laissé par une construction interrompue
+                'DROP INDEX CONCURRENTLY IF EXISTS "LegalDocument_searchVector_idx"',
+                """
+                CREATE INDEX CONCURRENTLY "LegalDocument_searchVector_idx"
+                ON "LegalDocument" USING GIN ("searchVector")
+                """,
+            ],
+            # SQLite n'a pas de tsvector: table FTS5 adossée à LegalDocument,
+            # tenue à jour par triggers (accents ignorés)
+            DIALECT_SQLITE: [
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS LegalDocument_fts USING fts5(
+                    title, contentPreview,
+                    content='LegalDocument', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS LegalDocument_fts_insert AFTER INSERT ON LegalDocument BEGIN
+                    INSERT INTO LegalDocument_fts (rowid, title, contentPreview)
+                    VALUES (new.rowid, new.title, new.contentPreview);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS LegalDocument_fts_delete AFTER DELETE ON LegalDocument BEGIN
+                    INSERT INTO LegalDocument_fts (LegalDocument_fts, rowid, title, contentPreview)
+                    VALUES ('delete', old.rowid, old.title, old.contentPreview);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS LegalDocument_fts_update AFTER UPDATE ON LegalDocument BEGIN
+                    INSERT INTO LegalDocument_fts (LegalDocument_fts, rowid, title, contentPreview)
+                    VALUES ('delete', old.rowid, old.title, old.contentPreview);
+                    INSERT INTO LegalDocument_fts (rowid, title, contentPreview)
+                    VALUES (new.rowid, new.title, new.contentPreview);
+                END
+                """,
+                "INSERT INTO LegalDocument_fts (LegalDocument_fts) VALUES ('rebuild')",
+            ],
+        },
+    ),
+    (
+        # Migration de modèle d'embeddings sans interruption (reembed.py): les
+        # vecteurs d'un nouveau modèle sont écrits à côté de "LegalDocument".embedding,
+        # puis les lectures basculent en une transaction
+        "002_embedding_models",
+        {
+            DIALECT_POSTGRES: [
+                "CREATE EXTENSION IF NOT EXISTS vector",
+                # backfilling -> ready (couverture complète) -> active; un seul actif
+                """
+                CREATE TABLE IF NOT EXISTS embedding_model (
+                    name TEXT PRIMARY KEY,
+                    dim INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'backfilling',
+                    last_id TEXT NOT NULL DEFAULT '',
+                    rows_done INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    activated_at TIMESTAMP
+                )
+                """,
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS embedding_model_one_active
+                ON embedding_model (status) WHERE status = 'active'
+                """,
+                # vector sans dimension: chaque modèle a la sienne (index partiel par modèle)
+                """
+                CREATE TABLE IF NOT EXISTS legal_document_embedding (
+                    model TEXT NOT NULL REFERENCES embedding_model (name) ON DELETE CASCADE,
+                    document_id TEXT NOT NULL REFERENCES "LegalDocument" (id) ON DELETE CASCADE,
+                    embedding vector NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (model, document_id)
+                )
+                """,
+                """
+                CREATE INDEX IF NOT EXISTS legal_document_embedding_document_idx
+                ON legal_document_embedding (document_id)
+                """,
+            ],
+            # Pas de pgvector en SQLite: les vecteurs locaux vivent dans local_index.py
+            DIALECT_SQLITE: [],
+        },
+    ),
+]
+
+
+# Upsert SQLite d'un document: ON CONFLICT ... DO UPDATE déclenche le trigger
+# LegalDocument_fts_update. INSERT OR REPLACE supprime l'ancienne ligne sans
+# déclencher AFTER DELETE (sauf PRAGMA recursive_triggers): l'index FTS5 garde
+# alors les termes de l'ancienne ligne et integrity-check le signale corrompu.
+SQLITE_UPSERT_DOCUMENT = """
+    INSERT INTO LegalDocument (id, title, category, contentPreview, sourceUrl, scrapedAt, createdAt)
+    VALUES (?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+    ON CONFLICT(id) DO UPDATE SET
+        title = excluded.title,
+        category = excluded.category,
+        contentPreview = excluded.contentPreview,
+        sourceUrl = excluded.sourceUrl,
+        scrapedAt = excluded.scrapedAt
+"""
+
+
+def dialect_of(conn):
+    return DIALECT_SQLITE if isinstance(conn, sqlite3.Connection) else DIALECT_POSTGRES
+
+
+def applied_migrations(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scraper_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("SELECT name FROM scraper_migrations")
+    names = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    conn.commit()
+    return names
+
+
+def is_concurrent(statement):
+    """CREATE / DROP INDEX CONCURRENTLY: interdit dans une transaction"""
+    return "CONCURRENTLY" in statement.upper()
+
+
+def _run_concurrent(conn, statements):
+    """Exécute les statements CONCURRENTLY en autocommit (PostgreSQL)"""
+    conn.rollback()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    finally:
+        conn.autocommit = autocommit
+
+
+def apply_migrations(conn):
+    """Applique les migrations manquantes, une transaction par migration
+
+    Les index CONCURRENTLY sont construits après le commit de la transaction,
+    sans bloquer les écritures; la migration n'est enregistrée qu'ensuite
+    (une construction interrompue est reprise au prochain appel).
+    Retourne la liste des migrations appliquées lors de cet appel.
+    """
+    dialect = dialect_of(conn)
+    placeholder = "?" if dialect == DIALECT_SQLITE else "%s"
+    done = applied_migrations(conn)
+    applied = []
+
+    for name, statements in MIGRATIONS:
+        if name in done:
+            continue
+        print(f"[DB] Migration {name} ({dialect})...")
+        concurrent = [statement for statement in statements[dialect] if is_concurrent(statement)]
+        cursor = conn.cursor()
+        try:
+            for statement in statements[dialect]:
+                if not is_concurrent(statement):
+                    cursor.execute(statement)
+            if concurrent:
+                conn.commit()
+                _run_concurrent(conn, concurrent)
+            cursor.execute(
+                f"INSERT INTO scraper_migrations (name, applied_at) VALUES ({placeholder}, CURRENT_TIMESTAMP)",
+                (name,)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        applied.append(name)
+
+    return applied
+
+
+def connect(database_url):
+    """Connexion selon DATABASE_URL: 'file:./x.db' (SQLite) ou postgresql://"""
+    match = re.search(r'file:(.*\.db)', database_url)
+    if match:
+        parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return connect_sqlite(os.path.join(parent_dir, match.group(1).replace('./', '')))
+
+    import psycopg2
+    return psycopg2.connect(database_url)
+
+
+def connect_sqlite(path):
+    """Connexion SQLite qui écrit dans LegalDocument
+
+    recursive_triggers: un INSERT OR REPLACE déclenche aussi le trigger de
+    suppression de LegalDocument_fts (index plein texte toujours cohérent).
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA recursive_triggers = ON")
+    return conn
+
+
+def check_fulltext(conn):
+    """integrity-check FTS5: False si LegalDocument_fts ne correspond plus à la table"""
+    try:
+        conn.execute("INSERT INTO LegalDocument_fts (LegalDocument_fts, rank) VALUES ('integrity-check', 1)")
+        return True
+    except sqlite3.DatabaseError:
+        return False
+
+
+def rebuild_fulltext(conn):
+    """Reconstruit LegalDocument_fts depuis LegalDocument"""
+    conn.execute("INSERT INTO LegalDocument_fts (LegalDocument_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def self_check_fulltext():
+    """Base en mémoire: seed puis re-seed (mêmes ids, textes modifiés) et integrity-check
+
+    Vérifie que SQLITE_UPSERT_DOCUMENT garde l'index FTS5 cohérent et que les
+    termes remplacés ne sont plus trouvés.
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE LegalDocument (
+            id TEXT PRIMARY KEY, title TEXT NOT NULL, category TEXT NOT NULL,
+            contentPreview TEXT, sourceUrl TEXT, scrapedAt TEXT, createdAt TEXT
+        )
+    """)
+    apply_migrations(conn)
+    seeds = [
+        [("doc_1", "Création de SARL", "code_societes", "capital minimum ancien", None)],
+        [("doc_1", "Création de SARL", "code_societes", "capital social nouveau", None)],
+    ]
+    for rows in seeds:
+        conn.executemany(SQLITE_UPSERT_DOCUMENT, rows)
+        conn.commit()
+    stale = conn.execute("SELECT COUNT(*) FROM LegalDocument_fts WHERE LegalDocument_fts MATCH 'ancien'").fetchone()[0]
+    ok = check_fulltext(conn) and stale == 0
+    conn.close()
+    return ok
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv(os.path.join(parent_dir, '.env'))
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("[ERROR] DATABASE_URL non trouvée dans .env")
+        sys.exit(1)
+
+    conn = connect(database_url)
+    applied = apply_migrations(conn)
+    print(f"[OK] {len(applied)} migration(s) appliquée(s)" if applied else "[OK] Schéma à jour")
+
+    if "--check-fulltext" in sys.argv:
+        if not self_check_fulltext():
+            print("[ERROR] Re-seed: index FTS5 incohérent après upsert")
+            sys.exit(1)
+        print("[OK] Re-seed: index FTS5 cohérent")
+        if dialect_of(conn) == DIALECT_SQLITE:
+            if check_fulltext(conn):
+                print("[OK] LegalDocument_fts intègre")
+            else:
+                # Index corrompu par d'anciens INSERT OR REPLACE
+                print("[WARN] LegalDocument_fts incohérent, reconstruction...")
+                rebuild_fulltext(conn)
+                print("[OK] LegalDocument_fts reconstruit" if check_fulltext(conn) else
+                      "[ERROR] LegalDocument_fts toujours incohérent")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Backend d'embeddings ONNX Runtime pour LexIA
+Même modèle (all-MiniLM-L6-v2) exporté en ONNX, éventuellement quantifié int8
+(quantification dynamique), avec le tokenizer rapide de `tokenizers`: ni torch
+ni sentence_transformers au chargement. Vecteurs compatibles avec la colonne
+vector(384): l'export vérifie la similarité cosinus avec le modèle torch.
+
+Usage:
+    python onnx_embedder.py export [--no-quantize]  # exporte, quantifie et vérifie
+    python onnx_embedder.py check                   # revérifie un export existant
+
+    EMBEDDING_BACKEND=onnx-int8 python cli.py pgvector
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+ONNX_MODELS_DIR = os.getenv("ONNX_MODELS_DIR", os.path.join(parent_dir, "data", "models"))
+# Similarité cosinus minimale avec le modèle torch, par variante
+ONNX_MIN_COSINE = float(os.getenv("ONNX_MIN_COSINE", "0.9999"))
+ONNX_INT8_MIN_COSINE = float(os.getenv("ONNX_INT8_MIN_COSINE", "0.98"))
+
+MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+# Requêtes courtes, en plus des passages des pages de fixtures
+VALIDATION_QUERIES = [
+    "Quelles sont les conditions de constitution d'une SARL en Côte d'Ivoire ?",
+    "délai de préavis en cas de licenciement",
+    "Acte uniforme OHADA relatif au droit commercial général",
+    "registre du commerce et du crédit mobilier",
+    "code pénal ivoirien vol aggravé",
+    "contrat de bail à usage professionnel",
+]
+
+
+def model_dir(model_name=EMBEDDING_MODEL):
+    return os.path.join(ONNX_MODELS_DIR, f"{model_name}-onnx")
+
+
+class OnnxEmbedder:
+    """Embeddings par ONNX Runtime (même interface d'encode que SentenceTransformer)
+
+    Reproduit le pipeline sentence-transformers du modèle: tokenisation
+    tronquée à max_seq_length, moyenne des états cachés pondérée par le
+    masque d'attention, puis normalisation L2 si le modèle la fait.
+    """
+
+    def __init__(self, directory, variant="onnx-int8", threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"Aucun export ONNX dans {directory} (python onnx_embedder.py export)")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.dim = self.manifest["dim"]
+        self.normalize = self.manifest["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.manifest["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.manifest["pad_id"], pad_token=self.manifest["pad_token"])
+
+        # OMP_NUM_THREADS est fixé par les workers d'embedding_pool (0: choix d'ONNX Runtime)
+        if threads is None:
+            threads = int(os.getenv("OMP_NUM_THREADS", "0"))
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, MODEL_FILES[variant]), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        """Matrice float32 (len(texts), dim)"""
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[start:start + batch_size]))
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            matrix[start:start + len(encodings)] = pooled
+        return matrix
+
+
+def load_onnx_model(model_name=EMBEDDING_MODEL, variant="onnx-int8"):
+    return OnnxEmbedder(model_dir(model_name), variant)
+
+
+def validation_texts(limit=200):
+    """Passages des pages de fixtures + requêtes courtes (textes de contrôle)"""
+    from html_extract import extract_page
+
+    texts = list(VALIDATION_QUERIES)
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            text = extract_page(f.read(), "https://www.justice.ci/").text
+        texts.extend(text[i:i + 1200] for i in range(0, len(text), 1200))
+    return texts[:limit]
+
+
+def cosine_rows(a, b):
+    """Similarité cosinus ligne à ligne de deux matrices"""
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def check(model_name=EMBEDDING_MODEL, reference=None):
+    """Compare chaque variante exportée au modèle torch -> {variante: résultat}
+
+    Lève ValueError si une variante passe sous sa tolérance cosinus.
+    """
+    directory = model_dir(model_name)
+    texts = validation_texts()
+    if reference is None:
+        from sentence_transformers import SentenceTransformer
+        reference = SentenceTransformer(model_name, device="cpu")
+    expected = reference.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False)
+
+    results = {}
+    failures = []
+    for variant, filename in MODEL_FILES.items():
+        if not os.path.exists(os.path.join(directory, filename)):
+            continue
+        vectors = OnnxEmbedder(directory, variant).encode(texts)
+        cosines = cosine_rows(expected, vectors)
+        tolerance = ONNX_INT8_MIN_COSINE if variant == "onnx-int8" else ONNX_MIN_COSINE
+        results[variant] = {
+            "texts": len(texts),
+            "min_cosine": round(float(cosines.min()), 6),
+            "mean_cosine": round(float(cosines.mean()), 6),
+            "tolerance": tolerance,
+        }
+        status = "[OK]" if cosines.min() >= tolerance else "[ERROR]"
+        print(f"{status} {variant:<10} cosinus min {cosines.min():.5f}, moyen {cosines.mean():.5f} "
+              f"(tolérance {tolerance}) sur {len(texts)} textes")
+        if cosines.min() < tolerance:
+            failures.append(variant)
+
+    if not results:
+        raise FileNotFoundError(f"Aucun export ONNX dans {directory} (python onnx_embedder.py export)")
+    if failures:
+        raise ValueError(f"Variantes hors tolérance cosinus: {', '.join(failures)}")
+    return results
+
+
+def export(model_name=EMBEDDING_MODEL, quantize=True, opset=17):
+    """Exporte le transformer en ONNX (+ int8), le tokenizer et un manifeste, puis vérifie"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    directory = model_dir(model_name)
+    os.makedirs(directory, exist_ok=True)
+    started = time.time()
+
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling = model[1].get_pooling_mode_str()
+    if pooling != "mean":
+        raise ValueError(f"Pooling '{pooling}' non géré par OnnxEmbedder (moyenne uniquement)")
+    dim = model.get_sentence_embedding_dimension()
+    if dim != EMBEDDING_DIM:
+        raise ValueError(f"Dimension {dim} incompatible avec la colonne vector({EMBEDDING_DIM})")
+
+    transformer = model[0].auto_model.eval()
+    transformer.config.return_dict = False
+    tokenizer = model.tokenizer
+    tokenizer.backend_tokenizer.save(os.path.join(directory, "tokenizer.json"))
+
+    sample = tokenizer(["exemple de texte juridique"], return_tensors="pt")
+    inputs = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(directory, MODEL_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(sample[name] for name in inputs), fp32_path,
+            input_names=inputs, output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in inputs + ["last_hidden_state"]},
+            opset_version=opset,
+        )
+    print(f"[OK] Export ONNX: {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(directory, MODEL_FILES["onnx-int8"])
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"[OK] Quantification int8: {int8_path}")
+
+    manifest = {
+        "model": model_name,
+        "dim": dim,
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+        "opset": opset,
+    }
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    manifest["validation"] = check(model_name, reference=model)
+    manifest["exported_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[OK] Export terminé en {time.time() - started:.1f}s: {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export et vérification du backend ONNX LexIA")
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--no-quantize", action="store_true", help="ne pas produire la variante int8")
+    args = parser.parse_args()
+    try:
+        if args.command == "export":
+            export(args.model, quantize=not args.no_quantize)
+        else:
+            check(args.model)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Extraction de texte des PDF juridiques (Journal Officiel, codes)
+Parsing CPU dans un ProcessPoolExecutor avec mémoire plafonnée par worker
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import METRICS
+
+# Configuration
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_MB", "100")) * 1024 * 1024
+PDF_WORKER_MEMORY = int(os.getenv("PDF_WORKER_MEMORY_MB", "1024")) * 1024 * 1024
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "2000"))
+
+
+def _limit_worker_memory(max_bytes):
+    """Initialiseur de worker: plafonne l'espace d'adressage (Linux/macOS)"""
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def extract_pdf_text(path, max_pages=PDF_MAX_PAGES):
+    """Extrait (titre, texte) d'un PDF page par page (exécuté dans un worker)"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    title = None
+    if reader.metadata and reader.metadata.title:
+        title = reader.metadata.title
+
+    parts = []
+    for page in reader.pages[:max_pages]:
+        text = page.extract_text() or ''
+        if text:
+            parts.append(text)
+
+    text = ' '.join(' '.join(parts).split())
+    return title, text
+
+
+class PdfExtractor:
+    """Télécharge les PDF en flux et extrait leur texte sur tous les coeurs"""
+
+    def __init__(self, workers=PDF_WORKERS, worker_memory=PDF_WORKER_MEMORY,
+                 max_bytes=PDF_MAX_BYTES, max_pages=PDF_MAX_PAGES):
+        self.workers = workers
+        self.worker_memory = worker_memory
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.tmpdir = tempfile.mkdtemp(prefix="lexia_pdf_")
+        self.pool = self._new_pool()
+        self.pool_lock = threading.Lock()
+        # PDF resoumis après une panne: un à la fois, dans leur propre pool
+        self.retry_pool = None
+        self.retry_lock = asyncio.Lock()
+
+        # Statistiques
+        self.extracted = 0
+        self.failed = 0
+        self.retried = 0
+        self.restarts = 0
+        self.bytes = 0
+
+    def _new_pool(self, workers=None):
+        return ProcessPoolExecutor(
+            max_workers=workers or self.workers,
+            initializer=_limit_worker_memory,
+            initargs=(self.worker_memory,),
+        )
+
+    async def fetch(self, crawler, url, headers=None):
+        """Télécharge un PDF sur disque, retourne un crawler.Download"""
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=self.tmpdir)
+        os.close(fd)
+        try:
+            download = await crawler.download(url, path, self.max_bytes, headers=headers)
+        except Exception:
+            os.remove(path)
+            raise
+        if download.path is None:
+            os.remove(path)
+        self.bytes += download.size
+        return download
+
+    def _replace_pool(self, broken):
+        """Recrée le pool s'il est encore celui qui a cassé (une seule fois par panne)
+
+        Tous les PDF en cours sur un pool cassé reçoivent BrokenProcessPool: seul
+        le premier à arriver ici le remplace.
+        """
+        with self.pool_lock:
+            if self.pool is broken:
+                broken.shutdown(wait=False)
+                self.pool = self._new_pool()
+                self.restarts += 1
+                print("    [WARN] Worker PDF arrêté (OOM ?), pool recréé")
+
+    async def _retry_isolated(self, download):
+        """Nouvel essai seul dans un pool d'un worker: s'il casse, ce PDF est le coupable"""
+        loop = asyncio.get_running_loop()
+        async with self.retry_lock:
+            if self.retry_pool is None:
+                self.retry_pool = self._new_pool(workers=1)
+            try:
+                return await loop.run_in_executor(self.retry_pool, extract_pdf_text, download.path, self.max_pages)
+            except BrokenProcessPool:
+                self.retry_pool.shutdown(wait=False)
+                self.retry_pool = None
+                raise
+
+    async def extract(self, download):
+        """Extrait (titre, texte) d'un PDF téléchargé dans un worker, puis supprime le fichier
+
+        Si un worker meurt, tous les PDF en cours sur ce pool échouent: chacun
+        est resoumis une fois, isolé, et seul celui qui casse encore est perdu.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            with METRICS.timer("pdf_extract"):
+                try:
+                    result = await loop.run_in_executor(pool, extract_pdf_text, download.path, self.max_pages)
+                except BrokenProcessPool:
+                    self._replace_pool(pool)
+                    self.retried += 1
+                    result = await self._retry_isolated(download)
+            self.extracted += 1
+            return result
+        except BrokenProcessPool:
+            self.failed += 1
+            print(f"    [ERROR] Worker PDF arrêté par {download.url[:80]}, PDF ignoré")
+            return None
+        except Exception as e:
+            self.failed += 1
+            print(f"    [ERROR] Extraction PDF {download.url[:80]}: {e}")
+            return None
+        finally:
+            os.remove(download.path)
+
+    def close(self):
+        self.pool.shutdown()
+        if self.retry_pool is not None:
+            self.retry_pool.shutdown()
+        try:
+            os.rmdir(self.tmpdir)
+        except OSError:
+            pass
+
+    def report(self):
+        """Affiche le bilan de l'extraction PDF"""
+        print(f"[PDF] {self.extracted} PDF extraits, {self.failed} en échec, "
+              f"{self.bytes / (1024 * 1024):.1f} Mo téléchargés ({self.workers} workers)")
+        if self.restarts:
+            print(f"[PDF] {self.restarts} pool(s) recréé(s), {self.retried} PDF resoumis")
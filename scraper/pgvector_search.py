@@ -0,0 +1,362 @@
+"""
+Recherche vectorielle pgvector sur "LegalDocument".embedding
+Gestion de l'index HNSW / IVFFlat et requêtes top-k cosinus
+
+La colonne embedding reste en vector(384) pleine précision; avec une
+quantification, seul l'index porte sur une expression compacte
+(embedding::halfvec ou binary_quantize(embedding)) et les candidats sont
+re-classés en pleine précision.
+
+Après une migration de modèle (reembed.py), les lectures passent par la table
+legal_document_embedding du modèle actif (active_model).
+
+Usage:
+    python pgvector_search.py index [--m 16] [--ef-construction 64] [--quantization halfvec]
+    python pgvector_search.py index --method ivfflat [--lists 100]
+    python pgvector_search.py query "capital minimum SARL" [--k 5] [--category droit_societes]
+    python pgvector_search.py query "capital minimum SARL" --hybrid   # BM25 + vecteurs (RRF)
+    python pgvector_search.py query "capital minimum SARL" --hybrid --lexical fulltext
+"""
+
+import argparse
+import os
+import re
+import sys
+import zlib
+
+from db import scoped_transaction
+from embedding_stage import vectors_to_pg
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from quantize import (QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_BINARY,
+                      RERANK_FACTOR)
+
+TABLE = '"LegalDocument"'
+EMBEDDING_DIM = 384
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'   # modèle de la colonne "LegalDocument".embedding
+
+# Vecteurs des autres modèles (migration 002_embedding_models)
+MODELS_TABLE = "embedding_model"
+SIDE_TABLE = "legal_document_embedding"
+
+# Représentation indexée: "none" (vector), "halfvec" (float16) ou "binary" (1 bit/dim)
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", QUANTIZATION_NONE)
+
+# Paramètres par défaut (valeurs recommandées par pgvector)
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+# Recherche hybride: candidats demandés à chaque moteur avant la fusion RRF
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
+
+def index_name(table, method, quantization=QUANTIZATION_NONE):
+    suffix = "" if quantization == QUANTIZATION_NONE else f"_{quantization}"
+    return table.strip('"') + f"_embedding_{method}{suffix}_idx"
+
+
+def quantized_expression(quantization, dim=EMBEDDING_DIM):
+    """(expression indexée, classe d'opérateurs, opérateur de distance)"""
+    if quantization == QUANTIZATION_NONE:
+        return "embedding", "vector_cosine_ops", "<=>"
+    if quantization == QUANTIZATION_HALFVEC:
+        return f"(embedding::halfvec({int(dim)}))", "halfvec_cosine_ops", "<=>"
+    if quantization == QUANTIZATION_BINARY:
+        return f"(binary_quantize(embedding)::bit({int(dim)}))", "bit_hamming_ops", "<~>"
+    raise ValueError(f"Quantification non supportée par pgvector: {quantization}")
+
+
+def _query_expression(quantization, dim=EMBEDDING_DIM):
+    """Expression SQL de la requête, dans la même représentation que l'index"""
+    if quantization == QUANTIZATION_HALFVEC:
+        return f"%s::halfvec({int(dim)})"
+    if quantization == QUANTIZATION_BINARY:
+        return f"binary_quantize(%s::vector)::bit({int(dim)})"
+    return "%s::vector"
+
+
+def active_model(conn):
+    """(nom, dimension) du modèle servi par une table annexe, None pour la colonne embedding
+
+    Lu à chaque requête: la bascule de reembed.py est visible dès son commit.
+    """
+    with scoped_transaction(conn) as cursor:
+        cursor.execute(f"SELECT name, dim FROM {MODELS_TABLE} WHERE status = 'active'")
+        row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+def model_index_name(model):
+    """Nom de l'index partiel d'un modèle (63 caractères au plus, limite PostgreSQL)"""
+    slug = re.sub(r'[^a-z0-9]+', '_', model.lower()).strip('_')[:20]
+    return f"{SIDE_TABLE}_{slug}_{zlib.crc32(model.encode('utf-8')):08x}_hnsw_idx"
+
+
+def side_expression(dim):
+    """Expression indexée d'un modèle (vector sans dimension -> vector(dim))"""
+    return f"(embedding::vector({int(dim)}))"
+
+
+def _index_definition(conn, name):
+    """(définition, valide) d'un index, (None, False) s'il n'existe pas
+
+    Un CREATE INDEX CONCURRENTLY interrompu laisse un index INVALID
+    (pg_index.indisvalid = false): listé dans pg_indexes mais jamais utilisé.
+    """
+    with scoped_transaction(conn) as cursor:
+        cursor.execute("""
+            SELECT pg_get_indexdef(c.oid), x.indisvalid
+            FROM pg_class c JOIN pg_index x ON x.indexrelid = c.oid
+            WHERE c.relname = %s
+        """, (name,))
+        row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, False)
+
+
+_versions = {}
+
+
+def pgvector_version(conn):
+    """Version de l'extension vector (mise en cache par connexion)"""
+    if conn.dsn not in _versions:
+        with scoped_transaction(conn) as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        _versions[conn.dsn] = tuple(int(part) for part in row[0].split('.')) if row else (0,)
+    return _versions[conn.dsn]
+
+
+def ensure_vector_index(conn, table=TABLE, method="hnsw", m=HNSW_M,
+                        ef_construction=HNSW_EF_CONSTRUCTION, lists=IVFFLAT_LISTS,
+                        quantization=EMBEDDING_QUANTIZATION, dim=EMBEDDING_DIM):
+    """Crée l'index ANN s'il manque, le reconstruit si ses paramètres ont changé
+
+    CREATE INDEX CONCURRENTLY: les lectures et écritures continuent pendant la
+    construction (nécessite une connexion en autocommit). À appeler sur une
+    connexion sans transaction en cours: elle est annulée avant la construction.
+    Un index INVALID (construction interrompue) est supprimé et reconstruit.
+    """
+    column, opclass, _ = quantized_expression(quantization, dim)
+    if method == "hnsw":
+        params = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif method == "ivfflat":
+        params = f"lists = {int(lists)}"
+    else:
+        raise ValueError(f"Méthode d'index inconnue: {method}")
+
+    name = index_name(table, method, quantization)
+    wanted = f"USING {method} ({column} {opclass}) WITH ({params})"
+    existing, valid = _index_definition(conn, name)
+
+    # pg_get_indexdef réécrit les expressions (parenthèses, casts): on compare la
+    # classe d'opérateurs et les paramètres, l'expression est fixée par le nom
+    normalized = existing.replace(' ', '').replace("'", '') if existing else ''
+    if existing and not valid:
+        print(f"[WARN] {name} INVALID (construction interrompue)")
+    elif existing and opclass in normalized and f"WITH({params.replace(' ', '')})" in normalized:
+        print(f"[INDEX] {name} déjà à jour ({params})")
+        return False
+
+    autocommit = conn.autocommit
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            if existing:
+                print(f"[INDEX] Reconstruction de {name}...")
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+            print(f"[INDEX] Construction de {name} ({params})...")
+            cursor.execute(f'CREATE INDEX CONCURRENTLY "{name}" ON {table} {wanted}')
+    finally:
+        conn.autocommit = autocommit
+
+    print(f"[OK] Index {name} prêt")
+    return True
+
+
+def _set_search_params(cursor, ef_search, probes, iterative):
+    cursor.execute("SET LOCAL hnsw.ef_search = %s", (int(ef_search),))
+    cursor.execute("SET LOCAL ivfflat.probes = %s", (int(probes),))
+    if iterative:
+        # pgvector >= 0.8: continue le parcours tant que le filtre n'a pas k résultats
+        cursor.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+
+
+def search(conn, query_vector, k=5, category=None, table=TABLE, ef_search=HNSW_EF_SEARCH,
+           probes=IVFFLAT_PROBES, exact=False, quantization=EMBEDDING_QUANTIZATION,
+           rerank_factor=RERANK_FACTOR, dim=EMBEDDING_DIM, model=None):
+    """Top-k cosinus -> [(id, title, category, contentPreview, sourceUrl, similarity)]
+
+    `exact=True` désactive les index (parcours séquentiel): vérité terrain pour
+    mesurer le rappel de l'index. Avec une quantification, l'index fournit
+    k * rerank_factor candidats, re-classés sur la colonne pleine précision.
+    `model=(nom, dim)` (voir active_model) cherche dans la table annexe de ce
+    modèle; `query_vector` doit alors venir du même modèle.
+    Une transaction ouverte par l'appelant est conservée (savepoint).
+    """
+    vector = vectors_to_pg([query_vector])[0]
+    where = "WHERE embedding IS NOT NULL"
+    filters = []
+    if category:
+        where += " AND category = %s"
+        filters.append(category)
+
+    if model is not None:
+        name, dim = model
+        column = side_expression(dim)
+        # Le nom du modèle en littéral: le planificateur choisit l'index partiel
+        sql = f"""
+            SELECT d.id, d.title, d.category, d."contentPreview", d."sourceUrl",
+                   1 - ({column} <=> %s::vector({int(dim)})) AS similarity
+            FROM {SIDE_TABLE} e
+            JOIN {table} d ON d.id = e.document_id
+            WHERE e.model = '{name.replace("'", "''")}'{" AND d.category = %s" if category else ""}
+            ORDER BY {column} <=> %s::vector({int(dim)})
+            LIMIT %s
+        """
+        params = [vector] + filters + [vector, int(k)]
+    elif exact or quantization == QUANTIZATION_NONE:
+        sql = f"""
+            SELECT id, title, category, "contentPreview", "sourceUrl",
+                   1 - (embedding <=> %s::vector) AS similarity
+            FROM {table}
+            {where}
+            ORDER BY embedding <=> %s::vector
+            LIMIT %s
+        """
+        params = [vector] + filters + [vector, int(k)]
+    else:
+        column, _, operator = quantized_expression(quantization, dim)
+        sql = f"""
+            SELECT id, title, category, "contentPreview", "sourceUrl",
+                   1 - (embedding <=> %s::vector) AS similarity
+            FROM (
+                SELECT id, title, category, "contentPreview", "sourceUrl", embedding
+                FROM {table}
+                {where}
+                ORDER BY {column} {operator} {_query_expression(quantization, dim)}
+                LIMIT %s
+            ) candidates
+            ORDER BY embedding <=> %s::vector
+            LIMIT %s
+        """
+        params = [vector] + filters + [vector, int(k) * int(rerank_factor), vector, int(k)]
+        # HNSW ne renvoie pas plus de ef_search lignes: il faut tous les candidats
+        ef_search = max(int(ef_search), int(k) * int(rerank_factor))
+
+    iterative = not exact and bool(category) and pgvector_version(conn) >= (0, 8, 0)
+    # SET LOCAL limités à cette requête (savepoint si l'appelant a une transaction ouverte)
+    with scoped_transaction(conn, "pgvector_search") as cursor:
+        if exact:
+            cursor.execute("SET LOCAL enable_indexscan = off")
+        else:
+            _set_search_params(cursor, ef_search, probes, iterative)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return rows
+
+
+def hybrid_search(conn, lexical, text, query_vector, k=5, category=None, table=TABLE,
+                  candidates=HYBRID_CANDIDATES, **search_options):
+    """Fusion RRF de la recherche vectorielle et d'une recherche par mots-clés
+
+    `lexical`: lexical_index.LexicalIndex (BM25 local) ou
+    fulltext_search.FulltextIndex (colonne tsvector de PostgreSQL).
+
+    Même format que search(); la dernière colonne est le score RRF. Les passages
+    trouvés seulement par mots-clés sont relus dans `table`.
+    """
+    vector_rows = search(conn, query_vector, candidates, category, table=table, **search_options)
+    lexical_hits = lexical.search(text, candidates, category)
+    fused = reciprocal_rank_fusion([
+        [row[0] for row in vector_rows],
+        [doc_id for doc_id, _ in lexical_hits],
+    ])
+
+    rows = {row[0]: row[:5] for row in vector_rows}
+    missing = [doc_id for doc_id, _ in fused[:k] if doc_id not in rows]
+    if missing:
+        with scoped_transaction(conn) as cursor:
+            cursor.execute(f"""
+                SELECT id, title, category, "contentPreview", "sourceUrl"
+                FROM {table} WHERE id = ANY(%s)
+            """, (missing,))
+            rows.update((row[0], row) for row in cursor.fetchall())
+
+    # Un passage absent de la table (indexé par un autre scraper) est ignoré
+    return [rows[doc_id] + (score,) for doc_id, score in fused if doc_id in rows][:k]
+
+
+def main():
+    """Point d'entrée en ligne de commande"""
+    from dotenv import load_dotenv
+    import psycopg2
+
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv(os.path.join(parent_dir, '.env'))
+
+    parser = argparse.ArgumentParser(description="Index et recherche pgvector LexIA")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    idx = sub.add_parser("index", help="créer / mettre à jour l'index ANN")
+    idx.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    idx.add_argument("--m", type=int, default=HNSW_M)
+    idx.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    idx.add_argument("--lists", type=int, default=IVFFLAT_LISTS)
+    idx.add_argument("--quantization", choices=[QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_BINARY],
+                     default=EMBEDDING_QUANTIZATION)
+
+    qry = sub.add_parser("query", help="recherche top-k")
+    qry.add_argument("text")
+    qry.add_argument("--k", type=int, default=5)
+    qry.add_argument("--category")
+    qry.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH)
+    qry.add_argument("--quantization", choices=[QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_BINARY],
+                     default=EMBEDDING_QUANTIZATION)
+    qry.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR)
+    qry.add_argument("--hybrid", action="store_true", help="fusionner avec une recherche par mots-clés")
+    qry.add_argument("--lexical", choices=["bm25", "fulltext"], default="bm25",
+                     help="bm25: lexical_index.py, fulltext: colonne tsvector (migrations.py)")
+
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("[ERROR] DATABASE_URL non trouvée dans .env")
+        sys.exit(1)
+    conn = psycopg2.connect(database_url)
+
+    if args.command == "index":
+        ensure_vector_index(conn, method=args.method, m=args.m, ef_construction=args.ef_construction,
+                            lists=args.lists, quantization=args.quantization)
+    else:
+        from embedding_pool import load_model
+
+        # La requête est encodée par le modèle actuellement servi
+        active = active_model(conn)
+        model = load_model(active[0] if active else EMBEDDING_MODEL)
+        vector = model.encode([args.text], convert_to_numpy=True)[0]
+        options = {"ef_search": args.ef_search, "quantization": args.quantization,
+                   "rerank_factor": args.rerank_factor, "model": active}
+        if args.hybrid:
+            if args.lexical == "fulltext":
+                from fulltext_search import FulltextIndex
+                rows = hybrid_search(conn, FulltextIndex(conn), args.text, vector, args.k, args.category,
+                                     **options)
+            else:
+                lexical = LexicalIndex()
+                rows = hybrid_search(conn, lexical, args.text, vector, args.k, args.category, **options)
+                lexical.close()
+        else:
+            rows = search(conn, vector, args.k, args.category, **options)
+        for doc_id, title, category, preview, url, similarity in rows:
+            print(f"{similarity:.3f}  [{category}] {title}")
+            print(f"       {preview[:150]}...")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Pipeline en flux pour LexIA: fetch -> extract -> chunk -> embed -> write
+Étapes bornées reliées par des files: mémoire constante, perte maximale d'un lot
+"""
+
+import asyncio
+import os
+import queue
+import threading
+
+from metrics import METRICS
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "50"))
+
+_DONE = object()
+
+
+def batched(iterable, size):
+    """Regroupe un itérable en listes de `size` éléments (le dernier peut être plus court)"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_async(agen, queue_size=PIPELINE_QUEUE_SIZE):
+    """Consomme un générateur asynchrone depuis du code synchrone
+
+    La boucle asyncio tourne dans un thread dédié et pousse les éléments dans une
+    file bornée, ce qui ralentit le crawl si l'aval n'arrive pas à suivre.
+    """
+    items = queue.Queue(queue_size)
+
+    def runner():
+        async def drain():
+            async for item in agen:
+                await asyncio.to_thread(items.put, item)
+        try:
+            asyncio.run(drain())
+        except Exception as e:
+            print(f"[ERROR] Erreur source asynchrone: {e}")
+        finally:
+            items.put(_DONE)
+
+    threading.Thread(target=runner, name="pipeline-async-source", daemon=True).start()
+
+    while True:
+        item = items.get()
+        if item is _DONE:
+            return
+        yield item
+
+
+class Pipeline:
+    """Enchaîne des étapes dans des threads reliés par des files bornées
+
+    Chaque étape reçoit un élément et retourne un itérable d'éléments (0, 1 ou
+    plusieurs), ce qui couvre le filtrage (extract) comme le découpage (chunk).
+    Le puits reçoit des lots et tourne dans le thread appelant.
+    """
+
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE, batch_size=PIPELINE_BATCH_SIZE):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.stages = []
+
+        # Statistiques
+        self.items_in = 0
+        self.items_out = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    def add_stage(self, name, func):
+        """Ajoute une étape func(item) -> itérable d'éléments"""
+        self.stages.append((name, func))
+        return self
+
+    def _feed(self, source, output):
+        try:
+            for item in source:
+                self.items_in += 1
+                output.put(item)
+        except Exception as e:
+            print(f"[ERROR] Erreur source: {e}")
+        finally:
+            output.put(_DONE)
+
+    def _work(self, name, func, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                outbox.put(_DONE)
+                return
+            try:
+                for result in func(item) or ():
+                    outbox.put(result)
+            except Exception as e:
+                print(f"  [ERROR] Étape {name}: {e}")
+
+    def run(self, source, sink):
+        """Fait circuler `source` à travers les étapes puis `sink(lot)` par lots
+
+        `sink` retourne False (ou lève une exception) si le lot n'a pas été écrit;
+        seul ce lot est perdu, le pipeline continue.
+        """
+        current = queue.Queue(self.queue_size)
+        threads = [threading.Thread(target=self._feed, args=(source, current),
+                                    name="pipeline-source", daemon=True)]
+
+        for name, func in self.stages:
+            output = queue.Queue(self.queue_size)
+            threads.append(threading.Thread(target=self._work, args=(name, func, current, output),
+                                            name=f"pipeline-{name}", daemon=True))
+            current = output
+
+        for thread in threads:
+            thread.start()
+
+        def drain():
+            while True:
+                item = current.get()
+                if item is _DONE:
+                    return
+                yield item
+
+        for batch in batched(drain(), self.batch_size):
+            self.batches += 1
+            try:
+                with METRICS.timer("write_batch"):
+                    ok = sink(batch)
+            except Exception as e:
+                print(f"  [ERROR] Erreur écriture lot: {e}")
+                ok = False
+            if ok is False:
+                self.failed_batches += 1
+            else:
+                self.items_out += len(batch)
+
+        for thread in threads:
+            thread.join()
+
+        return self.items_out
+
+    def report(self):
+        """Affiche le bilan du pipeline"""
+        print(f"[PIPELINE] {self.items_in} entrées, {self.items_out} documents écrits "
+              f"en {self.batches} lots ({self.failed_batches} lots en échec)")
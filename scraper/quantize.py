@@ -0,0 +1,92 @@
+"""
+Quantification des embeddings pour LexIA
+float16 (halfvec), int8 avec échelle par vecteur, binaire (1 bit par dimension)
+
+Les vecteurs quantifiés servent à la présélection des candidats; le score final
+est recalculé en pleine précision (re-ranking) sur les meilleurs candidats.
+"""
+
+import os
+
+import numpy as np
+
+QUANTIZATION_NONE = "none"
+QUANTIZATION_HALFVEC = "halfvec"
+QUANTIZATION_INT8 = "int8"
+QUANTIZATION_BINARY = "binary"
+QUANTIZATIONS = [QUANTIZATION_NONE, QUANTIZATION_HALFVEC, QUANTIZATION_INT8, QUANTIZATION_BINARY]
+
+# Nombre de candidats quantifiés par résultat final avant re-ranking
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+
+
+def bytes_per_vector(quantization, dim):
+    """Taille d'un vecteur quantifié (hors en-têtes de stockage)"""
+    if quantization == QUANTIZATION_NONE:
+        return 4 * dim
+    if quantization == QUANTIZATION_HALFVEC:
+        return 2 * dim
+    if quantization == QUANTIZATION_INT8:
+        return dim + 4  # codes + échelle float32
+    if quantization == QUANTIZATION_BINARY:
+        return (dim + 7) // 8
+    raise ValueError(f"Quantification inconnue: {quantization}")
+
+
+def quantize_int8(vectors):
+    """Quantification scalaire symétrique -> (codes int8, échelles float32)
+
+    Chaque vecteur a sa propre échelle max|x| / 127: x ~= codes * échelle.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes, scales):
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def int8_scores(codes, scales, query):
+    """Produits scalaires approchés entre des codes int8 et une requête float32"""
+    return (codes.astype(np.float32) @ np.asarray(query, dtype=np.float32)) * scales
+
+
+def to_halfvec(vectors):
+    return np.asarray(vectors, dtype=np.float16)
+
+
+def binary_quantize(vectors):
+    """Signe de chaque dimension, 8 dimensions par octet (comme binary_quantize de pgvector)"""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(codes, query_code):
+    """Distances de Hamming entre des vecteurs binaires empaquetés et une requête"""
+    return _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1, dtype=np.int32)
+
+
+def approximate_scores(quantization, stored, query):
+    """Scores de présélection (plus grand = plus proche) pour une représentation stockée
+
+    `stored` est la matrice float32, float16, le couple (codes, échelles)
+    ou les bits empaquetés selon `quantization`.
+    """
+    if quantization == QUANTIZATION_INT8:
+        codes, scales = stored
+        return int8_scores(codes, scales, query)
+    if quantization == QUANTIZATION_BINARY:
+        return -hamming_distances(stored, binary_quantize(query.reshape(1, -1))[0]).astype(np.float32)
+    return stored.astype(np.float32) @ query
+
+
+def rerank(candidates, vectors, query, k):
+    """Re-classe les lignes candidates en pleine précision -> (lignes, scores) top-k"""
+    scores = np.asarray(vectors[candidates], dtype=np.float32) @ query
+    top = np.argsort(-scores)[:k]
+    return candidates[top], scores[top]
@@ -0,0 +1,417 @@
+"""
+Migration de modèle d'embeddings sans interruption pour LexIA
+Les vecteurs du nouveau modèle sont écrits dans legal_document_embedding
+(migration 002_embedding_models), à côté de "LegalDocument".embedding:
+
+1. start: enregistre le modèle (état backfilling); dès lors les scrapers
+   l'écrivent aussi pour chaque passage inséré (dual_write)
+2. run: remplissage par petits lots, reprenable (curseur sur l'id enregistré
+   avec chaque lot) et plafonné en lignes/s pour ne pas affamer la production
+3. vérification de couverture, index HNSW partiel construit en CONCURRENTLY,
+   état ready
+4. switch: bascule atomique des lectures (une transaction), rollback pour
+   revenir au modèle précédent
+
+Seuls les passages ayant déjà un vecteur ("LegalDocument".embedding non NULL)
+sont migrés: scraper_with_pgvector y stocke le texte complet, celui-là même
+que dual_write encode. Les lignes de scraper_simple n'ont pas de vecteur et
+leur "contentPreview" est tronqué à 500 caractères: les ré-encoder donnerait
+des vecteurs d'un autre texte que ceux écrits par dual_write.
+
+Usage:
+    python reembed.py start intfloat/multilingual-e5-small
+    python reembed.py run intfloat/multilingual-e5-small [--batch-size 128] [--max-rows-per-second 50]
+    python reembed.py status
+    python reembed.py switch intfloat/multilingual-e5-small
+    python reembed.py rollback
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from embedding_stage import EmbeddingStage, vectors_to_pg
+from pgvector_search import (HNSW_EF_CONSTRUCTION, HNSW_M, MODELS_TABLE, SIDE_TABLE, TABLE,
+                             _index_definition, model_index_name, side_expression)
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "128"))
+# Plafond de débit du remplissage (lignes/s, 0: sans limite)
+REEMBED_MAX_ROWS_PER_SECOND = float(os.getenv("REEMBED_MAX_ROWS_PER_SECOND", "50"))
+# Backend des modèles migrés (l'export ONNX n'existe que pour le modèle courant)
+REEMBED_BACKEND = os.getenv("REEMBED_BACKEND", "torch")
+# Une écriture de lot ne doit jamais bloquer longtemps les requêtes de production
+REEMBED_LOCK_TIMEOUT = os.getenv("REEMBED_LOCK_TIMEOUT", "5s")
+REEMBED_STATEMENT_TIMEOUT = os.getenv("REEMBED_STATEMENT_TIMEOUT", "60s")
+
+STATUS_BACKFILLING = "backfilling"
+STATUS_READY = "ready"
+STATUS_ACTIVE = "active"
+
+_models = {}
+
+
+def load_reembed_model(name):
+    """Modèle d'embeddings par nom (chargé une fois par processus)"""
+    if name not in _models:
+        from embedding_pool import load_model
+        _models[name] = load_model(name, REEMBED_BACKEND)
+    return _models[name]
+
+
+def registered_models(conn):
+    """[(nom, dim, état)] des modèles de la table annexe"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT name, dim, status FROM {MODELS_TABLE} ORDER BY created_at")
+        rows = cursor.fetchall()
+    conn.rollback()
+    return rows
+
+
+def coverage(conn, name):
+    """(passages vectorisés, passages ayant un vecteur du modèle)"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT COUNT(*), COUNT(e.document_id)
+            FROM {TABLE} d
+            LEFT JOIN {SIDE_TABLE} e ON e.document_id = d.id AND e.model = %s
+            WHERE d.embedding IS NOT NULL
+        """, (name,))
+        total, covered = cursor.fetchone()
+    conn.rollback()
+    return total, covered
+
+
+def write_embeddings(conn, name, ids, matrix, last_id=None):
+    """Upsert des vecteurs d'un modèle (une transaction)
+
+    Les passages absents de "LegalDocument" (lot refusé par le scraper) sont
+    ignorés. Avec `last_id`, le curseur du remplissage avance dans la même
+    transaction: une reprise ne saute ni ne refait aucun lot.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{REEMBED_LOCK_TIMEOUT}'")
+        cursor.execute(f"SET LOCAL statement_timeout = '{REEMBED_STATEMENT_TIMEOUT}'")
+        cursor.execute(f"""
+            INSERT INTO {SIDE_TABLE} (model, document_id, embedding)
+            SELECT %s, v.id, v.embedding::vector
+            FROM unnest(%s::text[], %s::text[]) AS v (id, embedding)
+            JOIN {TABLE} d ON d.id = v.id
+            ON CONFLICT (model, document_id) DO UPDATE SET
+                embedding = EXCLUDED.embedding,
+                updated_at = NOW()
+        """, (name, list(ids), vectors_to_pg(matrix)))
+        written = cursor.rowcount
+        if last_id is not None:
+            cursor.execute(f"""
+                UPDATE {MODELS_TABLE} SET last_id = %s, rows_done = rows_done + %s WHERE name = %s
+            """, (last_id, written, name))
+    conn.commit()
+    return written
+
+
+def dual_write(db, documents):
+    """Écrit les passages pour chaque modèle enregistré (migration en cours ou active)
+
+    Appelé par les scrapers après l'écriture de "LegalDocument": un passage
+    inséré pendant le remplissage n'attend pas la passe suivante.
+    """
+    models = db.run(registered_models)
+    if not models or not documents:
+        return 0
+    from embedding_cache import EmbeddingCache
+
+    ids = [doc['id'] for doc in documents]
+    texts = [doc['content'] for doc in documents]
+    written = 0
+    for name, dim, status in models:
+        cache = EmbeddingCache(name, dim)
+        stage = EmbeddingStage(loader=lambda name=name: load_reembed_model(name), cache=cache)
+        matrix = stage.encode(texts)
+        cache.close()
+        written += db.run(lambda conn: write_embeddings(conn, name, ids, matrix))
+        print(f"[REEMBED] {name} ({status}): {len(ids)} passages écrits en double")
+    return written
+
+
+def model_dim(name):
+    """Dimension des vecteurs d'un modèle (mesurée sur le modèle lui-même)"""
+    return int(load_reembed_model(name).encode(["dimension"], convert_to_numpy=True).shape[1])
+
+
+def start(conn, name, dim):
+    """Enregistre un modèle à migrer; les scrapers l'écrivent dès le commit"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {MODELS_TABLE} (name, dim) VALUES (%s, %s)
+            ON CONFLICT (name) DO NOTHING
+        """, (name, dim))
+        created = cursor.rowcount == 1
+    conn.commit()
+    print(f"[REEMBED] {name}: {'enregistré' if created else 'déjà enregistré'} ({dim} dimensions)")
+    return created
+
+
+def _model_state(conn, name):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT dim, status, last_id FROM {MODELS_TABLE} WHERE name = %s", (name,))
+        row = cursor.fetchone()
+    conn.rollback()
+    if row is None:
+        raise ValueError(f"Modèle non enregistré: {name} (python reembed.py start {name})")
+    return row
+
+
+def _pending_batch(conn, name, last_id, batch_size):
+    """Lot suivant après last_id, sans les passages déjà écrits (dual_write)
+
+    Passages vectorisés seulement: leur "contentPreview" est le texte complet
+    (voir l'en-tête du module).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT d.id, d."contentPreview"
+            FROM {TABLE} d
+            WHERE d.id > %s
+              AND d.embedding IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {SIDE_TABLE} e WHERE e.model = %s AND e.document_id = d.id)
+            ORDER BY d.id
+            LIMIT %s
+        """, (last_id, name, int(batch_size)))
+        rows = cursor.fetchall()
+    conn.rollback()
+    return rows
+
+
+def ensure_model_index(conn, name, dim, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION):
+    """Index HNSW partiel du modèle (CREATE INDEX CONCURRENTLY, en autocommit)
+
+    Un index INVALID laissé par une construction interrompue est reconstruit.
+    """
+    index = model_index_name(name)
+    existing, valid = _index_definition(conn, index)
+    if existing and valid:
+        return False
+    conn.rollback()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            if existing:
+                print(f"[WARN] {index} INVALID (construction interrompue), reconstruction")
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index}"')
+            print(f"[INDEX] Construction de {index}...")
+            cursor.execute(f"""
+                CREATE INDEX CONCURRENTLY "{index}" ON {SIDE_TABLE}
+                USING hnsw ({side_expression(dim)} vector_cosine_ops)
+                WITH (m = {int(m)}, ef_construction = {int(ef_construction)})
+                WHERE model = '{name.replace("'", "''")}'
+            """)
+    finally:
+        conn.autocommit = autocommit
+    print(f"[OK] Index {index} prêt")
+    return True
+
+
+class Reembedder:
+    """Remplissage reprenable de la table annexe pour un modèle"""
+
+    def __init__(self, db, name, batch_size=REEMBED_BATCH_SIZE, max_rows_per_second=REEMBED_MAX_ROWS_PER_SECOND):
+        self.db = db
+        self.name = name
+        self.batch_size = batch_size
+        self.max_rows_per_second = max_rows_per_second
+        self.stage = EmbeddingStage(loader=lambda: load_reembed_model(name), batch_size=min(batch_size, 64))
+
+        # Statistiques
+        self.batches = 0
+        self.rows = 0
+        self.throttled = 0.0
+        self.started = time.time()
+
+    def _pace(self, rows, started):
+        """Dort ce qu'il faut pour rester sous max_rows_per_second"""
+        if self.max_rows_per_second <= 0:
+            return
+        wait = rows / self.max_rows_per_second - (time.perf_counter() - started)
+        if wait > 0:
+            self.throttled += wait
+            time.sleep(wait)
+
+    def sweep(self, last_id):
+        """Parcourt les passages après last_id; retourne le nombre de lignes écrites"""
+        rows_written = 0
+        while True:
+            started = time.perf_counter()
+            rows = self.db.run(lambda conn: _pending_batch(conn, self.name, last_id, self.batch_size))
+            if not rows:
+                return rows_written
+            # Encodage hors transaction: aucune connexion tenue pendant l'inférence
+            matrix = self.stage.encode([text for _, text in rows])
+            ids = [doc_id for doc_id, _ in rows]
+            last_id = ids[-1]
+            written = self.db.run(lambda conn: write_embeddings(conn, self.name, ids, matrix, last_id=last_id))
+
+            self.batches += 1
+            self.rows += written
+            rows_written += written
+            if self.batches % 10 == 0:
+                print(f"[REEMBED] {self.name}: {self.rows} lignes, curseur {last_id}")
+            self._pace(len(rows), started)
+
+    def run(self):
+        """Reprend au curseur enregistré, vérifie la couverture et passe le modèle en ready"""
+        dim, status, last_id = self.db.run(lambda conn: _model_state(conn, self.name))
+        if status == STATUS_ACTIVE:
+            print(f"[INFO] {self.name} est déjà actif")
+            return True
+        if last_id:
+            print(f"[REEMBED] {self.name}: reprise après {last_id}")
+        self.sweep(last_id)
+
+        # Passages insérés derrière le curseur par un scraper sans dual_write
+        total, covered = self.db.run(lambda conn: coverage(conn, self.name))
+        if covered < total:
+            print(f"[REEMBED] {total - covered} passages manquants, nouvelle passe")
+            self.sweep("")
+            total, covered = self.db.run(lambda conn: coverage(conn, self.name))
+        if covered < total:
+            print(f"[WARN] Couverture incomplète: {covered}/{total} (relancer run)")
+            return False
+
+        self.db.run(lambda conn: ensure_model_index(conn, self.name, dim))
+        self.db.run(lambda conn: _set_status(conn, self.name, STATUS_READY, only_from=STATUS_BACKFILLING))
+        print(f"[OK] {self.name}: couverture {covered}/{total}, prêt pour switch")
+        return True
+
+    def report(self):
+        elapsed = time.time() - self.started
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        print(f"[REEMBED] {self.batches} lots, {self.rows} lignes en {elapsed:.1f}s ({rate:.1f} lignes/s), "
+              f"{self.throttled:.1f}s de pause (plafond {self.max_rows_per_second:g}/s)")
+
+
+def _set_status(conn, name, status, only_from=None):
+    with conn.cursor() as cursor:
+        if only_from:
+            cursor.execute(f"UPDATE {MODELS_TABLE} SET status = %s WHERE name = %s AND status = %s",
+                           (status, name, only_from))
+        else:
+            cursor.execute(f"UPDATE {MODELS_TABLE} SET status = %s WHERE name = %s", (status, name))
+    conn.commit()
+
+
+def switch(conn, name):
+    """Bascule les lectures sur `name` en une transaction (couverture revérifiée)
+
+    Mêmes passages que coverage() et _pending_batch: ceux qui ont un vecteur.
+
+    L'ancien modèle actif repasse en ready: ses vecteurs restent écrits et
+    `rollback` le rétablit sans remplissage.
+    """
+    with conn.cursor() as cursor:
+        # Verrou de ligne seulement: le remplissage d'autres modèles continue;
+        # l'index unique embedding_model_one_active refuse deux modèles actifs
+        cursor.execute(f"SELECT status FROM {MODELS_TABLE} WHERE name = %s FOR UPDATE", (name,))
+        row = cursor.fetchone()
+        if row is None or row[0] not in (STATUS_READY, STATUS_ACTIVE):
+            conn.rollback()
+            raise ValueError(f"{name} n'est pas prêt (état {row[0] if row else 'inconnu'}, lancer run)")
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM {TABLE} d
+            WHERE d.embedding IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {SIDE_TABLE} e WHERE e.model = %s AND e.document_id = d.id)
+        """, (name,))
+        missing = cursor.fetchone()[0]
+        if missing:
+            conn.rollback()
+            raise ValueError(f"{missing} passages sans vecteur {name} (relancer run)")
+
+        cursor.execute(f"UPDATE {MODELS_TABLE} SET status = %s WHERE status = %s AND name <> %s",
+                       (STATUS_READY, STATUS_ACTIVE, name))
+        cursor.execute(f"UPDATE {MODELS_TABLE} SET status = %s, activated_at = NOW() WHERE name = %s",
+                       (STATUS_ACTIVE, name))
+    conn.commit()
+    print(f"[OK] Lectures servies par {name}")
+
+
+def rollback(conn):
+    """Rend les lectures à la colonne "LegalDocument".embedding (vecteurs conservés)"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"UPDATE {MODELS_TABLE} SET status = %s WHERE status = %s RETURNING name",
+                       (STATUS_READY, STATUS_ACTIVE))
+        row = cursor.fetchone()
+    conn.commit()
+    if row:
+        print(f"[OK] {row[0]} désactivé: lectures sur \"LegalDocument\".embedding")
+    else:
+        print("[INFO] Aucun modèle actif")
+
+
+def print_status(conn):
+    models = registered_models(conn)
+    if not models:
+        print("[INFO] Aucun modèle enregistré: lectures sur \"LegalDocument\".embedding")
+        return
+    for name, dim, status in models:
+        total, covered = coverage(conn, name)
+        percent = covered / total * 100 if total else 100.0
+        print(f"  {name:<40} {status:<12} dim={dim:<5} couverture {covered}/{total} ({percent:.1f}%)")
+
+
+def main():
+    from dotenv import load_dotenv
+    from db import Database
+    from migrations import apply_migrations
+
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv(os.path.join(parent_dir, '.env'))
+
+    parser = argparse.ArgumentParser(description="Migration de modèle d'embeddings LexIA")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("start", help="enregistrer un modèle à migrer").add_argument("model")
+    run = sub.add_parser("run", help="remplir la table annexe (reprenable)")
+    run.add_argument("model")
+    run.add_argument("--batch-size", type=int, default=REEMBED_BATCH_SIZE)
+    run.add_argument("--max-rows-per-second", type=float, default=REEMBED_MAX_ROWS_PER_SECOND,
+                     help="plafond de débit (0: sans limite)")
+    sub.add_parser("status", help="état et couverture des modèles")
+    sub.add_parser("switch", help="servir les lectures avec ce modèle").add_argument("model")
+    sub.add_parser("rollback", help="revenir à la colonne \"LegalDocument\".embedding")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("[ERROR] DATABASE_URL non trouvée dans .env")
+        sys.exit(1)
+
+    db = Database(database_url)
+    try:
+        db.run(apply_migrations)
+        if args.command == "start":
+            dim = model_dim(args.model)
+            db.run(lambda conn: start(conn, args.model, dim))
+        elif args.command == "run":
+            reembedder = Reembedder(db, args.model, args.batch_size, args.max_rows_per_second)
+            try:
+                ok = reembedder.run()
+            finally:
+                reembedder.report()
+            if not ok:
+                sys.exit(1)
+        elif args.command == "status":
+            db.run(print_status)
+        elif args.command == "switch":
+            db.run(lambda conn: switch(conn, args.model))
+        else:
+            db.run(rollback)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    finally:
+        db.report()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Cache robots.txt par hôte pour le crawler LexIA
+Un seul téléchargement par hôte et par ROBOTS_TTL, vérification de chaque URL
+et Crawl-delay / Request-rate exposés au limiteur de débit
+"""
+
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+ROBOTS_TTL = int(os.getenv("ROBOTS_TTL", "86400"))             # secondes
+# robots.txt injoignable (5xx, réseau): autorisé, mais réessayé plus tôt
+ROBOTS_ERROR_TTL = int(os.getenv("ROBOTS_ERROR_TTL", "600"))
+ROBOTS_MAX_BYTES = 512 * 1024                                  # au-delà, le reste est ignoré
+
+
+class RobotsDisallowed(Exception):
+    """URL interdite par le robots.txt de son hôte"""
+
+
+class RobotsCache:
+    """robots.txt de chaque hôte (schéma + netloc), partagé par toutes les requêtes
+
+    Les workers qui demandent le même hôte en même temps attendent un seul
+    téléchargement.
+    """
+
+    def __init__(self, user_agent, ttl=ROBOTS_TTL, error_ttl=ROBOTS_ERROR_TTL):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.entries = {}   # hôte -> (expiration, RobotFileParser)
+        self.locks = {}
+
+        # Statistiques
+        self.fetches = 0
+        self.hits = 0
+        self.blocked = 0
+
+    @staticmethod
+    def host_of(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc.lower()}"
+
+    async def _download(self, session, host):
+        """Télécharge et parse robots.txt -> (parser, durée de validité)"""
+        parser = RobotFileParser(f"{host}/robots.txt")
+        try:
+            async with session.get(f"{host}/robots.txt") as response:
+                if response.status in (401, 403):
+                    parser.disallow_all = True
+                    return parser, self.ttl
+                if 400 <= response.status < 500:
+                    parser.allow_all = True
+                    return parser, self.ttl
+                response.raise_for_status()
+                # read(n) ne rend que ce qui est déjà reçu: lecture jusqu'à EOF ou au plafond
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body += chunk[:ROBOTS_MAX_BYTES - len(body)]
+                    if len(body) >= ROBOTS_MAX_BYTES:
+                        break
+        except Exception as e:
+            print(f"  [WARN] Pas de robots.txt pour {host} ({e.__class__.__name__}), on continue prudemment")
+            parser.allow_all = True
+            return parser, self.error_ttl
+
+        parser.parse(body.decode('utf-8', errors='replace').splitlines())
+        parser.modified()
+        return parser, self.ttl
+
+    async def get(self, session, url):
+        """RobotFileParser de l'hôte de l'URL (téléchargé si absent ou expiré)"""
+        host = self.host_of(url)
+        entry = self.entries.get(host)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            entry = self.entries.get(host)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            parser, ttl = await self._download(session, host)
+            self.fetches += 1
+            self.entries[host] = (time.monotonic() + ttl, parser)
+            return parser
+
+    async def check(self, session, url):
+        """Lève RobotsDisallowed si l'URL est interdite; retourne le parser de l'hôte"""
+        parser = await self.get(session, url)
+        if not parser.can_fetch(self.user_agent, url):
+            self.blocked += 1
+            raise RobotsDisallowed(url)
+        return parser
+
+    def delay(self, parser, default):
+        """Délai entre deux requêtes sur l'hôte: Crawl-delay, sinon Request-rate, sinon default"""
+        crawl_delay = parser.crawl_delay(self.user_agent)
+        if crawl_delay is not None:
+            return float(crawl_delay)
+        request_rate = parser.request_rate(self.user_agent)
+        if request_rate is not None and request_rate.requests > 0:
+            return request_rate.seconds / request_rate.requests
+        return default
+
+    def report(self):
+        """Affiche l'activité du cache"""
+        print(f"[ROBOTS] {len(self.entries)} hôtes, {self.fetches} téléchargements, "
+              f"{self.hits} hits, {self.blocked} URLs interdites")
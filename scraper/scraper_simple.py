@@ -1,6 +1,9 @@
 """
 LexIA - Scraper Simple avec Chroma Cloud
 Scrape sites ivoiriens -> PostgreSQL + Chroma Cloud
+
+Les connexions (PostgreSQL, Chroma) ne sont ouvertes qu'a la premiere ecriture.
+Usage: python scraper_simple.py [--dry-run]
 """
 
 import requests
@@ -8,9 +11,15 @@ from bs4 import BeautifulSoup
 import os
 import sys
 import time
-import psycopg2
-import chromadb
 from dotenv import load_dotenv
+from bulk_writer import BulkWriter, ON_CONFLICT_NOTHING
+from crawl_ledger import CrawlLedger, content_hash
+from lexical_index import LexicalIndex
+from metrics import METRICS
+from migrations import apply_migrations
+from pipeline import Pipeline
+from chunker import chunk_document, find_article_number
+from doc_ids import next_doc_id
 
 # Charger les variables d'environnement depuis le dossier parent
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,44 +31,92 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 CHROMA_API_KEY = os.getenv("CHROMA_API_KEY")
 CHROMA_TENANT = os.getenv("CHROMA_TENANT")
 CHROMA_DATABASE = os.getenv("CHROMA_DATABASE")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" ou "local"
 
-# Verifier les variables d'environnement
-if not DATABASE_URL:
-    print("[ERROR] DATABASE_URL non trouve dans .env")
-    sys.exit(1)
-
-if not all([CHROMA_API_KEY, CHROMA_TENANT, CHROMA_DATABASE]):
-    print("[ERROR] Credentials Chroma Cloud manquants dans .env")
-    print("  Requis: CHROMA_API_KEY, CHROMA_TENANT, CHROMA_DATABASE")
-    sys.exit(1)
-
-# Connexion PostgreSQL (Prisma)
-print("[DB] Connexion a PostgreSQL...")
-try:
-    conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
-    print(f"[OK] Connecte a PostgreSQL")
-except Exception as e:
-    print(f"[ERROR] Erreur connexion PostgreSQL: {e}")
-    sys.exit(1)
-
-# Connexion Chroma Cloud
-print("[CHROMA] Connexion a Chroma Cloud...")
-try:
-    chroma_client = chromadb.CloudClient(
-        api_key=CHROMA_API_KEY,
-        tenant=CHROMA_TENANT,
-        database=CHROMA_DATABASE
-    )
-    collection = chroma_client.get_or_create_collection(
-        name="lexia_legal_docs",
-        metadata={"description": "Documents juridiques Cote d'Ivoire"}
-    )
-    print(f"[OK] Connecte a Chroma Cloud ({collection.count()} documents existants)")
-except Exception as e:
-    print(f"[ERROR] Erreur Chroma Cloud: {e}")
-    print(f"  Verifie tes credentials dans .env")
-    sys.exit(1)
+_db = None
+_collection = None
+_ledger = None
+_lexical = None
+
+def get_database():
+    """Pool PostgreSQL (Prisma), ouvert au premier appel
+
+    Une connexion coupee pendant le crawl est rouverte et le lot rejoue.
+    """
+    global _db
+    if _db is not None:
+        return _db
+
+    from db import Database
+
+    if not DATABASE_URL:
+        print("[ERROR] DATABASE_URL non trouve dans .env")
+        sys.exit(1)
+
+    print("[DB] Connexion a PostgreSQL...")
+    db = Database(DATABASE_URL)
+    try:
+        # Colonne plein texte generee + index GIN (une seule fois par base)
+        db.run(apply_migrations)
+        print(f"[OK] Connecte a PostgreSQL")
+    except Exception as e:
+        print(f"[ERROR] Erreur connexion PostgreSQL: {e}")
+        sys.exit(1)
+    _db = db
+    return _db
+
+def get_collection():
+    """Collection vectorielle (Chroma Cloud ou index local), ouverte au premier appel"""
+    global _collection
+    if _collection is not None:
+        return _collection
+
+    if VECTOR_BACKEND == "local":
+        # Index vectoriel local (hors-ligne, embeddings calcules sur la machine)
+        from local_index import open_local_collection
+        print("[INDEX] Ouverture de l'index vectoriel local...")
+        _collection = open_local_collection()
+        print(f"[OK] Index local ({_collection.count()} documents existants)")
+        return _collection
+
+    if not all([CHROMA_API_KEY, CHROMA_TENANT, CHROMA_DATABASE]):
+        print("[ERROR] Credentials Chroma Cloud manquants dans .env")
+        print("  Requis: CHROMA_API_KEY, CHROMA_TENANT, CHROMA_DATABASE")
+        sys.exit(1)
+
+    # Connexion Chroma Cloud
+    import chromadb
+    print("[CHROMA] Connexion a Chroma Cloud...")
+    try:
+        chroma_client = chromadb.CloudClient(
+            api_key=CHROMA_API_KEY,
+            tenant=CHROMA_TENANT,
+            database=CHROMA_DATABASE
+        )
+        _collection = chroma_client.get_or_create_collection(
+            name="lexia_legal_docs",
+            metadata={"description": "Documents juridiques Cote d'Ivoire"}
+        )
+        print(f"[OK] Connecte a Chroma Cloud ({_collection.count()} documents existants)")
+    except Exception as e:
+        print(f"[ERROR] Erreur Chroma Cloud: {e}")
+        print(f"  Verifie tes credentials dans .env")
+        sys.exit(1)
+    return _collection
+
+def get_ledger():
+    """Registre des pages deja crawlees (GET conditionnels)"""
+    global _ledger
+    if _ledger is None:
+        _ledger = CrawlLedger()
+    return _ledger
+
+def get_lexical_index():
+    """Index BM25 local des passages (recherche hybride)"""
+    global _lexical
+    if _lexical is None:
+        _lexical = LexicalIndex()
+    return _lexical
 
 # Sites a scraper
 SITES = {
@@ -74,35 +131,72 @@ def clean_text(text):
         return ""
     return ' '.join(text.split()).strip()
 
-def scrape_site(name, url):
-    """Scrape un site"""
+def fetch_site(name, url):
+    """Recupere la page d'un site (None si erreur ou inchangee)"""
     print(f"\n[SCRAPE] Scraping {name}...")
 
     try:
-        response = requests.get(url, timeout=30, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        with METRICS.timer("fetch"):
+            response = requests.get(url, timeout=30, headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                **get_ledger().conditional_headers(url)
+            })
         response.raise_for_status()
+        METRICS.incr("pages_fetched")
+        METRICS.incr("bytes_downloaded", len(response.content))
+
+        # Page inchangee depuis le dernier crawl: rien a parser ni indexer
+        ledger = get_ledger()
+        if ledger.is_not_modified(url, response.status_code):
+            print(f"  [SKIP] Non modifie (304)")
+            return None
+        digest = content_hash(response.content)
+        if ledger.is_unchanged(url, digest):
+            print(f"  [SKIP] Contenu identique au dernier crawl")
+            return None
+        ledger.record(url, response.headers, digest)
+
+        return response
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        documents = []
+    except requests.exceptions.RequestException as e:
+        METRICS.incr("fetch_errors")
+        print(f"[ERROR] Erreur reseau {name}: {e}")
+        return None
 
-        # ADAPTER selon le site reel
-        # Ces selecteurs sont generiques et devront etre ajustes
+def fetch_sites():
+    """Source du pipeline: (nom, url, reponse) pour chaque site modifie"""
+    for name, url in SITES.items():
+        response = fetch_site(name, url)
+        if response is not None:
+            yield name, url, response
 
-        # Essayer plusieurs selecteurs possibles
-        articles = (
-            soup.find_all('article')[:10] or
-            soup.find_all('div', class_='post')[:10] or
-            soup.find_all('div', class_='content')[:10] or
-            soup.find_all('div', class_='document')[:10]
-        )
+        time.sleep(2)  # Etre respectueux avec les serveurs
+
+def extract_documents(page):
+    """Etape extract: produit les documents d'une page au fil de l'eau"""
+    name, url, response = page
+
+    try:
+        with METRICS.timer("extract"):
+            soup = BeautifulSoup(response.text, 'html.parser')
+
+            # ADAPTER selon le site reel
+            # Ces selecteurs sont generiques et devront etre ajustes
+
+            # Essayer plusieurs selecteurs possibles
+            articles = (
+                soup.find_all('article')[:10] or
+                soup.find_all('div', class_='post')[:10] or
+                soup.find_all('div', class_='content')[:10] or
+                soup.find_all('div', class_='document')[:10]
+            )
 
         if not articles:
-            print(f"  [WARN] Aucun article trouve avec les selecteurs par defaut")
+            print(f"  [WARN] {name}: aucun article trouve avec les selecteurs par defaut")
             print(f"  [INFO] Conseil: Inspecte le site et ajuste les selecteurs dans scraper_simple.py")
-            return []
+            return
 
+        seen_ids = {}
         for idx, article in enumerate(articles):
             try:
                 # Chercher le titre
@@ -119,8 +213,9 @@ def scrape_site(name, url):
                 if len(content) < 100:
                     continue
 
-                # Creer un ID unique
-                doc_id = f"{name}_{idx}_{abs(hash(content)) % 1000000}"
+                # ID stable: URL + numero d'article (ou titre) -> upsert idempotent
+                # (titres repetes sur la page: ordinal, voir next_doc_id)
+                doc_id = next_doc_id(seen_ids, url, find_article_number(title) or title, prefix=name)
 
                 doc = {
                     'id': doc_id,
@@ -131,62 +226,38 @@ def scrape_site(name, url):
                     'url': url
                 }
 
-                documents.append(doc)
                 print(f"  [OK] {title[:60]}...")
+                yield doc
 
             except Exception as e:
                 print(f"  [ERROR] Erreur article {idx}: {e}")
                 continue
 
-        time.sleep(2)  # Etre respectueux avec les serveurs
-        return documents
-
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] Erreur reseau {name}: {e}")
-        return []
     except Exception as e:
         print(f"[ERROR] Erreur {name}: {e}")
-        return []
 
 def save_to_prisma(documents):
     """Sauvegarde dans PostgreSQL (Prisma)"""
     if not documents:
         print("\n[WARN] Aucun document a sauvegarder dans PostgreSQL")
-        return
+        return True
 
     print(f"\n[DB] Sauvegarde PostgreSQL...")
-    saved_count = 0
 
-    for doc in documents:
-        try:
-            # PostgreSQL syntax
-            cursor.execute("""
-                INSERT INTO "LegalDocument"
-                (id, title, category, "contentPreview", "sourceUrl", "scrapedAt", "createdAt")
-                VALUES (%s, %s, %s, %s, %s, NOW(), NOW())
-                ON CONFLICT (id) DO NOTHING
-            """, (
-                doc['id'],
-                doc['title'],
-                doc['category'],
-                doc['content_preview'],
-                doc['url']
-            ))
-
-            conn.commit()
-            saved_count += 1
-
-        except Exception as e:
-            conn.rollback()
-            print(f"  [ERROR] Erreur save {doc['id']}: {e}")
+    # Un COPY + une transaction par lot au lieu d'un commit par document
+    writer = BulkWriter(get_database(), on_conflict=ON_CONFLICT_NOTHING)
+    saved_count = writer.write(documents)
 
     print(f"  [OK] {saved_count}/{len(documents)} documents sauvegardes")
+    writer.report()
+
+    return writer.errors == 0
 
 def save_to_chromadb(documents):
     """Sauvegarde dans Chroma Cloud (vecteurs)"""
     if not documents:
         print("\n[WARN] Aucun document a sauvegarder dans Chroma Cloud")
-        return
+        return True
 
     print(f"\n[CHROMA] Indexation Chroma Cloud...")
 
@@ -197,57 +268,100 @@ def save_to_chromadb(documents):
         metadatas = [{
             'title': doc['title'],
             'category': doc['category'],
-            'url': doc['url']
+            'url': doc['url'],
+            'parent_id': doc['parent_id'],
+            'article': doc['article'] or ''
         } for doc in documents]
 
         # Chroma Cloud genere automatiquement les embeddings
-        collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas
-        )
+        # (upsert: un re-run remplace les documents au lieu de les dupliquer)
+        collection = get_collection()
+        with METRICS.timer("vector_write"):
+            collection.upsert(
+                ids=ids,
+                documents=texts,
+                metadatas=metadatas
+            )
+        METRICS.incr("vector_rows_written", len(documents))
 
         print(f"  [OK] {len(documents)} documents indexes dans Chroma Cloud")
         print(f"  [INFO] Total dans Chroma Cloud: {collection.count()} documents")
 
+        return True
+
     except Exception as e:
         print(f"  [ERROR] Erreur Chroma Cloud: {e}")
+        return False
 
-def main():
+def save_to_lexical(documents):
+    """Mise a jour incrementale de l'index BM25 (texte complet des passages)"""
+    try:
+        with METRICS.timer("lexical_write"):
+            get_lexical_index().add(documents)
+        return True
+    except Exception as e:
+        print(f"  [ERROR] Erreur index BM25: {e}")
+        return False
+
+def save_batch(documents):
+    """Puits du pipeline: ecrit un lot dans PostgreSQL, Chroma Cloud et l'index BM25"""
+    urls = [doc['url'] for doc in documents]
+    saved = save_to_prisma(documents)
+    indexed = save_to_chromadb(documents)
+    indexed_text = save_to_lexical(documents)
+
+    # Enregistrer les pages du lot seulement si tout a ete ecrit
+    if saved and indexed and indexed_text:
+        get_ledger().commit(urls)
+        return True
+
+    get_ledger().forget(urls)
+    return False
+
+def print_batch(documents):
+    """Puits du --dry-run: affiche le lot sans rien ecrire"""
+    for doc in documents:
+        print(f"  [DRY-RUN] {doc['id']} ({len(doc['content'])} chars)")
+    return True
+
+def main(dry_run=False):
     """Fonction principale"""
     print("=" * 60)
     print("LEXIA - Scraping Legislation Ivoirienne")
     print("=" * 60)
 
-    all_documents = []
+    # Les documents sont decoupes en passages et ecrits par lots des qu'ils sont extraits
+    pipeline = (
+        Pipeline()
+        .add_stage("extract", extract_documents)
+        .add_stage("chunk", chunk_document)
+    )
+    total = pipeline.run(fetch_sites(), print_batch if dry_run else save_batch)
 
-    # Scraper chaque site
-    for name, url in SITES.items():
-        docs = scrape_site(name, url)
-        all_documents.extend(docs)
-
-        # Pause entre chaque site
-        if docs:
-            time.sleep(3)
-
-    # Sauvegarder
-    if all_documents:
-        save_to_prisma(all_documents)
-        save_to_chromadb(all_documents)
-    else:
+    if pipeline.items_in and not pipeline.batches:
         print("\n[WARN] Aucun document trouve!")
         print("[INFO] Conseil: Les sites ont peut-etre change leur structure.")
         print("   Inspecte les sites et ajuste les selecteurs CSS dans ce script.")
 
     print("\n" + "=" * 60)
-    print(f"[DONE] TERMINE - {len(all_documents)} documents scrapes")
-    print(f"[INFO] Chroma Cloud: {collection.count()} documents au total")
-    print("[OK] Disponibles pour Next.js maintenant!")
+    print(f"[DONE] TERMINE - {total} passages indexes")
+    pipeline.report()
+    get_ledger().report()
+    if _lexical is not None:
+        _lexical.report()
+    if _collection is not None:
+        print(f"[INFO] Chroma Cloud: {_collection.count()} documents au total")
+        print("[OK] Disponibles pour Next.js maintenant!")
     print("=" * 60)
 
     # Fermer les connexions
-    cursor.close()
-    conn.close()
+    get_ledger().close()
+    if _lexical is not None:
+        _lexical.close()
+    if _db is not None:
+        _db.report()
+        _db.close()
+    METRICS.finish_run("scraper_simple")
 
 if __name__ == "__main__":
-    main()
+    main(dry_run="--dry-run" in sys.argv)
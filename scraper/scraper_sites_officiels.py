@@ -1,18 +1,27 @@
 """
 Scraper pour sites juridiques officiels ivoiriens
 Collecte lois, décrets, codes depuis sources gouvernementales
+
+La collection vectorielle n'est ouverte qu'à la première écriture.
+Usage: python scraper_sites_officiels.py [--dry-run]
 """
 
-import requests
-from bs4 import BeautifulSoup
 import os
 import sys
-import time
-import hashlib
-import chromadb
+import asyncio
 from dotenv import load_dotenv
-from urllib.robotparser import RobotFileParser
-from urllib.parse import urljoin, urlparse
+from crawler import AsyncCrawler, MAX_CONNECTIONS_PER_HOST
+from robots_cache import RobotsDisallowed
+from crawl_ledger import CrawlLedger, content_hash
+from crawl_frontier import CrawlFrontier
+from html_extract import parse_html, extract_title, extract_links, extract_main_text
+from pipeline import Pipeline, iter_async, PIPELINE_QUEUE_SIZE
+from pdf_extract import PdfExtractor
+from chunker import chunk_document
+from doc_ids import make_doc_id
+from dedup import DedupIndex
+from lexical_index import LexicalIndex
+from metrics import METRICS
 
 # Charger les variables d'environnement depuis le dossier parent
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,21 +30,41 @@ load_dotenv(dotenv_path)
 
 # Configuration
 USER_AGENT = "LexIA-Scraper/1.0 (Legal Research Bot; +https://lexia.ci)"
-PAUSE_BETWEEN_REQUESTS = 3  # Respectueux des serveurs
-
-# Chroma Cloud
-print("[CHROMA] Connexion à Chroma Cloud...")
-try:
-    chroma_client = chromadb.CloudClient(
-        api_key=os.getenv("CHROMA_API_KEY"),
-        tenant=os.getenv("CHROMA_TENANT"),
-        database=os.getenv("CHROMA_DATABASE")
-    )
-    collection = chroma_client.get_or_create_collection("lexia_legal_docs")
-    print(f"[OK] Connecté à Chroma Cloud ({collection.count()} documents existants)")
-except Exception as e:
-    print(f"[ERROR] Erreur Chroma Cloud: {e}")
-    sys.exit(1)
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))  # pages traitées en parallèle (tous sites)
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" ou "local"
+
+_collection = None
+
+def get_collection():
+    """Collection vectorielle (Chroma Cloud ou index local), ouverte au premier appel"""
+    global _collection
+    if _collection is not None:
+        return _collection
+
+    if VECTOR_BACKEND == "local":
+        # Index vectoriel local (hors-ligne, embeddings calculés sur la machine)
+        from local_index import open_local_collection
+        print("[INDEX] Ouverture de l'index vectoriel local...")
+        _collection = open_local_collection()
+        print(f"[OK] Index local ({_collection.count()} documents existants)")
+        return _collection
+
+    # Chroma Cloud
+    import chromadb
+    print("[CHROMA] Connexion à Chroma Cloud...")
+    try:
+        chroma_client = chromadb.CloudClient(
+            api_key=os.getenv("CHROMA_API_KEY"),
+            tenant=os.getenv("CHROMA_TENANT"),
+            database=os.getenv("CHROMA_DATABASE")
+        )
+        _collection = chroma_client.get_or_create_collection("lexia_legal_docs")
+        print(f"[OK] Connecté à Chroma Cloud ({_collection.count()} documents existants)")
+    except Exception as e:
+        print(f"[ERROR] Erreur Chroma Cloud: {e}")
+        sys.exit(1)
+    return _collection
 
 # Sites à scraper
 SITES = [
@@ -71,136 +100,205 @@ SITES = [
     }
 ]
 
-def check_robots_txt(base_url):
-    """Vérifie si le scraping est autorisé"""
-    parsed = urlparse(base_url)
-    robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-
-    rp = RobotFileParser()
-    rp.set_url(robots_url)
-
+async def fetch_page(crawler, url, headers=None):
+    """Récupère une page via le crawler (robots.txt et débit de l'hôte respectés)"""
     try:
-        rp.read()
-        return rp.can_fetch(USER_AGENT, base_url)
-    except:
-        print(f"  [WARN] Pas de robots.txt, on continue prudemment")
-        return True
-
-def fetch_page(url):
-    """Récupère une page avec headers appropriés"""
-    try:
-        response = requests.get(
-            url,
-            headers={"User-Agent": USER_AGENT},
-            timeout=30
-        )
-        response.raise_for_status()
-        return response
+        return await crawler.fetch(url, headers=headers)
+    except RobotsDisallowed:
+        print(f"  [INFO] Interdit par robots.txt: {url[:80]}")
+        return None
     except Exception as e:
         print(f"  [ERROR] Erreur fetch {url[:60]}...: {e}")
         return None
 
-def extract_links(base_url, html, selectors):
-    """Extrait les liens pertinents"""
-    soup = BeautifulSoup(html, 'html.parser')
-    links = set()
-
-    for selector in selectors:
-        for link in soup.select(selector):
-            href = link.get('href')
-            if href:
-                full_url = urljoin(base_url, href)
-                links.add(full_url)
-
-    return list(links)
-
-def extract_text_from_page(html):
-    """Extrait le texte principal d'une page"""
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # Supprimer scripts, styles, etc.
-    for element in soup(['script', 'style', 'nav', 'header', 'footer']):
-        element.decompose()
-
-    # Chercher le contenu principal
-    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=['content', 'main', 'text'])
+async def scrape_pdf(crawler, ledger, pdfs, site, link):
+    """Télécharge un PDF en flux et extrait son texte dans le pool de processus"""
+    try:
+        download = await pdfs.fetch(crawler, link, ledger.conditional_headers(link))
+    except RobotsDisallowed:
+        print(f"    [INFO] Interdit par robots.txt: {link[:80]}")
+        return None
+    except Exception as e:
+        print(f"    [ERROR] Erreur PDF {link[:60]}...: {e}")
+        return None
 
-    if main_content:
-        text = main_content.get_text(separator=' ', strip=True)
-    else:
-        text = soup.get_text(separator=' ', strip=True)
+    if ledger.is_not_modified(link, download.status):
+        return None
+    if ledger.is_unchanged(link, download.digest):
+        os.remove(download.path)
+        return None
 
-    # Nettoyer
-    text = ' '.join(text.split())
-    return text
+    result = await pdfs.extract(download)
+    if not result:
+        return None
+    title, text = result
 
-def scrape_site(site):
-    """Scrape un site officiel"""
-    print(f"\n{'='*60}")
-    print(f"[SCRAPE] {site['name']} ({site['base_url']})")
-    print(f"{'='*60}")
+    if len(text) < 100:
+        print(f"    [WARN] PDF sans texte exploitable ({len(text)} chars), ignoré: {link[:80]}")
+        return None
 
-    # Vérifier robots.txt
-    if not check_robots_txt(site['base_url']):
-        print(f"  [ERROR] robots.txt interdit le scraping de {site['base_url']}")
-        return []
+    ledger.record(link, download.headers, download.digest)
+    title = title or link.split('/')[-1]
+    print(f"    [OK] PDF {title[:60]}... ({len(text)} chars)")
+    return {
+        "id": make_doc_id(link, prefix=site['name']),
+        "title": title[:500],  # Limiter la longueur
+        "content": text,
+        "url": link,
+        "source": site['name'],
+        "category": "legislation"
+    }
 
-    # Fetch page principale
-    response = fetch_page(site['base_url'])
+async def scrape_link(crawler, ledger, pdfs, site, link, follow=False):
+    """Récupère et extrait un lien d'un site -> (document ou None, liens à suivre)
+
+    `follow`: la page n'est pas au fond du crawl, ses liens sont extraits. Elle
+    est alors récupérée sans GET conditionnel (un 304 n'a pas de liens); le
+    hash du contenu évite quand même de la ré-indexer. La page est parsée une
+    seule fois (lxml) pour les liens, le titre et le texte.
+    """
+    # Si c'est un PDF
+    if link.lower().endswith('.pdf'):
+        return await scrape_pdf(crawler, ledger, pdfs, site, link), []
+
+    # Si c'est une page HTML
+    headers = None if follow else ledger.conditional_headers(link)
+    page_response = await fetch_page(crawler, link, headers)
+    if not page_response:
+        return None, []
+
+    tree = None
+    links = []
+    # Deux étapes chronométrées séparément: une seule mesure de chacune par page
+    if follow:
+        with METRICS.timer("extract_links"):
+            tree = parse_html(page_response.body, page_response.encoding)
+            links = extract_links(tree, link, site['selectors'])
+
+    # Page inchangée depuis le dernier crawl: ni parsing, ni embedding, ni upsert
+    if ledger.is_not_modified(link, page_response.status):
+        return None, links
+    digest = content_hash(page_response.body)
+    if ledger.is_unchanged(link, digest):
+        return None, links
+    ledger.record(link, page_response.headers, digest)
+
+    # Extraire contenu (titre avant le texte: extract_main_text élague l'arbre)
+    with METRICS.timer("extract_text"):
+        if tree is None:
+            tree = parse_html(page_response.body, page_response.encoding)
+        title = extract_title(tree) or link.split('/')[-1]
+        text = extract_main_text(tree)
+
+    if len(text) < 100:
+        print(f"    [WARN] Texte trop court ({len(text)} chars), ignoré: {link[:80]}")
+        return None, links
+
+    print(f"    [OK] {title[:60]}... ({len(text)} chars)")
+    return {
+        "id": make_doc_id(link, prefix=site['name']),
+        "title": title[:500],  # Limiter la longueur
+        "content": text,
+        "url": link,
+        "source": site['name'],
+        "category": "legislation"
+    }, links
+
+async def scrape_home(crawler, site, link):
+    """Page d'accueil d'un site: seulement une source de liens"""
+    response = await fetch_page(crawler, link)
     if not response:
-        return []
-
-    # Extraire liens
-    links = extract_links(site['base_url'], response.text, site['selectors'])
-    print(f"  [OK] {len(links)} liens trouvés")
-
-    documents = []
-
-    for idx, link in enumerate(links[:10], 1):  # Limiter à 10 pour test
-        print(f"\n  [{idx}/{min(len(links), 10)}] {link[:80]}...")
-        time.sleep(PAUSE_BETWEEN_REQUESTS)
-
-        # Si c'est un PDF
-        if link.lower().endswith('.pdf'):
-            print(f"    [INFO] PDF détecté (extraction PDF à implémenter)")
-            # TODO: Télécharger et extraire texte avec PyPDF2
-            continue
-
-        # Si c'est une page HTML
-        page_response = fetch_page(link)
-        if not page_response:
-            continue
-
-        # Extraire contenu
-        soup = BeautifulSoup(page_response.text, 'html.parser')
-        title_tag = soup.find('title') or soup.find('h1')
-        title = title_tag.get_text(strip=True) if title_tag else link.split('/')[-1]
-
-        text = extract_text_from_page(page_response.text)
-
-        if len(text) < 100:
-            print(f"    [WARN] Texte trop court ({len(text)} chars), ignoré")
-            continue
-
-        doc = {
-            "id": f"{site['name'].lower().replace(' ', '_')}_{hashlib.sha1(link.encode()).hexdigest()[:10]}",
-            "title": title[:500],  # Limiter la longueur
-            "content": text,
-            "url": link,
-            "source": site['name'],
-            "category": "legislation"
-        }
-
-        documents.append(doc)
-        print(f"    [OK] {title[:60]}... ({len(text)} chars)")
-
-    return documents
+        return None, []
+    with METRICS.timer("extract_links"):
+        links = extract_links(parse_html(response.body, response.encoding), link, site['selectors'])
+    print(f"  [OK] {site['name']}: {len(links)} liens trouvés")
+    return None, links
+
+async def crawl_documents(sites, ledger, frontier):
+    """Générateur asynchrone des documents de tous les sites
+
+    Les pages viennent de la frontière (priorité du site, puis profondeur) et
+    sont traitées par CRAWL_WORKERS tâches. Le crawler vérifie chaque URL dans
+    le robots.txt de son hôte (mis en cache) et espace les requêtes selon son
+    Crawl-delay.
+    """
+    output = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+
+    pdfs = PdfExtractor()
+
+    async with AsyncCrawler(USER_AGENT) as crawler:
+        # Sites interdits dès la page d'accueil: rien à mettre en file
+        allowed = {}
+        for site in sites:
+            print(f"\n[SCRAPE] {site['name']} ({site['base_url']})")
+            if await crawler.allowed(site['base_url']):
+                allowed[site['name']] = site
+                frontier.add_site(site)
+            else:
+                print(f"  [ERROR] robots.txt interdit le scraping de {site['base_url']}")
+
+        changed = asyncio.Condition()
+
+        async def next_entry():
+            async with changed:
+                while True:
+                    entry = frontier.pop(max_per_site=MAX_CONNECTIONS_PER_HOST)
+                    if entry or frontier.is_idle():
+                        return entry
+                    await changed.wait()
+
+        async def worker():
+            while True:
+                entry = await next_entry()
+                if entry is None:
+                    return
+                url, name, depth = entry
+                doc = None
+                try:
+                    site = allowed.get(name)
+                    if site is None:
+                        continue  # site retiré ou interdit depuis le point de reprise
+                    if depth == 0:
+                        doc, links = await scrape_home(crawler, site, url)
+                    else:
+                        doc, links = await scrape_link(crawler, ledger, pdfs, site, url,
+                                                       follow=depth < frontier.max_depth)
+                    for link in links:
+                        frontier.add(link, name, depth + 1)
+                    if doc:
+                        await output.put(doc)
+                finally:
+                    frontier.done(url, pending=doc is not None)
+                    async with changed:
+                        changed.notify_all()
+
+        async def crawl_all():
+            try:
+                await asyncio.gather(*[worker() for _ in range(CRAWL_WORKERS)])
+            finally:
+                await output.put(None)
+
+        producer = asyncio.create_task(crawl_all())
+        try:
+            while True:
+                doc = await output.get()
+                if doc is None:
+                    break
+                yield doc
+            await producer
+        finally:
+            # Arrêt (fin ou interruption): l'état courant est repris au prochain run
+            frontier.checkpoint()
+        crawler.report()
+        pdfs.report()
+
+    pdfs.close()
 
 def save_to_chroma(documents):
     """Sauvegarde dans Chroma Cloud"""
     if not documents:
         print("\n[WARN] Aucun document à sauvegarder")
-        return
+        return True
 
     print(f"\n[CHROMA] Sauvegarde de {len(documents)} documents dans Chroma Cloud...")
 
@@ -211,42 +309,153 @@ def save_to_chroma(documents):
             "title": doc["title"],
             "url": doc["url"],
             "source": doc["source"],
-            "category": doc["category"]
+            "category": doc["category"],
+            "sources": "; ".join(doc["sources"]),
+            "parent_id": doc["parent_id"],
+            "article": doc["article"] or ""
         } for doc in documents]
 
-        collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas
-        )
+        # upsert: un re-run remplace les documents au lieu de les dupliquer
+        collection = get_collection()
+        with METRICS.timer("vector_write"):
+            collection.upsert(
+                ids=ids,
+                documents=texts,
+                metadatas=metadatas
+            )
+        METRICS.incr("vector_rows_written", len(documents))
 
         print(f"  [OK] {len(documents)} documents indexés")
         print(f"  [INFO] Total Chroma Cloud: {collection.count()} documents")
 
+        return True
+
     except Exception as e:
         print(f"  [ERROR] Erreur Chroma: {e}")
+        return False
+
+def update_sources(duplicates):
+    """Ajoute les origines des quasi-doublons aux métadonnées des passages originaux
+
+    Retourne les doublons dont l'original est introuvable (lot refusé entre-temps),
+    à indexer à sa place, ou None en cas d'erreur.
+    """
+    if not duplicates:
+        return []
+
+    try:
+        collection = get_collection()
+        orphans = []
+        for dup in duplicates:
+            existing = collection.get(where={"parent_id": dup["duplicate_of"]}, include=["metadatas"])
+            if not existing["ids"]:
+                orphans.append(dup)
+                continue
+            sources = "; ".join(dup["sources"])
+            collection.update(
+                ids=existing["ids"],
+                metadatas=[{**meta, "sources": sources} for meta in existing["metadatas"]]
+            )
+        print(f"  [OK] {len(duplicates) - len(orphans)} quasi-doublons rattachés à leur original")
+        return orphans
 
-def main():
+    except Exception as e:
+        print(f"  [ERROR] Erreur mise à jour des sources: {e}")
+        return None
+
+def main(dry_run=False):
     """Fonction principale"""
     print("="*60)
     print("LEXIA - Scraper Sites Officiels Ivoiriens")
     print("="*60)
 
-    all_docs = []
-
-    # Trier par priorité
+    # La priorité des sites ordonne la frontière (les sites sont crawlés en parallèle)
     sorted_sites = sorted(SITES, key=lambda x: x['priority'])
 
-    for site in sorted_sites:
-        docs = scrape_site(site)
-        all_docs.extend(docs)
+    # --dry-run: registre, index de doublons et frontière en mémoire, rien
+    # n'est écrit dans data/ (le run suivant n'est pas faussé)
+    if dry_run:
+        ledger = CrawlLedger(":memory:")
+        frontier = CrawlFrontier(path=None)
+        dedup = DedupIndex(":memory:")
+        lexical = None
+    else:
+        ledger = CrawlLedger()
+        frontier = CrawlFrontier()
+        dedup = DedupIndex()
+        lexical = LexicalIndex()
+
+    def print_batch(documents):
+        """Puits du --dry-run: affiche le lot sans rien écrire"""
+        for doc in documents:
+            print(f"  [DRY-RUN] {doc['id']} ({len(doc['content'])} chars)")
+        return True
 
-    # Sauvegarder
-    save_to_chroma(all_docs)
+    def save_to_lexical(documents):
+        """Index BM25 mis à jour au fil du crawl (recherche hybride)"""
+        try:
+            with METRICS.timer("lexical_write"):
+                lexical.add(documents)
+            return True
+        except Exception as e:
+            print(f"  [ERROR] Erreur index BM25: {e}")
+            return False
+
+    def save_batch(documents):
+        """Puits du pipeline: indexe un lot et enregistre ses pages dans le registre
+
+        Les signatures des originaux n'entrent dans l'index de doublons qu'après
+        la sauvegarde; un doublon dont l'original manque est indexé à sa place.
+        """
+        urls = [doc["url"] for doc in documents]
+        originals = [doc for doc in documents if not doc.get("duplicate_of")]
+        duplicates = [doc for doc in documents if doc.get("duplicate_of")]
+        saved = save_to_chroma(originals)
+        orphans = update_sources(duplicates) if saved else None
+        if orphans:
+            print(f"  [WARN] {len(orphans)} quasi-doublons sans original indexé: indexés à sa place")
+            promoted = [chunk for dup in orphans for chunk in chunk_document(dedup.promote(dup))]
+            saved = save_to_chroma(promoted)
+            originals += promoted
+        doc_ids = {doc.get("parent_id") or doc["id"] for doc in originals}
+        if saved and orphans is not None and save_to_lexical(originals):
+            dedup.commit(doc_ids)
+            ledger.commit(urls)
+            frontier.commit(urls)
+            return True
+        dedup.forget(doc_ids)
+        ledger.forget(urls)
+        return False
+
+    # Les quasi-doublons sont écartés avant le découpage et l'embedding,
+    # les passages sont indexés par lots pendant que le crawl continue
+    pipeline = (
+        Pipeline()
+        .add_stage("dedup", dedup.check)
+        .add_stage("chunk", chunk_document)
+    )
+    total = pipeline.run(iter_async(crawl_documents(sorted_sites, ledger, frontier)),
+                         print_batch if dry_run else save_batch)
+
+    # Crawl allé au bout: le prochain run repart des pages d'accueil;
+    # sinon (erreur de la source) le point de reprise est gardé
+    frontier.report()
+    if frontier.is_idle():
+        frontier.finish()
+
+    pipeline.report()
+    ledger.report()
+    dedup.report()
+    if lexical is not None:
+        lexical.report()
+        lexical.close()
+    ledger.close()
+    dedup.close()
+    METRICS.finish_run("scraper_sites_officiels")
 
     print("\n" + "="*60)
-    print(f"[DONE] Scraping terminé: {len(all_docs)} documents collectés")
+    print(f"[DONE] Scraping terminé: {total} passages indexés")
     print("="*60)
 
 if __name__ == "__main__":
-    main()
+    main(dry_run="--dry-run" in sys.argv)
@@ -1,66 +1,111 @@
 """
 Scraper avec embeddings pgvector pour Neon PostgreSQL
 Retire ChromaDB et utilise directement pgvector dans Neon
+
+Les dépendances lourdes (torch, modèle, connexion) ne sont chargées qu'au
+moment où une étape en a besoin: un --dry-run ou un run sans rien de nouveau
+démarre en une fraction de seconde.
 """
 
 import os
 import sys
-import psycopg2
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+from embedding_stage import EmbeddingStage
+from embedding_cache import EmbeddingCache
+from bulk_writer import BulkWriter, ON_CONFLICT_REFRESH_EMBEDDING, WIRE_FORMAT_BINARY
+from chunker import chunk_document, find_article_number
+from lexical_index import LexicalIndex
+from migrations import apply_migrations
+from doc_ids import next_doc_id
+from metrics import METRICS
 
 # Charger les variables d'environnement depuis le dossier parent
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 dotenv_path = os.path.join(parent_dir, '.env')
 load_dotenv(dotenv_path)
 
-print("=" * 80)
-print("🚀 SCRAPER PGVECTOR - LexIA")
-print("=" * 80)
-
-# Connexion PostgreSQL Neon
-database_url = os.getenv("DATABASE_URL")
-if not database_url:
-    print("❌ DATABASE_URL non trouvée dans .env")
-    sys.exit(1)
-
-print(f"\n📡 Connexion à Neon PostgreSQL...")
-try:
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor()
-    print("✅ Connecté à Neon PostgreSQL")
-except Exception as e:
-    print(f"❌ Erreur connexion PostgreSQL: {e}")
-    sys.exit(1)
-
-# Vérifier que pgvector est activé
-print("\n🔍 Vérification de l'extension pgvector...")
-try:
-    cursor.execute("SELECT * FROM pg_extension WHERE extname = 'vector';")
-    result = cursor.fetchone()
-    if result:
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+
+_db = None
+_model = None
+
+def check_pgvector(conn):
+    """Vérifie que l'extension pgvector est activée"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM pg_extension WHERE extname = 'vector';")
+        return cursor.fetchone() is not None
+
+def get_database():
+    """Pool Neon PostgreSQL (ouvert au premier appel, pgvector vérifié)
+
+    Les connexions coupées par Neon pendant un long run sont rouvertes et le
+    lot en cours est rejoué (voir db.py).
+    """
+    global _db
+    if _db is not None:
+        return _db
+
+    from db import Database
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ DATABASE_URL non trouvée dans .env")
+        sys.exit(1)
+
+    print(f"\n📡 Connexion à Neon PostgreSQL...")
+    db = Database(database_url)
+
+    # Vérifier que pgvector est activé
+    print("\n🔍 Vérification de l'extension pgvector...")
+    try:
+        enabled = db.run(check_pgvector)
+        print("✅ Connecté à Neon PostgreSQL")
+    except Exception as e:
+        print(f"❌ Erreur connexion PostgreSQL: {e}")
+        sys.exit(1)
+    if enabled:
         print("✅ Extension pgvector activée")
     else:
         print("⚠️  Extension pgvector NON activée")
         print("   Allez dans Neon Console > SQL Editor et exécutez:")
         print("   CREATE EXTENSION IF NOT EXISTS vector;")
         sys.exit(1)
-except Exception as e:
-    print(f"❌ Erreur vérification pgvector: {e}")
-    sys.exit(1)
-
-# Charger le modèle d'embeddings (384 dimensions)
-print("\n📥 Chargement du modèle d'embeddings (all-MiniLM-L6-v2)...")
-try:
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    print("✅ Modèle chargé (384 dimensions)")
-except Exception as e:
-    print(f"❌ Erreur chargement modèle: {e}")
-    print("   Installez: pip install sentence-transformers")
-    sys.exit(1)
+
+    # Colonne plein texte générée + index GIN (une seule fois par base)
+    try:
+        for name in db.run(apply_migrations):
+            print(f"✅ Migration {name} appliquée")
+    except Exception as e:
+        print(f"❌ Erreur migration du schéma: {e}")
+        sys.exit(1)
+
+    _db = db
+    return _db
+
+def get_model():
+    """Modèle d'embeddings (384 dimensions), importé et chargé au premier appel"""
+    global _model
+    if _model is not None:
+        return _model
+
+    from embedding_pool import EMBEDDING_BACKEND, load_embedding_model
+
+    print(f"\n📥 Chargement du modèle d'embeddings ({EMBEDDING_MODEL}, backend {EMBEDDING_BACKEND})...")
+    try:
+        # EMBED_WORKERS > 1: pool de processus (un modèle par worker)
+        # EMBEDDING_BACKEND=onnx|onnx-int8: ONNX Runtime, sans torch (onnx_embedder.py)
+        _model = load_embedding_model(EMBEDDING_MODEL, EMBEDDING_DIM)
+        print("✅ Modèle chargé (384 dimensions)")
+    except Exception as e:
+        print(f"❌ Erreur chargement modèle: {e}")
+        print("   Installez: pip install sentence-transformers "
+              "(ou onnxruntime tokenizers avec EMBEDDING_BACKEND=onnx)")
+        sys.exit(1)
+    return _model
 
 # Documents juridiques de test (basés sur OHADA et législation ivoirienne)
-documents = [
+DOCUMENTS = [
     {
         "id": "ohada_sarl_capital",
         "title": "OHADA - Capital SARL",
@@ -133,63 +178,120 @@ documents = [
     },
 ]
 
-print(f"\n💾 Insertion de {len(documents)} documents juridiques...")
-print("-" * 80)
+def prepare_documents(documents):
+    """Ids stables + découpage en passages"""
+    # Les documents de démonstration gardent leurs ids explicites (lignes déjà en
+    # base sous ces ids: pas de doublon ni d'orphelin); les autres reçoivent l'id
+    # stable partagé avec les scrapers: URL + numéro d'article (ou titre)
+    seen_ids = {}
+    for doc in documents:
+        if not doc.get('id'):
+            doc['id'] = next_doc_id(seen_ids, doc['url'], find_article_number(doc['title']) or doc['title'],
+                                    prefix=doc['category'])
+
+    # Découper les textes longs en passages (un embedding par article)
+    return [chunk for doc in documents for chunk in chunk_document(doc)]
+
+def print_statistics(conn):
+    """Affiche le nombre de documents par catégorie"""
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM "LegalDocument"')
+        total = cursor.fetchone()[0]
+        print(f"\n📊 Total de documents dans la base: {total}")
+
+        cursor.execute('SELECT category, COUNT(*) FROM "LegalDocument" GROUP BY category ORDER BY COUNT(*) DESC')
+        categories = cursor.fetchall()
+    print("\n📂 Documents par catégorie:")
+    for cat, count in categories:
+        print(f"   - {cat}: {count}")
+
+def main(dry_run=False):
+    """Fonction principale"""
+    print("=" * 80)
+    print("🚀 SCRAPER PGVECTOR - LexIA")
+    print("=" * 80)
+
+    documents = prepare_documents([dict(doc) for doc in DOCUMENTS])
+
+    if dry_run:
+        print(f"\n🧪 Dry run: {len(documents)} passages prêts, rien n'est encodé ni écrit")
+        for i, doc in enumerate(documents, 1):
+            print(f"[{i}/{len(documents)}] 📄 {doc['title']} ({doc['category']})")
+        return
+
+    # Générer les embeddings par lots (une passe du modèle par lot)
+    print(f"\n🧮 Génération des embeddings ({len(documents)} passages)...")
+    # Les passages inchangés depuis le dernier run sont servis par le cache:
+    # le modèle n'est chargé que s'il reste des textes à encoder
+    embedding_cache = EmbeddingCache(EMBEDDING_MODEL, EMBEDDING_DIM)
+    embedding_stage = EmbeddingStage(loader=get_model, cache=embedding_cache)
+    embeddings = embedding_stage.encode([doc['content'] for doc in documents])
 
-success_count = 0
-error_count = 0
+    print(f"\n💾 Insertion de {len(documents)} documents juridiques...")
+    print("-" * 80)
 
-for i, doc in enumerate(documents, 1):
-    print(f"\n[{i}/{len(documents)}] 📄 {doc['title']}")
-    print(f"    Catégorie: {doc['category']}")
+    for i, doc in enumerate(documents, 1):
+        print(f"[{i}/{len(documents)}] 📄 {doc['title']} ({doc['category']})")
 
+    # COPY binaire dans une table temporaire puis fusion, une transaction par lot:
+    # les embeddings partent en float32 bruts plutôt qu'en texte décimal
+    db = get_database()
+    writer = BulkWriter(db, on_conflict=ON_CONFLICT_REFRESH_EMBEDDING, wire_format=WIRE_FORMAT_BINARY)
+    success_count = writer.write([
+        {
+            'id': doc['id'],
+            'title': doc['title'],
+            'category': doc['category'],
+            'content_preview': doc['content'],
+            'url': doc['url'],
+            'embedding': embedding,
+        }
+        for doc, embedding in zip(documents, embeddings)
+    ])
+    error_count = writer.errors
+
+    # Migration de modèle en cours ou terminée (reembed.py): mêmes passages
+    # écrits pour chaque modèle enregistré dans legal_document_embedding
+    from reembed import dual_write
+    try:
+        dual_write(db, documents)
+    except Exception as e:
+        print(f"⚠️  Écriture pour les modèles migrés échouée: {e} (python reembed.py run <modèle>)")
+
+    # Index BM25 local pour la recherche hybride (pgvector_search.py query --hybrid)
+    lexical = LexicalIndex()
+    with METRICS.timer("lexical_write"):
+        lexical.add(documents)
+
+    print("\n" + "=" * 80)
+    print(f"✅ TERMINÉ - {success_count} documents indexés, {error_count} erreurs")
+    print(f"⚡ Embeddings: {embedding_stage.docs_per_second():.1f} docs/s (lots de {embedding_stage.batch_size})")
+    print(f"⚡ Écriture: {writer.rows_per_second():.0f} lignes/s ({writer.bytes / 1024:.0f} Ko envoyés)")
+    embedding_cache.report()
+    embedding_cache.close()
+    lexical.report()
+    lexical.close()
+    print("=" * 80)
+
+    # Index HNSW sur les embeddings (créé une fois, reconstruit si les paramètres changent)
+    # EMBEDDING_QUANTIZATION=halfvec|binary: index sur une expression quantifiée
+    from pgvector_search import ensure_vector_index
+
+    print("\n🧭 Vérification de l'index HNSW...")
     try:
-        # Générer embedding
-        embedding = model.encode(doc['content'])
-        embedding_list = embedding.tolist()
-        embedding_str = '[' + ','.join(map(str, embedding_list)) + ']'
-
-        # Insérer dans PostgreSQL avec pgvector
-        cursor.execute("""
-            INSERT INTO "LegalDocument"
-            (id, title, category, "contentPreview", "sourceUrl", embedding, "scrapedAt", "createdAt")
-            VALUES (%s, %s, %s, %s, %s, %s::vector, NOW(), NOW())
-            ON CONFLICT (id) DO UPDATE SET
-                embedding = EXCLUDED.embedding,
-                "scrapedAt" = NOW()
-        """, (
-            doc['id'],
-            doc['title'],
-            doc['category'],
-            doc['content'],
-            doc['url'],
-            embedding_str
-        ))
-        conn.commit()
-        print(f"    ✅ Indexé avec embedding (384 dimensions)")
-        success_count += 1
+        db.run(ensure_vector_index)
     except Exception as e:
-        conn.rollback()
-        print(f"    ❌ Erreur: {e}")
-        error_count += 1
-
-print("\n" + "=" * 80)
-print(f"✅ TERMINÉ - {success_count} documents indexés, {error_count} erreurs")
-print("=" * 80)
-
-# Statistiques
-cursor.execute('SELECT COUNT(*) FROM "LegalDocument"')
-total = cursor.fetchone()[0]
-print(f"\n📊 Total de documents dans la base: {total}")
-
-cursor.execute('SELECT category, COUNT(*) FROM "LegalDocument" GROUP BY category ORDER BY COUNT(*) DESC')
-categories = cursor.fetchall()
-print("\n📂 Documents par catégorie:")
-for cat, count in categories:
-    print(f"   - {cat}: {count}")
-
-cursor.close()
-conn.close()
-
-print("\n✅ Indexation terminée avec succès!")
-print("   Vous pouvez maintenant tester l'API chat avec RAG")
+        print(f"⚠️  Index HNSW non créé: {e}")
+
+    db.run(print_statistics)
+    db.report()
+    db.close()
+    if hasattr(_model, "close"):
+        _model.close()
+    METRICS.finish_run("scraper_with_pgvector")
+
+    print("\n✅ Indexation terminée avec succès!")
+    print("   Vous pouvez maintenant tester l'API chat avec RAG")
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
@@ -4,11 +4,13 @@ Script pour ajouter des donnees de test dans ChromaDB
 
 import os
 import sys
-import sqlite3
 import chromadb
 from chromadb.config import Settings
 from dotenv import load_dotenv
 import re
+from chunker import find_article_number
+from doc_ids import next_doc_id
+from migrations import SQLITE_UPSERT_DOCUMENT, connect_sqlite
 
 # Charger les variables d'environnement
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -169,11 +171,19 @@ Tel: +225 20 21 74 00
     }
 ]
 
+# Les documents de test gardent leurs ids explicites (deja en base sous ces ids);
+# sans id: id stable partage avec les scrapers, URL + numero d'article (ou titre)
+seen_ids = {}
+for doc in TEST_DOCUMENTS:
+    if not doc.get('id'):
+        doc['id'] = next_doc_id(seen_ids, doc['url'], find_article_number(doc['title']) or doc['title'],
+                                prefix=doc['category'])
+
 print("[SEED] Ajout de donnees de test...")
 
 # Connexion SQLite
 print(f"[DB] Connexion a {db_path}...")
-conn = sqlite3.connect(db_path)
+conn = connect_sqlite(db_path)
 cursor = conn.cursor()
 
 # Connexion ChromaDB
@@ -191,11 +201,8 @@ collection = client.get_or_create_collection(
 print("\n[DB] Insertion dans SQLite...")
 for doc in TEST_DOCUMENTS:
     try:
-        cursor.execute("""
-            INSERT OR REPLACE INTO LegalDocument
-            (id, title, category, contentPreview, sourceUrl, scrapedAt, createdAt)
-            VALUES (?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-        """, (
+        # Upsert (et non INSERT OR REPLACE): l'index plein texte reste cohérent au re-seed
+        cursor.execute(SQLITE_UPSERT_DOCUMENT, (
             doc['id'],
             doc['title'],
             doc['category'],